@@ -0,0 +1,433 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.  All rights reserved.
+#
+# SPDX-License-Identifier: MIT
+#
+
+import os
+import sys
+import capnp
+import gzip
+import math
+import time
+import random
+import argparse
+import importlib.util
+from array import array
+
+# Add the interchange/ subdirectory from fpga-interchange-schema submodule at the root
+# of the repository to Python's sys.path so that capnp can search it from *.capnp files
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(THIS_DIR, '..','fpga-interchange-schema','interchange'))
+import PhysicalNetlist_capnp
+import LogicalNetlist_capnp
+
+# LUTs of every SLICE site, the input site pins of each (and the BEL pins of
+# its LUT6 that they connect to), and the output site pin of each
+LUTS = 'ABCDEFGH'
+LUT_INPUTS = 6
+INPUT_PINS = [[lut + str(i + 1) for i in range(LUT_INPUTS)] for lut in LUTS]
+INPUT_BEL_PINS = ['A' + str(i + 1) for i in range(LUT_INPUTS)]
+OUTPUT_PINS = [lut + '_O' for lut in LUTS]
+
+ROUTER = os.path.join(THIS_DIR, '..', 'networkx-proof-of-concept-router', 'nxroute-poc.py')
+
+def import_router():
+    """
+    Import the proof-of-concept router (whose file name is not a valid module
+    name) as a module, for its NxRoutingGraph.
+    """
+    spec = importlib.util.spec_from_file_location('nxroute_poc', ROUTER)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+class BenchmarkGenerator:
+    """
+    This class generates a synthetic, placed but unrouted design of LUT6 cells
+    and writes it as an FPGA Interchange Format Physical Netlist and the
+    matching Logical Netlist.
+
+    Every net is driven by the O6 output of one LUT and connects to inputs of
+    other LUTs. Twice as many LUTs as nets are placed (in a random order) and
+    the i-th LUT drives the i-th net, whose sinks are only ever inputs of LUTs
+    later in that order, so that the design is free of combinatorial loops.
+    The fanout of each net is drawn from a Pareto distribution, and each of
+    its sinks is found by sampling a tile offset from the driver from a
+    normal distribution whose standard deviation grows with the square root
+    of the fanout.
+
+    Only SLICE sites whose every LUT input and output site pin maps to a node
+    of the NxRoutingGraph built for the region are used, so that every pin of
+    the design is real and routable within it.
+    """
+
+    PART = 'xcvu3p-ffvc1517-2-e'
+
+    # Truth table of every LUT6: the parity of its inputs, which depends on
+    # every input whether connected or not
+    LUT6_INIT = "64'h6996966996696996"
+
+    # Sinks that are not found within this many samples of the tile offset
+    # are searched for at twice the standard deviation, up to this many times
+    SAMPLES_PER_SPREAD = 16
+    MAX_SPREAD_DOUBLINGS = 8
+
+    def __init__(self, device_resources, region=None):
+        """
+        Args:
+            device_resources: filepath of the FPGA Interchange Format
+            DeviceResources
+            region: (xmin, xmax, ymin, ymax) tile coordinates of the region to
+            place the design in, or None for the NxRoutingGraph default
+        """
+        nxroute = import_router()
+        NxRoutingGraph = nxroute.NxRoutingGraph
+        if region is not None:
+            NxRoutingGraph.MIN_X, NxRoutingGraph.MAX_X, NxRoutingGraph.MIN_Y, NxRoutingGraph.MAX_Y = region
+        # Only the nodes and site pin lookups are needed, not the edges
+        NxRoutingGraph.LAZY = True
+        data = NxRoutingGraph.readDeviceResources(device_resources)
+        G = NxRoutingGraph()
+        G.build(device_resources, data)
+        # No out-edges will be built, so release the DeviceResources reader
+        G.close()
+
+        site_types = self.read_site_types(data, G.site2tileAndTypes)
+        # Name, type and X/Y tile coordinates of every usable SLICE site
+        self.sites = []
+        for site_name in sorted(site_types):
+            try:
+                nodes = [G.getNodeFromSitePin(site_name, pin) for pin in OUTPUT_PINS]
+                nodes.extend(G.getNodeFromSitePin(site_name, pin) for pins in INPUT_PINS for pin in pins)
+            except KeyError:
+                # Site does not have all LUT site pins
+                continue
+            if None in nodes:
+                continue
+            self.sites.append((site_name, site_types[site_name], G.nodeX[nodes[0]], G.nodeY[nodes[0]]))
+        print('Found %d SLICE sites (%d LUTs) in region X%d-%dY%d-%d' % (len(self.sites), len(self.sites) * len(LUTS),
+              NxRoutingGraph.MIN_X, NxRoutingGraph.MAX_X, NxRoutingGraph.MIN_Y, NxRoutingGraph.MAX_Y))
+
+    @staticmethod
+    def read_site_types(data, in_region):
+        """
+        Return a mapping from the name of every SLICE site in in_region (a
+        collection of site names) to the name of its site type.
+        """
+        import DeviceResources_capnp
+        site_types = {}
+        with DeviceResources_capnp.Device.from_bytes(data, traversal_limit_in_words=sys.maxsize) as device:
+            sl = device.strList
+            tile_types = device.tileTypeList
+            site_type_list = device.siteTypeList
+            for tile in device.tileList:
+                for site in tile.sites:
+                    site_name = sl[site.name]
+                    if site_name.startswith('SLICE') and site_name in in_region:
+                        primary_type = tile_types[tile.type].siteTypes[site.type].primaryType
+                        site_types[site_name] = sl[site_type_list[primary_type].name]
+        return site_types
+
+    def generate(self, num_nets, fanout_alpha, max_fanout, locality, utilization, seed):
+        """
+        Generate the design.
+
+        Args:
+            num_nets: number of nets
+            fanout_alpha: shape of the Pareto distribution of fanouts (whose
+            mean is fanout_alpha/(fanout_alpha-1) before truncation)
+            max_fanout: largest fanout of any net
+            locality: (X, Y) standard deviation, in tiles, of the offset of
+            the sinks of a net of fanout 1 from its driver
+            utilization: fraction of the LUTs of every occupied site to use
+            seed: seed of the random number generator
+
+        Raises:
+            ValueError: if the region does not contain enough sites
+        """
+        start_time = time.perf_counter()
+        rng = random.Random(seed)
+        num_luts = len(LUTS)
+        num_cells = 2 * num_nets
+        num_sites = math.ceil(num_cells / (num_luts * utilization))
+        if num_sites > len(self.sites):
+            raise ValueError("Design of "+str(num_nets)+" nets needs "+str(num_sites)+" SLICE sites but region has "+str(len(self.sites)))
+
+        # Occupy the sites nearest the centre of the region, in its proportions
+        xs = [x for _, _, x, _ in self.sites]
+        ys = [y for _, _, _, y in self.sites]
+        cx, cy = (min(xs) + max(xs)) / 2, (min(ys) + max(ys)) / 2
+        w, h = max(xs) - min(xs) + 1, max(ys) - min(ys) + 1
+        order = sorted(range(len(self.sites)), key=lambda i: (max(abs(xs[i] - cx) / w, abs(ys[i] - cy) / h), i))
+        self.used_sites = sorted(order[:num_sites])
+
+        # Place every cell at a random LUT of the occupied sites; the index of a
+        # cell is its position in the order that keeps the design acyclic
+        bels = [(site, lut) for site in self.used_sites for lut in range(num_luts)]
+        rng.shuffle(bels)
+        self.cell_site = array('I', (site for site, _ in bels[:num_cells]))
+        self.cell_lut = array('B', (lut for _, lut in bels[:num_cells]))
+        tile2cells = {}
+        for cell, site in enumerate(self.cell_site):
+            tile2cells.setdefault((xs[site], ys[site]), []).append(cell)
+
+        # Bitmask of the inputs of every cell that are already connected
+        used_inputs = bytearray(num_cells)
+        all_inputs = (1 << LUT_INPUTS) - 1
+        # Sinks of net i are (sink_cells[j], sink_inputs[j]) for j from
+        # sink_offsets[i] to sink_offsets[i+1]
+        self.sink_offsets = array('I', [0])
+        self.sink_cells = array('I')
+        self.sink_inputs = array('B')
+        num_dropped = 0
+        gauss = rng.gauss
+        randrange = rng.randrange
+        tile2cells_get = tile2cells.get
+        for driver in range(num_nets):
+            fanout = min(max_fanout, int(rng.paretovariate(fanout_alpha)))
+            site = self.cell_site[driver]
+            x0, y0 = xs[site], ys[site]
+            spread = math.sqrt(fanout)
+            sinks = set()
+            for _ in range(fanout):
+                sx, sy = locality[0] * spread, locality[1] * spread
+                found = False
+                for _ in range(self.MAX_SPREAD_DOUBLINGS + 1):
+                    for _ in range(self.SAMPLES_PER_SPREAD):
+                        cells = tile2cells_get((x0 + round(gauss(0, sx)), y0 + round(gauss(0, sy))))
+                        if not cells:
+                            continue
+                        cell = cells[randrange(len(cells))]
+                        used = used_inputs[cell]
+                        if cell <= driver or used == all_inputs or cell in sinks:
+                            continue
+                        free = [i for i in range(LUT_INPUTS) if not used >> i & 1]
+                        i = free[randrange(len(free))]
+                        used_inputs[cell] = used | 1 << i
+                        sinks.add(cell)
+                        self.sink_cells.append(cell)
+                        self.sink_inputs.append(i)
+                        found = True
+                        break
+                    if found:
+                        break
+                    sx, sy = 2 * sx, 2 * sy
+                if not found:
+                    num_dropped += 1
+            self.sink_offsets.append(len(self.sink_cells))
+        self.num_nets = num_nets
+        print('Generated %d nets with %d pins over %d LUTs in %d sites (%d sinks dropped): %.1fs' %
+              (num_nets, num_nets + len(self.sink_cells), num_cells, num_sites, num_dropped, time.perf_counter() - start_time))
+
+    def cell_name(self, cell):
+        return 'lut_' + str(cell)
+
+    def net_name(self, net):
+        return 'net_' + str(net)
+
+    def write_phys_netlist(self, filename):
+        """
+        Write the placed but unrouted design as a gzipped Physical Netlist.
+        """
+        start_time = time.perf_counter()
+        strings = {}
+        def si(s):
+            i = strings.get(s)
+            if i is None:
+                i = strings[s] = len(strings)
+            return i
+
+        phys = PhysicalNetlist_capnp.PhysNetlist.new_message()
+        phys.part = self.PART
+        sites = self.sites
+        lut6_type = si('LUT6')
+        o6 = si('O6')
+        cell_pins = [si('I' + str(i)) for i in range(LUT_INPUTS)]
+        input_bel_pins = [si(pin) for pin in INPUT_BEL_PINS]
+        input_pins = [[si(pin) for pin in pins] for pins in INPUT_PINS]
+        output_pins = [si(pin) for pin in OUTPUT_PINS]
+        bels = [si(lut + '6LUT') for lut in LUTS]
+        site_names = {}
+        for site in self.used_sites:
+            site_names[site] = si(sites[site][0])
+
+        placements = phys.init('placements', len(self.cell_site))
+        for cell, placement in enumerate(placements):
+            site, lut = self.cell_site[cell], self.cell_lut[cell]
+            placement.cellName = si(self.cell_name(cell))
+            placement.type = lut6_type
+            placement.site = site_names[site]
+            placement.bel = bels[lut]
+            placement.isBelFixed = True
+            placement.isSiteFixed = True
+            pin_map = placement.init('pinMap', LUT_INPUTS + 1)
+            for i in range(LUT_INPUTS):
+                pin_map[i].cellPin = cell_pins[i]
+                pin_map[i].bel = bels[lut]
+                pin_map[i].belPin = input_bel_pins[i]
+            pin_map[LUT_INPUTS].cellPin = si('O')
+            pin_map[LUT_INPUTS].bel = bels[lut]
+            pin_map[LUT_INPUTS].belPin = o6
+
+        # The source of every net is its LUT's O6 BEL pin through to its output
+        # site pin, and every sink a stub from an input site pin through to the
+        # LUT's BEL pin
+        phys_nets = phys.init('physNets', self.num_nets)
+        sink_offsets, sink_cells, sink_inputs = self.sink_offsets, self.sink_cells, self.sink_inputs
+        for net, phys_net in enumerate(phys_nets):
+            phys_net.name = si(self.net_name(net))
+            site, lut = site_names[self.cell_site[net]], self.cell_lut[net]
+            source = phys_net.init('sources', 1)[0]
+            bel_pin = source.routeSegment.init('belPin')
+            bel_pin.site, bel_pin.bel, bel_pin.pin = site, bels[lut], o6
+            branch = source.init('branches', 1)[0]
+            bel_pin = branch.routeSegment.init('belPin')
+            bel_pin.site, bel_pin.bel, bel_pin.pin = site, output_pins[lut], output_pins[lut]
+            site_pin = branch.init('branches', 1)[0].routeSegment.init('sitePin')
+            site_pin.site, site_pin.pin = site, output_pins[lut]
+
+            start, end = sink_offsets[net], sink_offsets[net + 1]
+            stubs = phys_net.init('stubs', end - start)
+            for j, stub in enumerate(stubs, start):
+                cell, i = sink_cells[j], sink_inputs[j]
+                site, lut = site_names[self.cell_site[cell]], self.cell_lut[cell]
+                pin = input_pins[lut][i]
+                site_pin = stub.routeSegment.init('sitePin')
+                site_pin.site, site_pin.pin = site, pin
+                branch = stub.init('branches', 1)[0]
+                bel_pin = branch.routeSegment.init('belPin')
+                bel_pin.site, bel_pin.bel, bel_pin.pin = site, pin, pin
+                bel_pin = branch.init('branches', 1)[0].routeSegment.init('belPin')
+                bel_pin.site, bel_pin.bel, bel_pin.pin = site, bels[lut], input_bel_pins[i]
+
+        site_insts = phys.init('siteInsts', len(self.used_sites))
+        for site_inst, site in zip(site_insts, self.used_sites):
+            site_inst.site = site_names[site]
+            site_inst.type = si(sites[site][1])
+
+        str_list = phys.init('strList', len(strings))
+        for s, i in strings.items():
+            str_list[i] = s
+        with gzip.open(filename, 'wb') as f:
+            f.write(phys.to_bytes())
+        print('Wrote %s: %.1fs' % (filename, time.perf_counter() - start_time))
+
+    def write_logical_netlist(self, filename, name):
+        """
+        Write the design as a gzipped Logical Netlist: a top-level cell named
+        name containing an instance of the LUT6 primitive for every cell, and
+        every net connecting the O port of its driver to the input ports of
+        its sinks.
+        """
+        start_time = time.perf_counter()
+        strings = {}
+        def si(s):
+            i = strings.get(s)
+            if i is None:
+                i = strings[s] = len(strings)
+            return i
+
+        netlist = LogicalNetlist_capnp.Netlist.new_message()
+        netlist.name = name
+        view = si('netlist')
+
+        # Ports 0 to LUT_INPUTS-1 are the inputs of LUT6, and port LUT_INPUTS its output
+        ports = netlist.init('portList', LUT_INPUTS + 1)
+        for i in range(LUT_INPUTS):
+            ports[i].name = si('I' + str(i))
+            ports[i].dir = 'input'
+            ports[i].bit = None
+        ports[LUT_INPUTS].name = si('O')
+        ports[LUT_INPUTS].dir = 'output'
+        ports[LUT_INPUTS].bit = None
+
+        # Cell declaration 0 is the LUT6 primitive, and 1 the top-level cell
+        cell_decls = netlist.init('cellDecls', 2)
+        cell_decls[0].name = si('LUT6')
+        cell_decls[0].view = view
+        cell_decls[0].lib = si('hdi_primitives')
+        decl_ports = cell_decls[0].init('ports', LUT_INPUTS + 1)
+        for i in range(LUT_INPUTS + 1):
+            decl_ports[i] = i
+        cell_decls[1].name = si(name)
+        cell_decls[1].view = view
+        cell_decls[1].lib = si('work')
+
+        num_cells = len(self.cell_site)
+        init_key, init_value = si('INIT'), si(self.LUT6_INIT)
+        insts = netlist.init('instList', num_cells)
+        for cell, inst in enumerate(insts):
+            inst.name = si(self.cell_name(cell))
+            inst.view = view
+            inst.cell = 0
+            entry = inst.propMap.init('entries', 1)[0]
+            entry.key = init_key
+            entry.textValue = init_value
+
+        cells = netlist.init('cellList', 2)
+        cells[0].index = 0
+        cells[1].index = 1
+        top_insts = cells[1].init('insts', num_cells)
+        for cell in range(num_cells):
+            top_insts[cell] = cell
+        nets = cells[1].init('nets', self.num_nets)
+        sink_offsets, sink_cells, sink_inputs = self.sink_offsets, self.sink_cells, self.sink_inputs
+        for i, net in enumerate(nets):
+            net.name = si(self.net_name(i))
+            start, end = sink_offsets[i], sink_offsets[i + 1]
+            port_insts = net.init('portInsts', 1 + end - start)
+            port_insts[0].port = LUT_INPUTS
+            port_insts[0].busIdx.singleBit = None
+            port_insts[0].inst = i
+            for j in range(start, end):
+                port_inst = port_insts[1 + j - start]
+                port_inst.port = sink_inputs[j]
+                port_inst.busIdx.singleBit = None
+                port_inst.inst = sink_cells[j]
+
+        top = netlist.topInst
+        top.name = si(name)
+        top.view = view
+        top.cell = 1
+
+        str_list = netlist.init('strList', len(strings))
+        for s, i in strings.items():
+            str_list[i] = s
+        with gzip.open(filename, 'wb') as f:
+            f.write(netlist.to_bytes())
+        print('Wrote %s: %.1fs' % (filename, time.perf_counter() - start_time))
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="bg",
+        description="Generate a synthetic unrouted benchmark as an FPGAIF Physical and Logical Netlist")
+
+    parser.add_argument('device_resources', type=str, help="DeviceResources of the target device (e.g. xcvu3p.device)")
+    parser.add_argument('output', type=str, help="write <output>_unrouted.phys and <output>.netlist")
+    parser.add_argument('--nets', type=int, required=True, help="number of nets")
+    parser.add_argument('--fanout-alpha', type=float, default=2.0,
+                        help="shape of the Pareto distribution of net fanouts, whose mean is ALPHA/(ALPHA-1) (default: %(default)s)")
+    parser.add_argument('--max-fanout', type=int, default=64, help="largest fanout of any net (default: %(default)s)")
+    parser.add_argument('--locality', metavar=('X', 'Y'), type=float, nargs=2, default=(3.0, 15.0),
+                        help="standard deviation, in tiles, of the offset of the sinks of a net from its driver, "
+                             "scaled by the square root of its fanout (default: %(default)s)")
+    parser.add_argument('--utilization', type=float, default=0.5,
+                        help="fraction of the LUTs of every occupied site to use (default: %(default)s)")
+    parser.add_argument('--region', metavar=('XMIN', 'XMAX', 'YMIN', 'YMAX'), type=int, nargs=4,
+                        help="tile coordinates of the region to place the design in "
+                             "(default: that routed by nxroute-poc)")
+    parser.add_argument('--seed', type=int, default=1, help="random seed (default: %(default)s)")
+
+    args = parser.parse_args()
+    if not 0 < args.utilization <= 1:
+        parser.error('--utilization must be greater than 0 and at most 1')
+    if args.fanout_alpha <= 0:
+        parser.error('--fanout-alpha must be greater than 0')
+
+    generator = BenchmarkGenerator(args.device_resources, args.region)
+    generator.generate(args.nets, args.fanout_alpha, args.max_fanout, args.locality, args.utilization, args.seed)
+    generator.write_phys_netlist(args.output + '_unrouted.phys')
+    generator.write_logical_netlist(args.output + '.netlist', os.path.basename(args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,420 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.  All rights reserved.
+#
+# SPDX-License-Identifier: MIT
+#
+
+import os
+import io
+import re
+import sys
+import gc
+import capnp
+import glob
+import gzip
+import json
+import time
+import pickle
+import hashlib
+import platform
+import argparse
+import functools
+import statistics
+import contextlib
+import tempfile
+
+# Add the interchange/ subdirectory from fpga-interchange-schema submodule at the root
+# of the repository to Python's sys.path so that capnp can search it from *.capnp files
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(THIS_DIR, '..','fpga-interchange-schema','interchange'))
+sys.path.append(os.path.join(THIS_DIR, '..', 'benchmark_generator'))
+sys.path.append(os.path.join(THIS_DIR, '..', 'wirelength_analyzer'))
+sys.path.append(os.path.join(THIS_DIR, '..', 'net_printer'))
+import PhysicalNetlist_capnp
+from bg import BenchmarkGenerator, import_router
+from wa import WirelengthAnalyzer, get_device_data
+import np as net_printer
+
+# Routed Physical Netlists downloaded by `make get-test-data` in wirelength_analyzer/
+TEST_DATA = os.path.join(THIS_DIR, '..', 'wirelength_analyzer', 'test', 'data', 'wirelength_analyzer')
+
+# Version of the results written by save_results()
+RESULTS_VERSION = 1
+
+class Benchmark:
+    """
+    This class describes a single hot path to be measured.
+
+    Before every run, prepare() (if provided) is called untimed and its result
+    passed to run(), which is timed. Any state that is expensive to build but
+    not modified by run() should instead be built once, outside of prepare().
+    """
+
+    def __init__(self, name, inputs, run, prepare=None):
+        """
+        Args:
+            name: unique name of the benchmark
+            inputs: description of everything that the measured time depends on
+            other than the code itself (e.g. input files and their sizes), so
+            that results are only ever compared against a baseline measured on
+            the same inputs
+            run: function to time, taking the result of prepare() if provided
+            prepare: function returning the argument of run()
+        """
+        self.name = name
+        self.inputs = inputs
+        self.run = run
+        self.prepare = prepare
+
+    def measure(self, warmup, repeats):
+        """
+        Run the benchmark warmup times, discarding the results, then repeats
+        times. All output is discarded, and garbage is collected before every
+        run so that each starts from the same state.
+
+        Args:
+            warmup: number of runs to discard
+            repeats: number of runs to time
+
+        Returns:
+            list of the wall-clock time of each timed run, in seconds
+        """
+        times = []
+        for i in range(warmup + repeats):
+            with contextlib.redirect_stdout(io.StringIO()):
+                state = self.prepare() if self.prepare is not None else None
+                gc.collect()
+                start_time = time.perf_counter()
+                if self.prepare is not None:
+                    self.run(state)
+                else:
+                    self.run()
+                end_time = time.perf_counter()
+            del state
+            if i >= warmup:
+                times.append(end_time - start_time)
+        return times
+
+def file_inputs(filename):
+    """
+    Describe a file by its name and size, for Benchmark.inputs.
+    """
+    return os.path.basename(filename) + ' (' + str(os.path.getsize(filename)) + ' bytes)'
+
+def read_phys_netlist_data(filename):
+    """
+    Read a Physical Netlist file, decompressing it if necessary, and return its
+    contents and their SHA-256 digest.
+    """
+    with open(filename, 'rb') as f:
+        magic = f.read(2)
+        f.seek(0)
+        if magic == b'\x1f\x8b':
+            f = gzip.GzipFile(fileobj=f)
+        data = f.read()
+    return data, hashlib.sha256(data).hexdigest()
+
+def router_benchmarks(stack, device_resources, region, num_nets, seed, work_dir):
+    """
+    Return the benchmarks of the proof-of-concept router, on a synthetic design
+    generated by bg.py within region of the device, along with a function that
+    routes and writes that design (only once) and returns the filename of the
+    routed Physical Netlist.
+
+    Args:
+        stack: ExitStack that keeps the unrouted Physical Netlist open
+        device_resources: filepath of the FPGA Interchange Format
+        DeviceResources
+        region: (xmin, xmax, ymin, ymax) tile coordinates of the region to
+        build the routing graph of, and to place the design in
+        num_nets: number of nets of the synthetic design
+        seed: seed of the synthetic design
+        work_dir: directory in which to write the synthetic design
+    """
+    nxroute = import_router()
+    # Register the router module so that its routing graphs can be pickled
+    sys.modules[nxroute.__name__] = nxroute
+    NxRoutingGraph, NxRouter = nxroute.NxRoutingGraph, nxroute.NxRouter
+    NxRoutingGraph.MIN_X, NxRoutingGraph.MAX_X, NxRoutingGraph.MIN_Y, NxRoutingGraph.MAX_Y = region
+
+    unrouted = os.path.join(work_dir, 'synthetic_unrouted.phys')
+    routed = os.path.join(work_dir, 'synthetic_nxroute-poc.phys')
+    with contextlib.redirect_stdout(io.StringIO()):
+        generator = BenchmarkGenerator(device_resources, region)
+        generator.generate(num_nets, 2.0, 64, (3.0, 15.0), 0.5, seed)
+        generator.write_phys_netlist(unrouted)
+        device_data = NxRoutingGraph.readDeviceResources(device_resources)
+    data, digest = read_phys_netlist_data(unrouted)
+    netlist = stack.enter_context(PhysicalNetlist_capnp.PhysNetlist.from_bytes(
+        data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**16))
+    device_inputs = file_inputs(device_resources) + ' X%d-%dY%d-%d' % tuple(region)
+    design_inputs = device_inputs + ', ' + str(num_nets) + ' synthetic nets (seed ' + str(seed) + ')'
+
+    def build():
+        G = NxRoutingGraph()
+        G.build(device_resources, device_data)
+        return G
+
+    @functools.cache
+    def pickled_graph():
+        with contextlib.redirect_stdout(io.StringIO()):
+            return pickle.dumps(build(), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @functools.cache
+    def design():
+        return NxRouter.extractDesign(netlist)
+
+    def new_router():
+        # A fresh copy of a routing graph that has just been built
+        return NxRouter.fromGraph(pickle.loads(pickled_graph()), data, digest)
+
+    def parsed_router():
+        router = new_router()
+        router.parse(netlist, design())
+        return router
+
+    @functools.cache
+    def routed_router():
+        with contextlib.redirect_stdout(io.StringIO()):
+            router = parsed_router()
+            router.route()
+            router.write(routed)
+        return router
+
+    def routed_phys_netlist():
+        routed_router()
+        return routed
+
+    benchmarks = [
+        Benchmark('nxroute.NxRoutingGraph.build', device_inputs, build),
+        Benchmark('nxroute.NxRouter.extractDesign', design_inputs, lambda: NxRouter.extractDesign(netlist)),
+        Benchmark('nxroute.NxRouter.parse', design_inputs, lambda router: router.parse(netlist, design()), new_router),
+        Benchmark('nxroute.NxRouter.route', design_inputs, lambda router: router.route(), parsed_router),
+        Benchmark('nxroute.NxRouter.write', design_inputs, lambda router: router.write(os.path.join(work_dir, 'write.phys')), routed_router),
+    ]
+    return benchmarks, routed_phys_netlist
+
+def analyzer_benchmarks(stack, phys_name):
+    """
+    Return the benchmarks of the wirelength analyzer and net printer on a
+    routed Physical Netlist.
+
+    Args:
+        stack: ExitStack that keeps the Physical Netlist open
+        phys_name: filepath of the routed Physical Netlist
+    """
+    data, _ = read_phys_netlist_data(phys_name)
+    phys = stack.enter_context(PhysicalNetlist_capnp.PhysNetlist.from_bytes(
+        data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**20))
+    device_data = get_device_data()
+    inputs = file_inputs(phys_name)
+    suffix = '[' + re.sub(r'\.phys$', '', os.path.basename(phys_name)) + ']'
+
+    def new_analyzer():
+        return WirelengthAnalyzer(phys, device_data=device_data)
+
+    @functools.cache
+    def analyzer():
+        return new_analyzer()
+
+    @functools.cache
+    def joined_analyzer():
+        wa = new_analyzer()
+        wa.join_nets()
+        return wa
+
+    @functools.cache
+    def segments():
+        segments = []
+        stack = [b for n in phys.physNets for b in n.sources]
+        while stack:
+            branch = stack.pop()
+            segments.append(branch.routeSegment)
+            stack.extend(branch.branches)
+        return segments
+
+    def prepare_segments():
+        # Start from empty per-analyzer caches (the device data's cache of
+        # wirelength by wire name is shared by every analyzer, so stays warm)
+        wa = analyzer()
+        wa.pip_cache = {}
+        wa.tile_cache = {}
+        return wa, segments()
+
+    def segment_to_wirelength(state):
+        wa, segments = state
+        segment_to_wirelength = wa.segment_to_wirelength
+        for seg in segments:
+            segment_to_wirelength(seg)
+
+    # Print a sample of evenly spaced nets, as if named on the command line
+    net_names = [phys.strList[n.name] for n in phys.physNets if n.type == 'signal' and len(n.sources) != 0]
+    sample = net_names[::max(1, len(net_names) // 10)][:10]
+
+    return [
+        Benchmark('wa.WirelengthAnalyzer.segment_to_wirelength' + suffix, inputs, segment_to_wirelength, prepare_segments),
+        # Constructing an analyzer builds its graph by add_all_nets_to_graph()
+        Benchmark('wa.WirelengthAnalyzer.add_all_nets_to_graph' + suffix, inputs, new_analyzer),
+        Benchmark('wa.WirelengthAnalyzer.join_nets' + suffix, inputs, lambda wa: wa.join_nets(), new_analyzer),
+        Benchmark('wa.WirelengthAnalyzer.find_longest_path' + suffix, inputs, lambda wa: wa.find_longest_path(), joined_analyzer),
+        Benchmark('np.print_net' + suffix, inputs, lambda: net_printer.print_net(phys, sample)),
+    ]
+
+def load_results(filename):
+    """
+    Load results saved by save_results(), or return None if filename does not
+    exist or holds results of a different version.
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as f:
+        results = json.load(f)
+    if results.get('version') != RESULTS_VERSION:
+        return None
+    return results
+
+def save_results(filename, results):
+    """
+    Save the results of a run of the suite as JSON.
+    """
+    with open(filename, 'w') as f:
+        json.dump(results, f, indent=1)
+
+def compare(name, result, baseline, threshold):
+    """
+    Compare the fastest time of a benchmark with that of its baseline. The
+    fastest of several runs is the least affected by other activity on the
+    machine, so varies the least between runs of the suite.
+
+    Args:
+        name: name of the benchmark
+        result: this run's result of the benchmark
+        baseline: results loaded by load_results(), or None
+        threshold: largest fraction by which the time may exceed that of
+        the baseline without being reported as a regression
+
+    Returns:
+        (baseline time or None, status) tuple, where status is one of
+        'regression', 'improvement', 'ok', 'no baseline' or 'inputs changed'
+    """
+    if baseline is None or name not in baseline['benchmarks']:
+        return None, 'no baseline'
+    base = baseline['benchmarks'][name]
+    if base['inputs'] != result['inputs']:
+        return None, 'inputs changed'
+    change = result['min'] / base['min'] - 1
+    if change > threshold:
+        return base['min'], 'regression'
+    if change < -threshold:
+        return base['min'], 'improvement'
+    return base['min'], 'ok'
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="mb",
+        description="Time the hot paths of the router, wirelength analyzer and net printer, "
+                    "and compare them against a saved baseline")
+
+    parser.add_argument('--device', metavar='FILE', type=str,
+                        help="DeviceResources for the router benchmarks (default: xcvu3p.device at "
+                             "the root of the repository, if present)")
+    parser.add_argument('--region', metavar=('XMIN', 'XMAX', 'YMIN', 'YMAX'), type=int, nargs=4,
+                        default=(36, 55, 60, 119),
+                        help="tile coordinates of the region to build the routing graph of, and to "
+                             "place the synthetic design in (default: %(default)s)")
+    parser.add_argument('--nets', type=int, default=1000,
+                        help="number of nets of the synthetic design (default: %(default)s)")
+    parser.add_argument('--seed', type=int, default=1, help="seed of the synthetic design (default: %(default)s)")
+    parser.add_argument('--phys', metavar='FILE', type=str, nargs='+',
+                        help="routed Physical Netlists for the wirelength analyzer and net printer "
+                             "benchmarks (default: those of the wirelength analyzer's test data, or "
+                             "else the synthetic design routed by the router)")
+    parser.add_argument('-k', '--filter', metavar='REGEX', type=str,
+                        help="only run benchmarks whose name matches REGEX")
+    parser.add_argument('--list', action='store_true', help="list the benchmarks and exit")
+    parser.add_argument('--warmup', type=int, default=1,
+                        help="number of untimed runs of every benchmark (default: %(default)s)")
+    parser.add_argument('--repeats', type=int, default=5,
+                        help="number of timed runs of every benchmark (default: %(default)s)")
+    parser.add_argument('--cpu', type=int, help="pin this process to CPU number CPU")
+    parser.add_argument('--baseline', metavar='FILE', type=str,
+                        help="compare against the results in FILE, or save the results there as the "
+                             "baseline if FILE does not exist")
+    parser.add_argument('--save', metavar='FILE', type=str, help="save the results to FILE")
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help="fraction by which the fastest time of a benchmark may exceed that of "
+                             "the baseline before it is reported as a regression (default: %(default)s)")
+
+    args = parser.parse_args()
+    if args.repeats < 1:
+        parser.error('--repeats must be at least 1')
+    if args.cpu is not None:
+        os.sched_setaffinity(0, {args.cpu})
+
+    device = args.device
+    if device is None and os.path.exists(os.path.join(THIS_DIR, '..', 'xcvu3p.device')):
+        device = os.path.join(THIS_DIR, '..', 'xcvu3p.device')
+
+    with tempfile.TemporaryDirectory() as work_dir, contextlib.ExitStack() as stack:
+        benchmarks = []
+        routed_phys_netlist = None
+        if device is not None:
+            print("Generating synthetic design of %d nets..." % args.nets)
+            router, routed_phys_netlist = router_benchmarks(stack, device, args.region, args.nets, args.seed, work_dir)
+            benchmarks.extend(router)
+        phys = args.phys
+        if phys is None:
+            phys = sorted(glob.glob(os.path.join(TEST_DATA, '*.phys')))
+        if not phys and routed_phys_netlist is not None:
+            print("Routing synthetic design...")
+            phys = [routed_phys_netlist()]
+        for phys_name in phys:
+            benchmarks.extend(analyzer_benchmarks(stack, phys_name))
+        if not benchmarks:
+            parser.error('no inputs: provide --device or --phys, or run `make get-test-data` in wirelength_analyzer/')
+        if args.filter is not None:
+            benchmarks = [b for b in benchmarks if re.search(args.filter, b.name)]
+        if args.list:
+            for b in benchmarks:
+                print(b.name + ': ' + b.inputs)
+            return
+
+        baseline = load_results(args.baseline) if args.baseline is not None else None
+        results = {
+            'version': RESULTS_VERSION,
+            'python': platform.python_version(),
+            'warmup': args.warmup,
+            'repeats': args.repeats,
+            'benchmarks': {},
+        }
+        print()
+        print("%-70s %10s %10s %10s %8s  %s" % ('Benchmark', 'Min (s)', 'Median (s)', 'Base (s)', 'Change', 'Status'))
+        print("-" * 125)
+        regressions = []
+        for b in benchmarks:
+            times = b.measure(args.warmup, args.repeats)
+            result = {
+                'inputs': b.inputs,
+                'times': times,
+                'min': min(times),
+                'median': statistics.median(times),
+            }
+            results['benchmarks'][b.name] = result
+            base, status = compare(b.name, result, baseline, args.threshold)
+            change = '' if base is None else '%+.1f%%' % (100 * (result['min'] / base - 1))
+            print("%-70s %10.4f %10.4f %10s %8s  %s" % (b.name, result['min'], result['median'],
+                  '' if base is None else '%.4f' % base, change, status), flush=True)
+            if status == 'regression':
+                regressions.append(b.name)
+
+    if args.save is not None:
+        save_results(args.save, results)
+        print("Saved results to " + args.save)
+    if args.baseline is not None and baseline is None:
+        save_results(args.baseline, results)
+        print("Saved results as baseline to " + args.baseline)
+    if regressions:
+        print("%d benchmark(s) regressed by more than %.0f%%: %s" % (len(regressions), 100 * args.threshold, ', '.join(regressions)))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
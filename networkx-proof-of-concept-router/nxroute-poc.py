@@ -23,9 +23,10 @@ its shortest-path algorithms to find routing solutions. Since NetworkX is a
 pure Python package, runtime and memory performance is expected to be poor.
 For this reason, by default only a subset of the FPGA routing graph is
 constructed, and by extension only those pins entirely contained within are
-routed. Furthermore, since this is a proof-of-concept there is no effort to
-eliminate overlaps (nodes driven by more than one net) leading to a partially
-valid solution.
+routed (alternatively, --window routes every net by building the routing graph
+of only one window of the device at a time). Furthermore, since this is a
+proof-of-concept there is no effort to eliminate overlaps (nodes driven by more
+than one net) leading to a partially valid solution.
 
 Please see the contest website for more information and example output.
 
@@ -38,15 +39,29 @@ import os
 import time
 import capnp
 import gzip
+import argparse
+import hashlib
+import pickle
 import networkx as nx
 import re
+import itertools
+import multiprocessing
+import multiprocessing.pool
+import heapq
 import resource
+import tracemalloc
+from array import array
+from collections import OrderedDict
 from contextlib import contextmanager
 
 # Tell pycapnp to search for schema files inside the
 # FPGA Interchange Schema repository
 sys.path.append('fpga-interchange-schema/interchange')
 
+# Share the wirelength analyzer's device data (and the analyzer itself)
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'wirelength_analyzer'))
+from xcvup_device_data import xcvupDeviceData
+
 class NxRoutingGraph(nx.DiGraph):
         """NetworkX-based Routing Graph
 
@@ -58,6 +73,19 @@ class NxRoutingGraph(nx.DiGraph):
 
         Parsing also builds a set of dictionaries that will aid in computing site pin
         to graph node and edge to PIP lookups.
+
+        When LAZY is set, the out-edges of each node are only built when first
+        needed (see LazyAdjacency). Such a graph keeps a reader of the
+        DeviceResources (along with its un-gzipped data) open until close() is
+        called, after which no further out-edges can be built. Since the in-edges
+        of a node are not known until the out-edges of its drivers have been
+        built, a lazily-built graph also has the following limitations:
+          - it has no reverse CSR, so NxRouter always routes it by the
+            unidirectional lowest-cost search of findCheapestPath(), never by
+            the bidirectional breadth-first search of findPath() or by
+            findCheapestPathBidirectional()
+          - it cannot be checkpointed (see NxRouter.saveCheckpoint())
+          - tile2wire2node is kept after NxRouter.parse(), to build out-edges
         """
 
         # Clock Region X2Y1:X4Y3 (requires <16GB RAM)
@@ -72,6 +100,20 @@ class NxRoutingGraph(nx.DiGraph):
         # MIN_Y = 0
         # MAX_Y = sys.maxsize
 
+        # Measure the memory used by each data structure after every phase of
+        # build() and extrapolate it to the entire device (see GraphMemoryReport)
+        MEMORY_REPORT = False
+
+        # Rather than inserting every edge up front, build the out-edges of each
+        # node from the PIPs of its tiles when first needed (see LazyAdjacency),
+        # keeping those of at most LAZY_CACHE_NODES nodes at any time (see the
+        # class docstring for the limitations of such a graph)
+        LAZY = False
+        LAZY_CACHE_NODES = 1 << 20
+
+        # Every tile name ends with the X/Y coordinates of the tile
+        TILE_NAME_XY = re.compile(r'[A-Z0-9_]+_X(\d+)Y(\d+)')
+
         class CustomEdgeAttribute:
                 """By default, networkx uses a dict object as the container for all edge attributes.
                    Since our graph exclusively and compulsorily stores a single 'pip' edge attribute,
@@ -92,10 +134,9 @@ class NxRoutingGraph(nx.DiGraph):
 
         class CustomNodeAttribute:
                 """By default, networkx uses a dict object as the container for all node attributes.
-                   Since only a small subset of graph nodes will contain node attributes (e.g. 'sp'
-                   attribute indicating a sink site pin, and <netName> indicating the name of the net
-                   routing through this node) improve memory efficiency by using a custom slotted
-                   class with a lazily-initialized dictionary"""
+                   Since few (if any) graph nodes will contain node attributes (the routing state of
+                   each design is kept by NxRouter instead) improve memory efficiency by using a custom
+                   slotted class with a lazily-initialized dictionary"""
                 __slots__ = ('lazyDict',)
                 emptyDict = {}
                 def __init__(self):
@@ -123,7 +164,9 @@ class NxRoutingGraph(nx.DiGraph):
                         return key in self._read()
         node_attr_dict_factory = CustomNodeAttribute
 
-        def build(self, filename):
+        def build(self, filename, data=None):
+                """Build the routing graph of all tiles within bounds from the given
+                   DeviceResources file (or its already un-gzipped data)"""
                 print('Building routing graph...')
                 # The following mapping is used by getNodeFromSitePin()
                 #   Mapping from tileType to (siteType,pinName) to wire
@@ -132,28 +175,51 @@ class NxRoutingGraph(nx.DiGraph):
                 self.site2tileAndTypes = {}
                 #   Mapping from tile to wire to node
                 self.tile2wire2node = {}
+                # The following arrays (indexed by node) hold the X/Y coordinates
+                # of the tile containing each node's base wire
+                self.nodeX = None
+                self.nodeY = None
+                # The following array (indexed by node) holds the wirelength that
+                # the wirelength analyzer scores for using each node, as given by
+                # the wire-class table of xcvupDeviceData
+                self.nodeCost = None
+                # The following array (indexed by node) holds the wire type of each
+                # node -- the name of its base wire without any trailing track
+                # index, as an index into self.nodeTypeNames -- for use by Lookahead
+                self.nodeType = None
+                self.nodeTypeNames = []
+                # The following arrays hold the reverse adjacency of the graph as
+                # built (see buildReverseCSR())
+                self.revOffsets = None
+                self.revSources = None
                 # The following mapping used by getPIP()
                 #   Mapping from pipDataIndex to (wire0Name,wire1Name,forward)
                 self.pipData = []
 
+                report = GraphMemoryReport(self) if self.MEMORY_REPORT else None
+                if self.LAZY:
+                        self._adj = LazyAdjacency(self)
+                        self.adjlist_inner_dict_factory = LazyNeighbors
+
                 # Read the DeviceResources file from disk and un-gzip into memory
                 tstart = time.time()
-                with open(filename, 'rb') as f:
-                        f = gzip.GzipFile(fileobj=f)
-                        data = f.read()
+                if data is None:
+                        data = NxRoutingGraph.readDeviceResources(filename)
                 # Parse the loaded file using pycapnp
                 # Load 'DeviceResources.capnp'
                 import DeviceResources_capnp
                 with DeviceResources_capnp.Device.from_bytes(data, traversal_limit_in_words=sys.maxsize) as device:
                         tend = time.time()
                         print('\tRead DeviceResources: %.1fs' % (tend-tstart))
+                        if report:
+                                report.phase('reading DeviceResources')
                         tstart = time.time()
                         s = CachedTextList(device.strList)
 
-                        # Build a dictionary of all in-bounds tiles
-                        tileNames = set()
+                        # Build a dictionary of all in-bounds tiles (and their coordinates)
+                        tile2XY = {}
                         tiles = []
-                        reTileNameXY = re.compile(r'[A-Z0-9_]+_X(\d+)Y(\d+)')
+                        reTileNameXY = self.TILE_NAME_XY
                         MIN_X,MAX_X,MIN_Y,MAX_Y = self.MIN_X,self.MAX_X,self.MIN_Y,self.MAX_Y
                         for tile in device.tileList:
                                 m = reTileNameXY.match(s[tile.name])
@@ -163,87 +229,84 @@ class NxRoutingGraph(nx.DiGraph):
                                 y = int(m.group(2))
                                 if y < MIN_Y or y > MAX_Y:
                                         continue
-                                tileNames.add(tile.name)
+                                tile2XY[tile.name] = (x,y)
                                 tiles.append(tile)
 
                         # Insert nodes into graph (and build self.tile2wire2node)
                         wires = device.wires
                         add_node = self.add_node
                         tile2wire2nodeSetdefault = self.tile2wire2node.setdefault
+                        tile2XYGet = tile2XY.get
+                        numNodes = len(device.nodes)
+                        nodeX = self.nodeX = array('H', bytes(2 * numNodes))
+                        nodeY = self.nodeY = array('H', bytes(2 * numNodes))
+                        nodeCost = self.nodeCost = array('f', bytes(4 * numNodes))
+                        nodeType = self.nodeType = array('H', bytes(2 * numNodes))
+                        reTrailingDigits = re.compile(r'\d+$')
+                        type2index = {}
+                        wire2type = {}
+                        # The wirelength analyzer scores a PIP in an INT tile by the
+                        # name of the wire that it drives; cache whether each tile
+                        # is an INT tile, and the wirelength of each wire name
+                        pipWirelength = xcvupDeviceData().pip_wirelength
+                        tile2isInt = {}
+                        wire2cost = {}
                         # Note that DeviceResources provides a node -> wire mapping;
                         # here we have to build our own wire -> node
                         for nodeIdx,node in enumerate(device.nodes):
                                 # Treat the first wire of a node as the 'base' wire
                                 baseWireIdx = node.wires[0]
                                 baseWire = wires[baseWireIdx]
-                                if baseWire.tile not in tileNames:
+                                xy = tile2XYGet(baseWire.tile)
+                                if xy is None:
                                         # Node is in an out-of-bounds tile
                                         continue
                                 add_node(nodeIdx)
+                                nodeX[nodeIdx],nodeY[nodeIdx] = xy
+                                typeIdx = wire2type.get(baseWire.wire)
+                                if typeIdx is None:
+                                        typeName = reTrailingDigits.sub('', s[baseWire.wire])
+                                        typeIdx = wire2type[baseWire.wire] = type2index.setdefault(typeName, len(type2index))
+                                nodeType[nodeIdx] = typeIdx
                                 for wireIdx in node.wires:
                                         wire = wires[wireIdx]
                                         tileName = wire.tile
                                         wireName = wire.wire
                                         tile2wire2nodeSetdefault(tileName, {})[wireName] = nodeIdx
+                                        isInt = tile2isInt.get(tileName)
+                                        if isInt is None:
+                                                isInt = tile2isInt[tileName] = s[tileName].startswith('INT_')
+                                        if isInt:
+                                                cost = wire2cost.get(wireName)
+                                                if cost is None:
+                                                        cost = wire2cost[wireName] = pipWirelength(s[wireName]) or 0
+                                                if cost:
+                                                        nodeCost[nodeIdx] = cost
+                        self.nodeTypeNames = list(type2index)
                         tend = time.time()
-                        print('\tBuild %d graph nodes: %.1fs' % (self.number_of_nodes(),tend-tstart))
+                        print('\tBuild %d graph nodes (%d wire types): %.1fs' % (self.number_of_nodes(),len(type2index),tend-tstart))
+                        if report:
+                                report.phase('building graph nodes')
                         tstart = time.time()
 
-                        # Insert edges into graph (and build self.pipData)
-                        pipData2index = {}
-                        tile2wire2nodeGet = self.tile2wire2node.get
-                        tileTypes = device.tileTypeList
-                        pipData = self.pipData
-                        add_edge = self.add_edge
-                        pipData2indexSetdefault = pipData2index.setdefault
-                        for tile in tiles:
-                                wire2node = tile2wire2nodeGet(tile.name)
-                                if wire2node is None:
-                                        # No nodes in this tile
-                                        continue
-                                wire2nodeGet = wire2node.get
-                                tileName = s[tile.name]
-                                isCleOrRclkTile = tileName.startswith('CLE') or tileName.startswith('RCLK')
-                                tileType = tileTypes[tile.type]
-                                tileWires = tileType.wires
-                                # Note that the tileType determines the (superset) of all
-                                # PIPs that can exist; certain conditions (e.g. tiles at
-                                # the boundary of the device, or CLB tiles that border
-                                # non-CLB tiles) may result irregularity which is captured
-                                # by the fact that either wire on the PIP does not have a
-                                # corresponding node
-                                for pip in tileType.pips:
-                                        if isCleOrRclkTile and pip.which() != 'conventional':
-                                                # Ignore non-conventional PIPs on CLE tiles
-                                                # (LUT route-thrus that traverse an entire site)
-                                                # and on RCLK tiles (BUFCE route-thrus that access
-                                                # the global routing network)
-                                                continue
-                                        wire0Name = tileWires[pip.wire0]
-                                        node0Idx = wire2nodeGet(wire0Name)
-                                        if node0Idx is None:
-                                                # At least one wire does not exist, thus PIP cannot exist
-                                                continue
-                                        wire1Name = tileWires[pip.wire1]
-                                        node1Idx = wire2nodeGet(wire1Name)
-                                        if node1Idx is None:
-                                                # At least one wire does not exist, thus PIP cannot exist
-                                                continue
-                                        # Add to self.pipData if not already seen
-                                        forward = True
-                                        pipDataIndex = pipData2indexSetdefault((wire0Name,wire1Name,forward), len(pipData))
-                                        if pipDataIndex == len(pipData):
-                                                pipData.append((s[wire0Name],s[wire1Name],forward))
-                                        add_edge(node0Idx, node1Idx, pip=(tileName,pipDataIndex))
-                                        # Add reverse edge for bidirectional PIPs
-                                        if not pip.directional:
-                                                forward = False
-                                                pipDataIndex = pipData2indexSetdefault((wire0Name,wire1Name,forward), len(pipData))
-                                                if pipDataIndex == len(pipData):
-                                                        pipData.append((s[wire0Name],s[wire1Name],forward))
-                                                add_edge(node1Idx, node0Idx, pip=(tileName,pipDataIndex))
-                        tend = time.time()
-                        print('\tBuild %d graph edges: %.1fs' % (self.number_of_edges(),tend-tstart))
+                        if self.LAZY:
+                                self._succ.open(data, tiles)
+                                tend = time.time()
+                                print('\tPrepare lazy graph edges for %d tiles: %.1fs' % (len(tiles),tend-tstart))
+                        else:
+                                self.buildEdges(device, s, tiles)
+                                tend = time.time()
+                                print('\tBuild %d graph edges: %.1fs' % (self.number_of_edges(),tend-tstart))
+                        if report:
+                                report.phase('building graph edges')
+
+                        if not self.LAZY:
+                                tstart = time.time()
+                                self.buildReverseCSR(numNodes)
+                                tend = time.time()
+                                print('\tBuild reverse CSR: %.1fs' % (tend-tstart))
+                                if report:
+                                        report.phase('building reverse CSR')
 
                         tstart = time.time()
                         # Build mapping from siteType to pinIndex to pinName
@@ -275,6 +338,108 @@ class NxRoutingGraph(nx.DiGraph):
                                 for k,v in self.tile2wire2node.items()}
                         tend = time.time()
                         print('\tBuild lookups: %.1fs' % (tend-tstart))
+                        if report:
+                                report.phase('building lookups')
+                                report.extrapolate(len(device.tileList), len(tiles), numNodes)
+
+        def readDeviceResources(filename):
+                """Read a DeviceResources file from disk and un-gzip into memory"""
+                with open(filename, 'rb') as f:
+                        f = gzip.GzipFile(fileobj=f)
+                        return f.read()
+
+        def siteCoordinates(data):
+                """Return a mapping from the name of every site in the given (un-gzipped)
+                   DeviceResources to the X/Y coordinates of its tile, along with
+                   the largest X and Y coordinates of any tile"""
+                site2XY = {}
+                maxX = maxY = 0
+                import DeviceResources_capnp
+                with DeviceResources_capnp.Device.from_bytes(data, traversal_limit_in_words=sys.maxsize) as device:
+                        s = CachedTextList(device.strList)
+                        reTileNameXY = NxRoutingGraph.TILE_NAME_XY
+                        for tile in device.tileList:
+                                m = reTileNameXY.match(s[tile.name])
+                                xy = (int(m.group(1)),int(m.group(2)))
+                                maxX,maxY = max(maxX, xy[0]),max(maxY, xy[1])
+                                for site in tile.sites:
+                                        site2XY[s[site.name]] = xy
+                return site2XY,maxX,maxY
+
+        def buildEdges(self, device, s, tiles):
+                """Insert the edges of all PIPs in the given tiles into the graph
+                   (and build self.pipData)"""
+                pipData2index = {}
+                tile2wire2nodeGet = self.tile2wire2node.get
+                tileTypes = device.tileTypeList
+                pipData = self.pipData
+                add_edge = self.add_edge
+                pipData2indexSetdefault = pipData2index.setdefault
+                for tile in tiles:
+                        wire2node = tile2wire2nodeGet(tile.name)
+                        if wire2node is None:
+                                # No nodes in this tile
+                                continue
+                        wire2nodeGet = wire2node.get
+                        tileName = s[tile.name]
+                        isCleOrRclkTile = tileName.startswith('CLE') or tileName.startswith('RCLK')
+                        tileType = tileTypes[tile.type]
+                        tileWires = tileType.wires
+                        # Note that the tileType determines the (superset) of all
+                        # PIPs that can exist; certain conditions (e.g. tiles at
+                        # the boundary of the device, or CLB tiles that border
+                        # non-CLB tiles) may result irregularity which is captured
+                        # by the fact that either wire on the PIP does not have a
+                        # corresponding node
+                        for pip in tileType.pips:
+                                if isCleOrRclkTile and pip.which() != 'conventional':
+                                        # Ignore non-conventional PIPs on CLE tiles
+                                        # (LUT route-thrus that traverse an entire site)
+                                        # and on RCLK tiles (BUFCE route-thrus that access
+                                        # the global routing network)
+                                        continue
+                                wire0Name = tileWires[pip.wire0]
+                                node0Idx = wire2nodeGet(wire0Name)
+                                if node0Idx is None:
+                                        # At least one wire does not exist, thus PIP cannot exist
+                                        continue
+                                wire1Name = tileWires[pip.wire1]
+                                node1Idx = wire2nodeGet(wire1Name)
+                                if node1Idx is None:
+                                        # At least one wire does not exist, thus PIP cannot exist
+                                        continue
+                                # Add to self.pipData if not already seen
+                                forward = True
+                                pipDataIndex = pipData2indexSetdefault((wire0Name,wire1Name,forward), len(pipData))
+                                if pipDataIndex == len(pipData):
+                                        pipData.append((s[wire0Name],s[wire1Name],forward))
+                                add_edge(node0Idx, node1Idx, pip=(tileName,pipDataIndex))
+                                # Add reverse edge for bidirectional PIPs
+                                if not pip.directional:
+                                        forward = False
+                                        pipDataIndex = pipData2indexSetdefault((wire0Name,wire1Name,forward), len(pipData))
+                                        if pipDataIndex == len(pipData):
+                                                pipData.append((s[wire0Name],s[wire1Name],forward))
+                                        add_edge(node1Idx, node0Idx, pip=(tileName,pipDataIndex))
+
+        def buildReverseCSR(self, numNodes):
+                """Build the reverse adjacency of the graph as a transposed CSR, such
+                   that the predecessors of node v are
+                   revSources[revOffsets[v]:revOffsets[v+1]]"""
+                predGet = self._pred.get
+                revOffsets = self.revOffsets = array('I', bytes(4 * (numNodes + 1)))
+                revSources = self.revSources = array('I')
+                for v in range(numNodes):
+                        preds = predGet(v)
+                        if preds:
+                                revSources.extend(preds)
+                        revOffsets[v + 1] = len(revSources)
+
+        def close(self):
+                """Release the DeviceResources reader kept open by a lazily-built
+                   graph (see LazyAdjacency.close())"""
+                if isinstance(self._succ, LazyAdjacency):
+                        self._succ.close()
 
         def getNodeFromSitePin(self, siteName, pinName):
                 tileAndTypes = self.site2tileAndTypes.get(siteName)
@@ -290,6 +455,734 @@ class NxRoutingGraph(nx.DiGraph):
                 wire0Name,wire1Name,forward = self.pipData[wirePairIdx]
                 return (tileName,wire0Name,wire1Name,forward)
 
+class LazyNeighbors(dict):
+        """Per-node adjacency dict of a lazily-built NxRoutingGraph, recording
+           whether the out-edges of its node have been built. Since edges are
+           only ever built from PIPs, and never removed by the router (see
+           NxRouter.parse()), they can be discarded and rebuilt at any time"""
+        __slots__ = ('state',)
+        UNBUILT = 0
+        BUILT = 1
+        def __init__(self):
+                self.state = self.UNBUILT
+
+class LazyAdjacency(dict):
+        """Successor adjacency (_succ) of a lazily-built NxRoutingGraph
+
+        Rather than inserting the edges of every PIP of every tile up front, the
+        out-edges of a node are built the first time that they are accessed, from
+        the PIPs (of the tile type) of every tile that contains one of the
+        node's wires. Since the PIPs of every tile of the same type are the
+        same, these are collected once per tile type as a template of wire name
+        to (wire name,pipDataIndex) of every PIP driven from it.
+
+        Nodes whose out-edges are built are kept in least-recently-used order;
+        beyond NxRoutingGraph.LAZY_CACHE_NODES the least-recently-used are
+        discarded (and rebuilt if accessed again), so that memory tracks the
+        region of the graph being explored.
+        """
+
+        def __init__(self, G):
+                super().__init__()
+                self.G = G
+                self.lru = OrderedDict()
+                self.numBuilt = 0
+                self.numEvicted = 0
+                self.deviceContext = None
+
+        def open(self, data, tiles):
+                """Keep a reader of the DeviceResources (in its un-gzipped data) open
+                   for building out-edges, given all in-bounds tiles"""
+                import DeviceResources_capnp
+                self.deviceContext = DeviceResources_capnp.Device.from_bytes(data, traversal_limit_in_words=sys.maxsize)
+                device = self.deviceContext.__enter__()
+                self.s = CachedTextList(device.strList)
+                self.deviceNodes = device.nodes
+                self.deviceWires = device.wires
+                self.tileTypes = device.tileTypeList
+                self.tile2info = {}
+                for tile in tiles:
+                        tileName = self.s[tile.name]
+                        isCleOrRclkTile = tileName.startswith('CLE') or tileName.startswith('RCLK')
+                        self.tile2info[tile.name] = (tileName,tile.type,isCleOrRclkTile)
+                self.templates = {}
+                self.pipData2index = {}
+
+        def close(self):
+                """Exit the DeviceResources reader opened by open(), releasing it
+                   along with its un-gzipped data. Out-edges that have already been
+                   built remain, but no others can be built"""
+                if self.deviceContext is None:
+                        return
+                self.deviceContext.__exit__(None, None, None)
+                self.deviceContext = None
+                self.s = self.deviceNodes = self.deviceWires = self.tileTypes = None
+                self.templates.clear()
+
+        def __getitem__(self, u):
+                nbrs = dict.__getitem__(self, u)
+                if nbrs.state == LazyNeighbors.BUILT:
+                        self.lru.move_to_end(u)
+                else:
+                        if self.deviceContext is None:
+                                raise RuntimeError('Cannot build the out-edges of node %d after close()' % u)
+                        self.build(u, nbrs)
+                return nbrs
+
+        def get(self, u, default=None):
+                return self[u] if u in self else default
+
+        def __delitem__(self, u):
+                dict.__delitem__(self, u)
+                self.lru.pop(u, None)
+
+        def template(self, tileTypeIdx, isCleOrRclkTile):
+                """Return the mapping from wire name to (wire name,pipDataIndex) of
+                   every PIP that it drives in a tile of the given type"""
+                template = self.templates.get((tileTypeIdx,isCleOrRclkTile))
+                if template is not None:
+                        return template
+                template = self.templates[tileTypeIdx,isCleOrRclkTile] = {}
+                s = self.s
+                tileType = self.tileTypes[tileTypeIdx]
+                tileWires = tileType.wires
+                for pip in tileType.pips:
+                        if isCleOrRclkTile and pip.which() != 'conventional':
+                                # Ignore non-conventional PIPs on CLE and RCLK tiles (as
+                                # NxRoutingGraph.buildEdges() does)
+                                continue
+                        wire0Name = s[tileWires[pip.wire0]]
+                        wire1Name = s[tileWires[pip.wire1]]
+                        template.setdefault(wire0Name, []).append((wire1Name,self.pipDataIndex(wire0Name,wire1Name,True)))
+                        # Add reverse edge for bidirectional PIPs
+                        if not pip.directional:
+                                template.setdefault(wire1Name, []).append((wire0Name,self.pipDataIndex(wire0Name,wire1Name,False)))
+                return template
+
+        def pipDataIndex(self, wire0Name, wire1Name, forward):
+                pipData = self.G.pipData
+                pipDataIndex = self.pipData2index.setdefault((wire0Name,wire1Name,forward), len(pipData))
+                if pipDataIndex == len(pipData):
+                        pipData.append((wire0Name,wire1Name,forward))
+                return pipDataIndex
+
+        def build(self, u, nbrs):
+                """Build the out-edges of node u into its (empty) nbrs"""
+                G = self.G
+                s = self.s
+                nodes = G._node
+                pred = G._pred
+                tile2wire2node = G.tile2wire2node
+                for wireIdx in self.deviceNodes[u].wires:
+                        wire = self.deviceWires[wireIdx]
+                        info = self.tile2info.get(wire.tile)
+                        if info is None:
+                                # Wire is in an out-of-bounds tile
+                                continue
+                        tileName,tileTypeIdx,isCleOrRclkTile = info
+                        pips = self.template(tileTypeIdx, isCleOrRclkTile).get(s[wire.wire])
+                        if not pips:
+                                continue
+                        wire2node = tile2wire2node[tileName]
+                        for wireName,pipDataIndex in pips:
+                                v = wire2node.get(wireName)
+                                if v is None or v not in nodes:
+                                        # Wire does not exist, or its node is not in the graph
+                                        continue
+                                attr = NxRoutingGraph.CustomEdgeAttribute()
+                                attr.tile,attr.pipDataIndex = tileName,pipDataIndex
+                                nbrs[v] = attr
+                                pred[v][u] = attr
+                nbrs.state = LazyNeighbors.BUILT
+                self.numBuilt += 1
+                lru = self.lru
+                lru[u] = None
+                if len(lru) > G.LAZY_CACHE_NODES:
+                        self.evict()
+
+        def evict(self):
+                """Discard the out-edges of the least-recently-used nodes until no
+                   more than LAZY_CACHE_NODES remain"""
+                lru = self.lru
+                pred = self.G._pred
+                while len(lru) > self.G.LAZY_CACHE_NODES:
+                        w,_ = lru.popitem(last=False)
+                        nbrs = dict.__getitem__(self, w)
+                        for x in nbrs:
+                                dict.__delitem__(pred[x], w)
+                        dict.clear(nbrs)
+                        nbrs.state = LazyNeighbors.UNBUILT
+                        self.numEvicted += 1
+
+class GraphMemoryReport:
+        """Memory accounting for NxRoutingGraph.build()
+
+        After every build phase, a tracemalloc snapshot is compared against the
+        previous one to report the memory allocated during that phase (and its
+        largest allocation sites). The bytes held by each of the graph's data
+        structures are then measured by walking every object reachable from it,
+        with objects shared between structures (e.g. node indices) attributed to
+        the first structure that reaches them.
+
+        Once built, extrapolate() scales each structure's size to the entire
+        device by the ratio of all nodes (or tiles) to those within the
+        MIN_X/MAX_X/MIN_Y/MAX_Y bounding box.
+        """
+
+        # How each structure is expected to scale with the size of the device:
+        # with the number of nodes, the number of tiles, or not at all
+        SCALING = {
+                'node attributes':               'nodes',
+                'edge attributes':               'tiles',
+                'adjacency':                     'nodes',
+                'pipData':                       None,
+                'nodeX/nodeY':                   None,
+                'nodeCost':                      None,
+                'nodeType':                      None,
+                'revOffsets':                    None,
+                'revSources':                    'nodes',
+                'tile2wire2node':                'nodes',
+                'site2tileAndTypes':             'tiles',
+                'tileType2SiteTypePinName2wire': None,
+        }
+
+        def __init__(self, G):
+                self.G = G
+                self.sizes = {}
+                tracemalloc.start()
+                self.snapshot = self.takeSnapshot()
+
+        @staticmethod
+        def takeSnapshot():
+                # Ignore memory held by previous snapshots
+                return tracemalloc.take_snapshot().filter_traces([tracemalloc.Filter(False, tracemalloc.__file__)])
+
+        def phase(self, name):
+                snapshot = self.takeSnapshot()
+                stats = snapshot.compare_to(self.snapshot, 'lineno')
+                self.snapshot = snapshot
+                current,peak = tracemalloc.get_traced_memory()
+                print('\tMemory after %s: %+.1fMB (current %.1fMB, peak %.1fMB)' % (name,
+                        sum(stat.size_diff for stat in stats) / 2**20,current / 2**20,peak / 2**20))
+                for stat in stats[:3]:
+                        frame = stat.traceback[0]
+                        print('\t\t%+10.1fMB  %s:%d' % (stat.size_diff / 2**20,os.path.basename(frame.filename),frame.lineno))
+                self.sizes = self.measure()
+                for structure,size in self.sizes.items():
+                        print('\t\t%10.1fMB  %s' % (size / 2**20,structure))
+                # Exclude the cost of measure() from the next phase's peak
+                tracemalloc.reset_peak()
+
+        def measure(self):
+                """Return a dictionary of bytes used by each (existing) data structure"""
+                G = self.G
+                seen = set()
+                sizes = {}
+                sizes['node attributes'] = self.sizeOf([G._node], seen)
+                sizes['edge attributes'] = self.sizeOf((attr for nbrs in G._succ.values() for attr in nbrs.values()), seen)
+                sizes['adjacency'] = self.sizeOf([G._succ,G._pred], seen)
+                sizes['pipData'] = self.sizeOf([G.pipData], seen)
+                if G.nodeX is not None:
+                        sizes['nodeX/nodeY'] = self.sizeOf([G.nodeX,G.nodeY], seen)
+                if G.nodeCost is not None:
+                        sizes['nodeCost'] = self.sizeOf([G.nodeCost], seen)
+                if G.nodeType is not None:
+                        sizes['nodeType'] = self.sizeOf([G.nodeType,G.nodeTypeNames], seen)
+                if G.revOffsets is not None:
+                        sizes['revOffsets'] = self.sizeOf([G.revOffsets], seen)
+                        sizes['revSources'] = self.sizeOf([G.revSources], seen)
+                for lookup in ('tile2wire2node','site2tileAndTypes','tileType2SiteTypePinName2wire'):
+                        sizes[lookup] = self.sizeOf([getattr(G, lookup)], seen)
+                return sizes
+
+        @staticmethod
+        def sizeOf(objs, seen):
+                """Return the total size in bytes of all objects reachable from objs
+                   that are not already in seen (which is updated)"""
+                size = 0
+                stack = list(objs)
+                while stack:
+                        obj = stack.pop()
+                        if id(obj) in seen:
+                                continue
+                        seen.add(id(obj))
+                        size += sys.getsizeof(obj)
+                        if isinstance(obj, dict):
+                                stack.extend(obj.keys())
+                                stack.extend(obj.values())
+                        elif isinstance(obj, (list,tuple,set)):
+                                stack.extend(obj)
+                        else:
+                                slots = getattr(type(obj), '__slots__', ())
+                                for slot in (slots,) if isinstance(slots, str) else slots:
+                                        if hasattr(obj, slot):
+                                                stack.append(getattr(obj, slot))
+                return size
+
+        def extrapolate(self, numDeviceTiles, numTiles, numDeviceNodes):
+                numNodes = self.G.number_of_nodes()
+                scale = {
+                        'nodes': numDeviceNodes / max(numNodes, 1),
+                        'tiles': numDeviceTiles / max(numTiles, 1),
+                        None: 1,
+                }
+                print('\tEstimated memory for entire device (%d of %d tiles, %d of %d nodes built):' % (numTiles,numDeviceTiles,numNodes,numDeviceNodes))
+                total = 0
+                for structure,size in self.sizes.items():
+                        estimate = size * scale[self.SCALING[structure]]
+                        total += estimate
+                        print('\t\t%10.1fMB  %s' % (estimate / 2**20,structure))
+                print('\t\t%10.1fMB  total' % (total / 2**20))
+
+class NetScheduler:
+        """Net ordering and batching for NxRouter.route()
+
+        Each net is summarized by the bounding box of the tiles containing its
+        source and sink nodes. The chosen policy then orders all nets by:
+          'default' -- the order in which they appear in the PhysicalNetlist
+          'fanout'  -- descending number of sinks
+          'bbox'    -- descending bounding box area
+          'hilbert' -- position of the bounding box centre along a Hilbert curve
+
+        If clusterSize is non-zero, nets are also batched by the clusterSize x
+        clusterSize tile region containing their bounding box centre, with regions
+        visited in Hilbert order (and the policy order retained within each region)
+        so that consecutive searches touch a similar set of graph nodes.
+        If sortSinks is set, the sinks of each net are ordered nearest-first to
+        its first source.
+        """
+
+        def __init__(self, G, policy='default', clusterSize=0, sortSinks=False):
+                self.policies = {
+                        'default': self.defaultOrder,
+                        'fanout':  self.fanoutOrder,
+                        'bbox':    self.bboxOrder,
+                        'hilbert': self.hilbertOrder,
+                }
+                if policy not in self.policies:
+                        raise ValueError('Unrecognized net ordering policy: ' + policy)
+                self.G = G
+                self.policy = policy
+                self.clusterSize = clusterSize
+                self.sortSinks = sortSinks
+
+        def schedule(self, net2pin2node):
+                """Return a list of batches, where each batch is a list of
+                   (netName,sinkNodes) tuples to be routed in that order"""
+                nodeX,nodeY = self.G.nodeX,self.G.nodeY
+                nets = []
+                for netName,(sourcePin2node,sinkNodes) in net2pin2node.items():
+                        sourceNodes = list(sourcePin2node.values())
+                        xs = [nodeX[n] for n in sourceNodes] + [nodeX[n] for n in sinkNodes]
+                        ys = [nodeY[n] for n in sourceNodes] + [nodeY[n] for n in sinkNodes]
+                        bbox = (min(xs),max(xs),min(ys),max(ys))
+                        if self.sortSinks:
+                                x,y = nodeX[sourceNodes[0]],nodeY[sourceNodes[0]]
+                                sinkNodes = sorted(sinkNodes, key=lambda n: abs(nodeX[n] - x) + abs(nodeY[n] - y))
+                        nets.append((netName,sinkNodes,bbox))
+
+                key = self.policies[self.policy]
+                if key is not self.defaultOrder:
+                        # Python's sort is stable, so ties retain their original order
+                        nets.sort(key=lambda net: key(net[1], net[2]))
+
+                if not self.clusterSize:
+                        return [[(netName,sinkNodes) for netName,sinkNodes,_ in nets]]
+
+                def cluster(bbox):
+                        xmin,xmax,ymin,ymax = bbox
+                        return ((xmin + xmax) // 2 // self.clusterSize, (ymin + ymax) // 2 // self.clusterSize)
+                nets.sort(key=lambda net: self.hilbertIndex(*cluster(net[2])))
+                batches = []
+                lastCluster = None
+                for netName,sinkNodes,bbox in nets:
+                        thisCluster = cluster(bbox)
+                        if thisCluster != lastCluster:
+                                batches.append([])
+                                lastCluster = thisCluster
+                        batches[-1].append((netName,sinkNodes))
+                return batches
+
+        def defaultOrder(self, sinkNodes, bbox):
+                return 0
+
+        def fanoutOrder(self, sinkNodes, bbox):
+                return -len(sinkNodes)
+
+        def bboxOrder(self, sinkNodes, bbox):
+                xmin,xmax,ymin,ymax = bbox
+                return -(xmax - xmin + 1) * (ymax - ymin + 1)
+
+        def hilbertOrder(self, sinkNodes, bbox):
+                xmin,xmax,ymin,ymax = bbox
+                return self.hilbertIndex((xmin + xmax) // 2, (ymin + ymax) // 2)
+
+        @staticmethod
+        def hilbertIndex(x, y, order=16):
+                """Return the distance of (x,y) along a Hilbert curve that fills a
+                   2**order x 2**order grid"""
+                n = 1 << order
+                d = 0
+                s = n >> 1
+                while s:
+                        rx = 1 if x & s else 0
+                        ry = 1 if y & s else 0
+                        d += s * s * ((3 * rx) ^ ry)
+                        # Rotate the quadrant so that the curve remains continuous
+                        if ry == 0:
+                                if rx == 1:
+                                        x = n - 1 - x
+                                        y = n - 1 - y
+                                x,y = y,x
+                        s >>= 1
+                return d
+
+class Lookahead:
+        """Router lookahead for estimating the remaining cost to a sink
+
+        Since the INT fabric is highly regular, the lowest cost of reaching a
+        tile at offset (dx,dy) from a node depends (almost) only on the wire type
+        of that node (analogous to VPR's map lookahead). A table of these costs
+        is computed once, for every wire type, by a Dijkstra search from a node
+        of that type in each of a few representative INT tiles near the centre
+        of the routing graph, limited to within RADIUS_X/RADIUS_Y tiles; the
+        lowest cost seen from any sample is kept.
+
+        Offsets beyond the table are estimated from its edge plus a typical
+        (median over all wire types) cost per tile seen within it, and wire
+        types that were never sampled use the lowest cost of any type.
+
+        Note that these estimates are not admissible: the median rate can
+        overestimate the cost of reaching distant sinks, and a table taken
+        from only NUM_SAMPLE_TILES tiles need not bound the cost from nodes in
+        other tiles (e.g. near the edge of the fabric or a column of hard
+        blocks). An A* search guided by the lookahead is therefore a heuristic
+        that trades some path cost for far fewer expanded nodes, and is not
+        guaranteed to find the lowest-cost path.
+
+        Since it only depends on the routing graph and the node costs, the table
+        is saved to (and subsequently loaded from) disk by load().
+        """
+
+        # Bump whenever the contents of a file written by save() change
+        VERSION = 1
+
+        # Half-width and half-height of the table, in tiles
+        RADIUS_X = 4
+        RADIUS_Y = 8
+        # Number of INT tiles from which each wire type is sampled
+        NUM_SAMPLE_TILES = 2
+
+        def __init__(self, G, criticality):
+                self.G = G
+                self.criticality = criticality
+                self.radiusX = self.RADIUS_X
+                self.radiusY = self.RADIUS_Y
+                self.table = None
+                self.rateX = self.rateY = 0.0
+
+        @staticmethod
+        def load(filename, G, cost, criticality):
+                """Return a Lookahead for G read from filename, or if that does not
+                   exist (or was computed for a different routing graph or
+                   criticality) compute one from cost and save it to filename"""
+                lookahead = Lookahead(G, criticality)
+                tstart = time.time()
+                try:
+                        with gzip.open(filename, 'rb') as f:
+                                state = pickle.load(f)
+                except FileNotFoundError:
+                        state = None
+                if state and state['key'] == lookahead.key():
+                        lookahead.radiusX,lookahead.radiusY = state['radius']
+                        lookahead.rateX,lookahead.rateY = state['rates']
+                        lookahead.table = array('f')
+                        lookahead.table.frombytes(state['table'])
+                        tend = time.time()
+                        print('\tRead lookahead: %.1fs' % (tend-tstart))
+                        return lookahead
+                lookahead.compute(cost)
+                lookahead.save(filename)
+                tend = time.time()
+                print('\tCompute lookahead for %d wire types: %.1fs' % (len(G.nodeTypeNames),tend-tstart))
+                return lookahead
+
+        def key(self):
+                G = self.G
+                return (self.VERSION,self.criticality,
+                        (G.MIN_X,G.MAX_X,G.MIN_Y,G.MAX_Y),G.number_of_nodes(),G.nodeTypeNames)
+
+        def save(self, filename):
+                state = {
+                        'key': self.key(),
+                        'radius': (self.radiusX,self.radiusY),
+                        'rates': (self.rateX,self.rateY),
+                        'table': self.table.tobytes(),
+                }
+                with gzip.open(filename, 'wb') as f:
+                        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+        def sampleNodes(self):
+                """Return one node of each wire type from each of the NUM_SAMPLE_TILES
+                   INT tiles nearest the centre of the routing graph (the tiles of
+                   nodes that have a wirelength cost being those in the INT fabric)"""
+                G = self.G
+                nodeX,nodeY,nodeType,nodeCost = G.nodeX,G.nodeY,G.nodeType,G.nodeCost
+                intTiles = {(nodeX[n],nodeY[n]) for n in G if nodeCost[n]}
+                if not intTiles:
+                        return []
+                cx = (min(x for x,_ in intTiles) + max(x for x,_ in intTiles)) / 2
+                cy = (min(y for _,y in intTiles) + max(y for _,y in intTiles)) / 2
+                sampleTiles = set(sorted(intTiles, key=lambda xy: (abs(xy[0] - cx) + abs(xy[1] - cy),xy))[:self.NUM_SAMPLE_TILES])
+                samples = {}
+                for n in G:
+                        xy = (nodeX[n],nodeY[n])
+                        if xy in sampleTiles:
+                                samples.setdefault((xy,nodeType[n]), n)
+                return list(samples.values())
+
+        def compute(self, cost):
+                """Fill the table by a Dijkstra search (over the per-node costs given
+                   by the cost array) from every sampled node"""
+                G = self.G
+                succ = G._succ
+                nodeX,nodeY,nodeType = G.nodeX,G.nodeY,G.nodeType
+                rx,ry = self.radiusX,self.radiusY
+                width = 2 * ry + 1
+                rowSize = (2 * rx + 1) * width
+                numTypes = len(G.nodeTypeNames)
+                inf = float('inf')
+                table = [inf] * (rowSize * numTypes)
+                heappush,heappop = heapq.heappush,heapq.heappop
+                for source in self.sampleNodes():
+                        sx,sy = nodeX[source],nodeY[source]
+                        row = nodeType[source] * rowSize
+                        dist = {source: 0.0}
+                        heap = [(0.0,source)]
+                        done = set()
+                        while heap:
+                                d,u = heappop(heap)
+                                if u in done:
+                                        continue
+                                done.add(u)
+                                i = row + (nodeX[u] - sx + rx) * width + nodeY[u] - sy + ry
+                                if d < table[i]:
+                                        table[i] = d
+                                for v in succ[u]:
+                                        if v in done:
+                                                continue
+                                        dv = d + cost[v]
+                                        if dv < dist.get(v, inf):
+                                                if abs(nodeX[v] - sx) > rx or abs(nodeY[v] - sy) > ry:
+                                                        continue
+                                                dist[v] = dv
+                                                heappush(heap, (dv,v))
+
+                # Cost per tile in each direction, to extrapolate beyond the table: for
+                # every sampled wire type, the lowest cost per tile of reaching the
+                # edge of the table, of which the median over all types is taken
+                # (the minimum being dominated by the few types that themselves
+                # span many tiles)
+                ratesX = []
+                ratesY = []
+                for t in range(numTypes):
+                        row = t * rowSize
+                        edgeX = [table[row + i * width + j] for i in (0,2 * rx) for j in range(width)]
+                        edgeY = [table[row + i * width + j] for i in range(2 * rx + 1) for j in (0,2 * ry)]
+                        if rx and min(edgeX) != inf:
+                                ratesX.append(min(edgeX) / rx)
+                        if ry and min(edgeY) != inf:
+                                ratesY.append(min(edgeY) / ry)
+                self.rateX = sorted(ratesX)[len(ratesX) // 2] if ratesX else 0.0
+                self.rateY = sorted(ratesY)[len(ratesY) // 2] if ratesY else 0.0
+
+                # Wire types that were never sampled take the lowest cost of any type;
+                # offsets that were never reached are extrapolated from the rates
+                anyType = [min(table[t * rowSize + j] for t in range(numTypes)) for j in range(rowSize)]
+                for j,d in enumerate(anyType):
+                        if d == inf:
+                                anyType[j] = abs(j // width - rx) * self.rateX + abs(j % width - ry) * self.rateY
+                for t in range(numTypes):
+                        row = t * rowSize
+                        if all(table[row + j] == inf for j in range(rowSize)):
+                                table[row:row + rowSize] = anyType
+                        else:
+                                for j in range(rowSize):
+                                        if table[row + j] == inf:
+                                                table[row + j] = anyType[j]
+                self.table = array('f', table)
+
+        def estimator(self, sinkX, sinkY):
+                """Return a function that estimates the remaining cost from a node to
+                   a sink in the tile at (sinkX,sinkY)"""
+                table = self.table
+                nodeX,nodeY,nodeType = self.G.nodeX,self.G.nodeY,self.G.nodeType
+                rx,ry = self.radiusX,self.radiusY
+                rateX,rateY = self.rateX,self.rateY
+                width = 2 * ry + 1
+                rowSize = (2 * rx + 1) * width
+                def estimate(v):
+                        dx = sinkX - nodeX[v]
+                        dy = sinkY - nodeY[v]
+                        extra = 0.0
+                        if dx > rx:
+                                extra += (dx - rx) * rateX
+                                dx = rx
+                        elif dx < -rx:
+                                extra += (-rx - dx) * rateX
+                                dx = -rx
+                        if dy > ry:
+                                extra += (dy - ry) * rateY
+                                dy = ry
+                        elif dy < -ry:
+                                extra += (-ry - dy) * rateY
+                                dy = -ry
+                        return table[nodeType[v] * rowSize + (dx + rx) * width + dy + ry] + extra
+                return estimate
+
+class GlobalRouter:
+        """Coarse global router over a grid of cells of cellX by cellY tiles
+
+        The capacity of every cell is the number of routing wires (nodes of the
+        NxRoutingGraph with a nonzero nodeCost, and not blocked) whose base wire
+        is in one of its tiles. Every connection is routed from the cells of its source nodes to
+        the cell of its sink node by Dijkstra's algorithm over the grid, where
+        the cost of entering a cell grows with its utilization: the number of
+        connections already crossing it (each assumed to use DEMAND_WIRES of its
+        wires) over its capacity. Cells already crossed by another connection
+        of the same net are almost free, so that the connections of a net share
+        cells as their routing tree will share nodes.
+
+        The route of every connection, widened by a number of cells, gives the
+        corridor that its detailed search is confined to.
+        """
+
+        # Number of routing wires that a connection is assumed to use in every
+        # cell that it crosses
+        DEMAND_WIRES = 3
+        # Weight of the squared utilization of a cell in the cost of entering it
+        CONGESTION_WEIGHT = 4.0
+        # Cost of entering a cell that the same net already crosses
+        REUSE_COST = 0.1
+
+        def __init__(self, G, cellX, cellY, blocked):
+                self.cellX,self.cellY = cellX,cellY
+                nodeX,nodeY,nodeCost = G.nodeX,G.nodeY,G.nodeCost
+                self.numCellsX = max(nodeX) // cellX + 1
+                numCellsY = self.numCellsY = max(nodeY) // cellY + 1
+                numCells = self.numCellsX * numCellsY
+                capacity = self.capacity = array('I', bytes(4 * numCells))
+                self.demand = array('I', bytes(4 * numCells))
+                # The following array (indexed by node) holds the cell of every node
+                nodeCell = self.nodeCell = array('I', bytes(4 * len(nodeX)))
+                for n in G:
+                        cell = nodeCell[n] = (nodeX[n] // cellX) * numCellsY + nodeY[n] // cellY
+                        if nodeCost[n] and not blocked[n]:
+                                capacity[cell] += 1
+                # Mapping from net to sink node to the cells of its global route
+                self.net2sink2cells = {}
+
+        def route(self, nets, net2pin2node, marginX=None, marginY=None):
+                """Route every connection of the given (netName,sinkNodes) tuples, in
+                   order, within the bounding box of its source and sink cells
+                   extended by enough cells to cover marginX/Y tiles (or anywhere,
+                   if marginX is None)"""
+                nodeCell = self.nodeCell
+                numCellsY = self.numCellsY
+                demand = self.demand
+                if marginX is not None:
+                        marginX = -(-marginX // self.cellX)
+                        marginY = -(-marginY // self.cellY)
+                for netName,sinkNodes in nets:
+                        sourceCells = set(nodeCell[n] for n in net2pin2node[netName][0].values())
+                        netCells = set(sourceCells)
+                        sink2cells = self.net2sink2cells[netName] = {}
+                        for sinkNode in sinkNodes:
+                                sinkCell = nodeCell[sinkNode]
+                                if marginX is None:
+                                        bounds = (0,self.numCellsX - 1,0,numCellsY - 1)
+                                else:
+                                        xs = [c // numCellsY for c in sourceCells]
+                                        xs.append(sinkCell // numCellsY)
+                                        ys = [c % numCellsY for c in sourceCells]
+                                        ys.append(sinkCell % numCellsY)
+                                        bounds = (min(xs) - marginX,max(xs) + marginX,min(ys) - marginY,max(ys) + marginY)
+                                cells = self.findRoute(sourceCells, sinkCell, netCells, bounds)
+                                for cell in cells:
+                                        if cell not in netCells:
+                                                netCells.add(cell)
+                                                demand[cell] += 1
+                                sink2cells[sinkNode] = array('I', cells)
+
+        def findRoute(self, sourceCells, sinkCell, netCells, bounds):
+                """Return the lowest-cost list of cells from any of sourceCells to
+                   sinkCell, within bounds given as (xmin,xmax,ymin,ymax) cells"""
+                numCellsX,numCellsY = self.numCellsX,self.numCellsY
+                capacity,demand = self.capacity,self.demand
+                demandWires,weight,reuseCost = self.DEMAND_WIRES,self.CONGESTION_WEIGHT,self.REUSE_COST
+                xmin,xmax,ymin,ymax = bounds
+                xmin,xmax,ymin,ymax = max(0, xmin),min(numCellsX - 1, xmax),max(0, ymin),min(numCellsY - 1, ymax)
+                parent = dict.fromkeys(sourceCells)
+                dist = dict.fromkeys(parent, 0.0)
+                heap = [(0.0,c) for c in parent]
+                heapq.heapify(heap)
+                done = set()
+                heappush,heappop = heapq.heappush,heapq.heappop
+                while heap:
+                        d,c = heappop(heap)
+                        if c in done:
+                                continue
+                        if c == sinkCell:
+                                break
+                        done.add(c)
+                        x,y = divmod(c, numCellsY)
+                        for vx,vy in ((x - 1,y),(x + 1,y),(x,y - 1),(x,y + 1)):
+                                if not (xmin <= vx <= xmax and ymin <= vy <= ymax):
+                                        continue
+                                v = vx * numCellsY + vy
+                                if v in done:
+                                        continue
+                                if v in netCells:
+                                        dv = d + reuseCost
+                                else:
+                                        utilization = demand[v] * demandWires / max(1, capacity[v])
+                                        dv = d + 1 + weight * utilization * utilization
+                                if dv < dist.get(v, float('inf')):
+                                        dist[v] = dv
+                                        parent[v] = c
+                                        heappush(heap, (dv,v))
+                cells = []
+                c = sinkCell
+                while c is not None:
+                        cells.append(c)
+                        c = parent[c]
+                cells.reverse()
+                return cells
+
+        def numOverflowing(self):
+                """Return the number of cells whose demand exceeds their capacity"""
+                demandWires = self.DEMAND_WIRES
+                return sum(d * demandWires > c for d,c in zip(self.demand, self.capacity))
+
+        def corridor(self, netName, sinkNode, width):
+                """Return the corridor of a connection: its global route widened by
+                   width cells in every direction, as the (xmin,xmax,ymin,ymax)
+                   bounding box of its tiles and a bytearray (indexed by cell) that
+                   is nonzero for every cell within it"""
+                numCellsX,numCellsY = self.numCellsX,self.numCellsY
+                inCorridor = bytearray(numCellsX * numCellsY)
+                cells = self.net2sink2cells[netName][sinkNode]
+                xs = [c // numCellsY for c in cells]
+                ys = [c % numCellsY for c in cells]
+                for x,y in zip(xs, ys):
+                        ylo,yhi = max(0, y - width),min(numCellsY, y + width + 1)
+                        for vx in range(max(0, x - width), min(numCellsX, x + width + 1)):
+                                inCorridor[vx * numCellsY + ylo:vx * numCellsY + yhi] = b'\x01' * (yhi - ylo)
+                xmin,xmax = max(0, min(xs) - width),min(numCellsX - 1, max(xs) + width)
+                ymin,ymax = max(0, min(ys) - width),min(numCellsY - 1, max(ys) + width)
+                bbox = (xmin * self.cellX,(xmax + 1) * self.cellX - 1,ymin * self.cellY,(ymax + 1) * self.cellY - 1)
+                return bbox,inCorridor
+
 class NxRouter:
         """NetworkX-based Router
 
@@ -300,263 +1193,1271 @@ class NxRouter:
         Usage is through a with-statement context manager returned by the create() method.
         """
 
+        # Bump whenever the contents of a checkpoint written by saveCheckpoint() change
+        CHECKPOINT_VERSION = 6
+
+        # Each connection is searched only within the bounding box of its source
+        # and sink tiles, extended by these margins (analogous to RWRoute's
+        # bounding box extension); on failure, the margins are grown up to
+        # BBOX_EXPANSIONS times before the entire graph is searched
+        # (set BBOX_MARGIN_X to None to search the entire graph)
+        BBOX_MARGIN_X = 3
+        BBOX_MARGIN_Y = 15
+        BBOX_EXPANSIONS = 2
+
+        # When not None, connections are routed by a Dijkstra search where the
+        # cost of using each node blends a hop count with the wirelength scored
+        # for it (NxRoutingGraph.nodeCost) as (1-CRITICALITY) + CRITICALITY*cost,
+        # rather than by a breadth-first search that minimizes the hop count alone
+        CRITICALITY = None
+
+        # When not None, the filename of a Lookahead table (computed and saved if
+        # it does not exist) that guides the lowest-cost search towards each sink
+        # as an A* search (which, since the lookahead may overestimate, is no
+        # longer guaranteed to find the lowest-cost path); unless CRITICALITY is
+        # also given, every node costs 1
+        LOOKAHEAD = None
+
+        # When not None, connections whose source and sink are at least this many
+        # tiles apart (Manhattan distance) are routed by the lowest-cost search
+        # from both ends at once (see findCheapestPathBidirectional()); when
+        # BIDIRECTIONAL_REPORT is set, every connection is searched both ways and
+        # the number of connections for which each way expands fewer nodes is
+        # reported by connection length
+        BIDIRECTIONAL_DISTANCE = None
+        BIDIRECTIONAL_REPORT = False
+
+        # When not None, every connection is first routed over a coarse grid of
+        # cells of GLOBAL_CELL_X by GLOBAL_CELL_Y tiles (see GlobalRouter), and
+        # its detailed search is confined to the cells within GLOBAL_CORRIDOR
+        # cells of that global route, falling back to the bounding box alone
+        # if no path is found there
+        GLOBAL_CELL_X = None
+        GLOBAL_CELL_Y = None
+        GLOBAL_CORRIDOR = 1
+
+        # When set, a connection to a LUT input site pin may instead end at any
+        # other free input site pin of the same LUT, by the PIP that drives that
+        # pin's node; as required of pin-swapped routing, that PIP is then
+        # followed directly by the original site pin, so that CheckPhysNetlist
+        # can perform the swap (see docs/advanced.md)
+        LUT_PIN_SWAPPING = False
+        # Names of the LUT input site pins of a SLICE site
+        LUT_INPUT_PIN = re.compile(r'([A-H])[1-6]')
+
+        # When routing through routeWindowed(), the routing graph is only ever
+        # built for a single window of WINDOW_X by WINDOW_Y tiles, with adjacent
+        # windows overlapping by WINDOW_OVERLAP_X/Y tiles; each pass over the
+        # device routes every net whose bounding box (extended by BBOX_MARGIN_X/Y)
+        # fits entirely inside one of its windows, and every subsequent pass
+        # doubles the windows (building their edges lazily) for the rest
+        WINDOW_X = None
+        WINDOW_Y = None
+        WINDOW_OVERLAP_X = 16
+        WINDOW_OVERLAP_Y = 60
+
+        # Approximate memory needed per tile of the routing graph, from the
+        # <16GB required by the default 55x180 tile region of NxRoutingGraph
+        WINDOW_BYTES_PER_TILE = (16 << 30) // (55 * 180)
+
         @contextmanager
-        def create(deviceResourcesFilename, physNetlistFilename):
+        def create(deviceResourcesFilename, physNetlistFilename, previousFilename=None):
                 """Return a with-statement context manager instance of NxRouter
-                   with the routing graph built and the design parsed"""
-                router = NxRouter(deviceResourcesFilename)
+                   with the routing graph built and the design parsed, reusing the
+                   routing of a previously routed PhysicalNetlist if given (see
+                   reuseRoutes()).
+                   Since the two are independent until parse(), the design is
+                   extracted by a background process (see loadDesign()) while the
+                   routing graph is built. Meanwhile, the contents of the
+                   PhysicalNetlist(s) that parse() needs are read by a thread of this
+                   process, rather than transferred back from the background process
+                   (un-gzipping and hashing them releases the GIL)"""
+                # Fork where possible (as wa.py -j does), so that the worker inherits
+                # this module rather than importing it again
+                methods = multiprocessing.get_all_start_methods()
+                ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+                pool = ctx.Pool(1)
+                loading = pool.apply_async(NxRouter.loadDesign, (physNetlistFilename,))
+                pool.close()
+                def read():
+                        tstart = time.time()
+                        data = NxRouter.readPhysNetlist(physNetlistFilename)
+                        digest = hashlib.sha256(data).hexdigest()
+                        previousData = NxRouter.readPhysNetlist(previousFilename) if previousFilename else None
+                        tend = time.time()
+                        return data,digest,previousData,tend-tstart
+                # (Only started once the background process has been forked)
+                threads = multiprocessing.pool.ThreadPool(1)
+                reading = threads.apply_async(read)
+                threads.close()
+                try:
+                        router = NxRouter(deviceResourcesFilename)
+                except BaseException:
+                        # Do not leave the design loading if the graph could not be built
+                        pool.terminate()
+                        raise
 
                 print('Parsing design...')
                 tstart = time.time()
-                with open(physNetlistFilename, 'rb') as f:
-                        f = gzip.GzipFile(fileobj=f)
-                        data = f.read()
-                # Load 'DeviceResources.capnp'
+                try:
+                        design,loadTime = loading.get()
+                finally:
+                        pool.join()
+                try:
+                        data,digest,previousData,readTime = reading.get()
+                finally:
+                        threads.join()
+                tend = time.time()
+                print('\tRead PhysicalNetlist in background: %.1fs, extracted design in background: %.1fs (waited %.1fs)' % (readTime,loadTime,tend-tstart))
+                router.physNetlistDigest = digest
+                router.physNetlistData = data
+                # Load 'PhysicalNetlist.capnp'
+                import PhysicalNetlist_capnp
+                with PhysicalNetlist_capnp.PhysNetlist.from_bytes(data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**16) as netlist:
+                        if previousData is None:
+                                router.parse(netlist, design)
+                        else:
+                                with PhysicalNetlist_capnp.PhysNetlist.from_bytes(previousData, traversal_limit_in_words=sys.maxsize, nesting_limit=2**16) as previous:
+                                        router.parse(netlist, design, previous=previous)
+                        try:
+                                yield router
+                        finally:
+                                router.G.close()
+
+        @contextmanager
+        def resume(checkpointFilename, physNetlistFilename):
+                """Return a with-statement context manager instance of NxRouter
+                   restored from a checkpoint written by saveCheckpoint(), skipping
+                   both the routing graph build and design parse"""
+                print('Resuming from checkpoint...')
+                tstart = time.time()
+                with open(checkpointFilename, 'rb') as f:
+                        checkpoint = pickle.load(f)
+                if checkpoint.get('version') != NxRouter.CHECKPOINT_VERSION:
+                        raise ValueError('Checkpoint ' + checkpointFilename + ' has an unsupported version')
+                tend = time.time()
+                print('\tRead checkpoint: %.1fs' % (tend-tstart))
+
+                tstart = time.time()
+                data = NxRouter.readPhysNetlist(physNetlistFilename)
+                if hashlib.sha256(data).hexdigest() != checkpoint['physNetlistDigest']:
+                        raise ValueError('Checkpoint ' + checkpointFilename + ' was not created from ' + physNetlistFilename)
+                router = NxRouter.fromGraph(checkpoint['G'], data, checkpoint['physNetlistDigest'])
+                router.blocked = checkpoint['blocked']
+                router.sinkMask = checkpoint['sinkMask']
+                router.sink2pin = checkpoint['sink2pin']
+                router.net2pin2node = checkpoint['net2pin2node']
+                router.net2tree = checkpoint['net2tree']
+                router.routedNets = checkpoint['routedNets']
+                router.sink2equivalents = checkpoint['sink2equivalents']
                 import PhysicalNetlist_capnp
                 with PhysicalNetlist_capnp.PhysNetlist.from_bytes(data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**16) as netlist:
+                        router.netlist = netlist
                         tend = time.time()
                         print('\tRead PhysicalNetlist: %.1fs' % (tend-tstart))
-                        router.parse(netlist)
+                        print('\tRestored %d nets to route (%d already routed)' % (len(router.net2pin2node),len(router.routedNets)))
+                        yield router
+
+        @contextmanager
+        def createWindowed(deviceResourcesFilename, physNetlistFilename):
+                """Return a with-statement context manager instance of NxRouter
+                   with the design read but no routing graph built, for
+                   routeWindowed() to build one window at a time"""
+                print('Parsing design...')
+                data,digest,design,loadTime = NxRouter.loadPhysNetlist(physNetlistFilename)
+                print('\tRead PhysicalNetlist: %.1fs' % loadTime)
+                router = NxRouter.fromGraph(None, data, digest)
+                router.deviceResourcesFilename = deviceResourcesFilename
+                router.design = design
+                import PhysicalNetlist_capnp
+                with PhysicalNetlist_capnp.PhysNetlist.from_bytes(data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**16) as netlist:
+                        router.netlist = netlist
                         yield router
 
+        def fromGraph(G, data, digest):
+                """Return an NxRouter that routes over G, an already built (or
+                   restored) NxRoutingGraph, or None for routeWindowed() to build
+                   one window at a time, for the PhysicalNetlist with the given
+                   (un-gzipped) contents and their digest. No nets are prepared
+                   until parse() is called"""
+                router = NxRouter.__new__(NxRouter)
+                router.G = G
+                # Mapping from pipDataIndex to (wire0Name,wire1Name,forward) for
+                # the PIPs of every RoutingTree
+                router.pipData = G.pipData if G is not None else []
+                router.physNetlistDigest = digest
+                router.physNetlistData = data
+                router.net2pin2node = {}
+                router.net2tree = {}
+                router.routedNets = set()
+                return router
+
+        def windowForMemory(numBytes):
+                """Return the (X,Y) size in tiles of the largest window, in the
+                   proportions of the default NxRoutingGraph region, whose routing
+                   graph is expected to fit within numBytes"""
+                numTiles = numBytes / NxRouter.WINDOW_BYTES_PER_TILE
+                y = int((numTiles * 180 / 55) ** 0.5)
+                return max(1, int(numTiles / max(1, y))),max(1, y)
+
+        def readPhysNetlist(physNetlistFilename):
+                """Read a PhysicalNetlist file from disk and un-gzip into memory"""
+                with open(physNetlistFilename, 'rb') as f:
+                        f = gzip.GzipFile(fileobj=f)
+                        return f.read()
+
+        def loadPhysNetlist(physNetlistFilename):
+                """Read a PhysicalNetlist file and return its contents, their digest,
+                   everything that parse() needs from it (see extractDesign()) and
+                   the time taken"""
+                tstart = time.time()
+                data = NxRouter.readPhysNetlist(physNetlistFilename)
+                digest = hashlib.sha256(data).hexdigest()
+                import PhysicalNetlist_capnp
+                with PhysicalNetlist_capnp.PhysNetlist.from_bytes(data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**16) as netlist:
+                        design = NxRouter.extractDesign(netlist)
+                tend = time.time()
+                return data,digest,design,tend-tstart
+
+        def loadDesign(physNetlistFilename):
+                """Read a PhysicalNetlist file and return everything that parse()
+                   needs from it (see extractDesign()) and the time taken, but not
+                   its contents, for create() to run in a background process without
+                   transferring them back"""
+                tstart = time.time()
+                data = NxRouter.readPhysNetlist(physNetlistFilename)
+                import PhysicalNetlist_capnp
+                with PhysicalNetlist_capnp.PhysNetlist.from_bytes(data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**16) as netlist:
+                        design = NxRouter.extractDesign(netlist)
+                tend = time.time()
+                return design,tend-tstart
+
+        def extractDesign(netlist):
+                """Extract everything that parse() needs from a PhysicalNetlist as a
+                   dictionary of flat arrays of string indices:
+                     'netNames': the name of every signal net with unrouted stubs
+                     'pins': the (site,pin) pairs of the source site pins, then the
+                        sink site pins, of each such net, with those of net i
+                        starting at pinOffsets[2*i] and pinOffsets[2*i+1] respectively
+                     'pips': the (tile,wire) pairs of the wire driven by every PIP of
+                        every other net
+                   Site pins are ordered as extractSitePins() returns them"""
+                netNames = array('I')
+                pins = array('I')
+                pinOffsets = array('I')
+                pips = array('I')
+                def extractSitePins(branches):
+                        sitePins = array('I')
+                        queue = list(branches)
+                        while queue:
+                                rb = queue.pop()
+                                rs = rb.routeSegment
+                                if rs.which() == 'sitePin':
+                                        sitePins.extend((rs.sitePin.site,rs.sitePin.pin))
+                                queue.extend(rb.branches)
+                        return sitePins
+                for net in netlist.physNets:
+                        assert len(net.stubNodes) == 0
+                        if net.type == 'signal' and net.stubs:
+                                sinkPins = extractSitePins(net.stubs)
+                                if not sinkPins:
+                                        continue
+                                netNames.append(net.name)
+                                pinOffsets.append(len(pins))
+                                pins.extend(extractSitePins(net.sources))
+                                pinOffsets.append(len(pins))
+                                pins.extend(sinkPins)
+                        else:
+                                queue = list(net.sources)
+                                while queue:
+                                        rb = queue.pop()
+                                        rs = rb.routeSegment
+                                        if rs.which() == 'pip':
+                                                pip = rs.pip
+                                                pips.extend((pip.tile,pip.wire1 if pip.forward else pip.wire0))
+                                        queue.extend(rb.branches)
+                pinOffsets.append(len(pins))
+                return {'netNames': netNames, 'pins': pins, 'pinOffsets': pinOffsets,
+                        'pips': pips}
+
         def __init__(self, deviceResourcesFilename):
                 self.G = NxRoutingGraph()
                 self.G.build(deviceResourcesFilename)
+                # Mapping from pipDataIndex to (wire0Name,wire1Name,forward) for
+                # the PIPs of every RoutingTree
+                self.pipData = self.G.pipData
 
-        def parse(self, netlist):
+        def saveCheckpoint(self, filename):
+                """Snapshot the post-parse() state -- the routing graph, the nodes
+                   blocked by pre-routed nets, the sink pin nodes of every net, the
+                   pins of every net to be routed and the equivalent pins of every LUT
+                   input sink -- along with any nets that have
+                   already been routed, so that a later run can resume from it"""
+                if self.G.LAZY:
+                        raise ValueError('Cannot checkpoint a lazily-built routing graph')
+                tstart = time.time()
+                checkpoint = {
+                        'version': NxRouter.CHECKPOINT_VERSION,
+                        'physNetlistDigest': self.physNetlistDigest,
+                        'G': self.G,
+                        'blocked': self.blocked,
+                        'sinkMask': self.sinkMask,
+                        'sink2pin': self.sink2pin,
+                        'net2pin2node': self.net2pin2node,
+                        'net2tree': self.net2tree,
+                        'routedNets': self.routedNets,
+                        'sink2equivalents': self.sink2equivalents,
+                }
+                with open(filename, 'wb') as f:
+                        pickle.dump(checkpoint, f, protocol=pickle.HIGHEST_PROTOCOL)
+                tend = time.time()
+                print('\tSave checkpoint with %d routed nets: %.1fs' % (len(self.routedNets),tend-tstart))
+
+        def parse(self, netlist, design=None, nets=None, previous=None):
+                """Prepare to route the unrouted nets of netlist, given everything
+                   extracted from it by extractDesign() (which is called if design
+                   is None). If nets is given, only the nets with those indices
+                   (into design['netNames']) are prepared; the sink pins of all
+                   others are still blocked from use by them. If previous (a routed
+                   PhysicalNetlist) is given, the routing of its nets is reused
+                   where still legal (see reuseRoutes())"""
                 tstart = time.time()
                 self.netlist = netlist
+                if design is None:
+                        design = NxRouter.extractDesign(netlist)
 
                 # Mapping from net to (a) source pin to node mapping,
                 # (b) list of sink nodes
                 self.net2pin2node = {}
+                # Mapping from net to its RoutingTree, and the set of all nets
+                # that route() has finished with
+                self.net2tree = {}
+                self.routedNets = set()
 
                 s = CachedTextList(netlist.strList)
+                pins,pinOffsets = design['pins'],design['pinOffsets']
 
-                for net in self.netlist.physNets:
-                        assert len(net.stubNodes) == 0
-                        if net.type == 'signal' and net.stubs:
-                                sinkPins = self.extractSitePins(net.stubs)
+                # Nonzero for every node that no net may use: those used by all
+                # non-signal (i.e. gnd/vcc) or fully routed nets, and the sink pins
+                # of unrouteable nets. Searches skip these nodes, so that the
+                # routing graph itself is left intact
+                self.blocked = bytearray(len(self.G.nodeX))
+                self.blockPIPs(s, design['pips'])
+                # Nonzero for the sink pin node of every net (whether selected or
+                # not); searches may end at, but never leave, such a node. Most
+                # importantly, this prevents other nets from using this node (which
+                # would cause Vivado to flag it as site pin conflict) but an
+                # unfortunate side-effect is that it also prevents other sinks on the
+                # same net from doing so too if this is a pinbounce node
+                self.sinkMask = bytearray(len(self.G.nodeX))
+                # Mapping from the sink node of every selected net to its site pin
+                self.sink2pin = {}
 
-                                # Net is a signal net (not vcc/gnd) and
-                                # has some stub branches (unrouted site pins)
-                                if not sinkPins:
+                for i,netName in enumerate(design['netNames']):
+                        # Net is a signal net (not vcc/gnd) and
+                        # has some stub branches (unrouted site pins)
+                        selected = nets is None or i in nets
+
+                        # Build source pin to node mapping
+                        sourcePin2node = {}
+                        for j in range(pinOffsets[2 * i], pinOffsets[2 * i + 1], 2):
+                                siteName,sinkName = s[pins[j]],s[pins[j + 1]]
+                                sourceNode = self.G.getNodeFromSitePin(siteName, sinkName)
+                                if sourceNode is None:
                                         continue
+                                sourcePin2node[siteName,sinkName] = sourceNode
 
-                                # Build source pin to node mapping
-                                sourcePin2node = {}
-                                for sp in self.extractSitePins(net.sources):
-                                        siteName,sinkName = s[sp.site],s[sp.pin]
-                                        sourceNode = self.G.getNodeFromSitePin(siteName, sinkName)
-                                        if sourceNode is None:
-                                                continue
-                                        sourcePin2node[siteName,sinkName] = sourceNode
-
-                                # Collect list of all sink nodes from sink pins
-                                sinkNodes = []
-                                for sp in sinkPins:
-                                        siteName,sinkName = s[sp.site],s[sp.pin]
-                                        sinkNode = self.G.getNodeFromSitePin(siteName, sinkName)
-                                        if sinkNode is None:
-                                                continue
-                                        if not sourcePin2node:
-                                                # This net has no sources and is unrouteable; remove its
-                                                # sink pin nodes from the graph to block other nets from
-                                                # using them
-                                                assert sinkNode in self.G
-                                                self.G.remove_node(sinkNode)
-                                        else:
+                        # Collect list of all sink nodes from sink pins
+                        sinkNodes = []
+                        for j in range(pinOffsets[2 * i + 1], pinOffsets[2 * i + 2], 2):
+                                siteName,sinkName = s[pins[j]],s[pins[j + 1]]
+                                sinkNode = self.G.getNodeFromSitePin(siteName, sinkName)
+                                if sinkNode is None:
+                                        continue
+                                if not sourcePin2node:
+                                        # This net has no sources and is unrouteable; block its
+                                        # sink pin nodes from use by other nets
+                                        assert sinkNode in self.G
+                                        self.blocked[sinkNode] = 1
+                                else:
+                                        if selected:
                                                 sinkNodes.append(sinkNode)
 
-                                                sinkNodeAttr = self.G.nodes[sinkNode]
-                                                assert 'sp' not in sinkNodeAttr
-                                                sinkNodeAttr['sp'] = (siteName,sinkName)
+                                                assert sinkNode not in self.sink2pin
+                                                self.sink2pin[sinkNode] = (siteName,sinkName)
 
-                                                # Remove all outgoing edges from sink nodes;
-                                                # Most importantly, this prevents other nets from using this node (which
-                                                # would cause Vivado to flag it as site pin conflict) but an unfortunate
-                                                # side-effect is that it also prevents other sinks on the same net from
-                                                # doing so too if this is a pinbounce node
-                                                self.G.remove_edges_from(list(self.G.out_edges(sinkNode)))
+                                        self.sinkMask[sinkNode] = 1
 
-                                if not sinkNodes:
-                                        continue
-                                assert sourcePin2node
-
-                                self.net2pin2node[net.name] = (sourcePin2node,sinkNodes)
-                        else:
-                                # This is a non-signal net (i.e. gnd/vcc) or it has no routing
-                                # stubs (meaning it is fully routed). Walk its routing tree
-                                # to identify all used routing resources and remove them from
-                                # the routing graph so that no other nets will conflict.
+                        if not sinkNodes:
+                                continue
+                        assert sourcePin2node
 
-                                tile2wire2nodeGet = self.G.tile2wire2node.get
-                                queue = list(net.sources)
-                                while queue:
-                                        rb = queue.pop()
-                                        rs = rb.routeSegment
-                                        if rs.which() == 'pip':
-                                                # Remove driven node from graph so no other nets can drive it
-                                                pip = rs.pip
-                                                wire2node = tile2wire2nodeGet(s[pip.tile])
-                                                if wire2node:
-                                                        blockedNode = wire2node.get(s[pip.wire1 if pip.forward else pip.wire0])
-                                                        if blockedNode is not None:
-                                                                self.G.remove_node(blockedNode)
-                                                else:
-                                                        # Tile must be out of bounds
-                                                        pass
-                                        queue.extend(rb.branches)
+                        self.net2pin2node[netName] = (sourcePin2node,sinkNodes)
+                # Mapping from the sink node of every LUT input site pin to the
+                # nodes of the other input site pins of the same LUT
+                self.sink2equivalents = {}
+                if self.LUT_PIN_SWAPPING:
+                        self.sink2equivalents = self.findEquivalentSinks(netlist, s)
+                tend = time.time()
+                print('\tPrepare site pins: %.1fs' % (tend-tstart))
+                if previous is not None:
+                        self.reuseRoutes(previous)
                 del self.G.tileType2SiteTypePinName2wire
                 del self.G.site2tileAndTypes
-                del self.G.tile2wire2node
+                if not self.G.LAZY:
+                        # (A lazily-built graph continues to need it)
+                        del self.G.tile2wire2node
+
+        def findEquivalentSinks(self, netlist, s):
+                """Return a mapping from the sink node of every LUT input site pin
+                   to the nodes of the other input site pins of the same LUT that
+                   it could be swapped with: A1-A6 of the A LUT, for example, or
+                   only A1-A5 if its A5LUT is occupied (as A6 must then be tied to
+                   VCC)"""
+                fracturedLuts = set()
+                for placement in netlist.placements:
+                        bel = s[placement.bel]
+                        if bel.endswith('5LUT'):
+                                fracturedLuts.add((s[placement.site],bel[0]))
+                getNodeFromSitePin = self.G.getNodeFromSitePin
+                sink2equivalents = {}
+                for _,sinkNodes in self.net2pin2node.values():
+                        for sinkNode in sinkNodes:
+                                siteName,pinName = self.sink2pin[sinkNode]
+                                m = self.LUT_INPUT_PIN.fullmatch(pinName)
+                                if m is None or not siteName.startswith('SLICE'):
+                                        continue
+                                lut = m.group(1)
+                                numInputs = 5 if (siteName,lut) in fracturedLuts else 6
+                                equivalents = []
+                                for i in range(1, numInputs + 1):
+                                        node = getNodeFromSitePin(siteName, lut + str(i))
+                                        if node is not None and node != sinkNode:
+                                                equivalents.append(node)
+                                if equivalents:
+                                        sink2equivalents[sinkNode] = equivalents
+                return sink2equivalents
+
+        def reuseRoutes(self, previous):
+                """Reuse the routing of every net of a previously routed PhysicalNetlist
+                   (matched by name) that is still legal: every PIP must still be an
+                   edge of the routing graph from the node that drives it, which must
+                   not be the sink pin of any net, must not drive a blocked
+                   node (and so not conflict with any pre-routed net), and every
+                   routed sink pin must still be a sink pin of the net.
+                   Only the remaining sink pins of such nets are left to route(),
+                   while every other net is ripped up and routed from scratch"""
+                tstart = time.time()
+                s = CachedTextList(self.netlist.strList)
+                name2net = {s[netName]: netName for netName in self.net2pin2node}
+                ps = CachedTextList(previous.strList)
+                numReused = numRippedUp = numPins = 0
+                for net in previous.physNets:
+                        netName = name2net.get(ps[net.name])
+                        if netName is None:
+                                continue
+                        sourcePin2node,sinkNodes = self.net2pin2node[netName]
+                        sinkPin2node = {self.sink2pin[sinkNode]: sinkNode for sinkNode in sinkNodes}
+                        tree = self.extractTree(ps, net, sourcePin2node, sinkPin2node)
+                        if tree is None:
+                                numRippedUp += 1
+                                continue
+                        if not tree.sinks:
+                                continue
+                        numReused += 1
+                        numPins += len(tree.sinks)
+                        self.net2tree[netName] = tree
+                        routedSinkNodes = set(tree.nodes[entry] for entry,_ in tree.sinks)
+                        sinkNodes = [sinkNode for sinkNode in sinkNodes if sinkNode not in routedSinkNodes]
+                        self.net2pin2node[netName] = (sourcePin2node,sinkNodes)
+                        if not sinkNodes:
+                                self.routedNets.add(netName)
                 tend = time.time()
-                print('\tPrepare site pins: %.1fs' % (tend-tstart))
+                print('\tReused routing of %d pins on %d nets (%d nets ripped up): %.1fs' % (numPins,numReused,numRippedUp,tend-tstart))
+
+        def extractTree(self, s, net, sourcePin2node, sinkPin2node):
+                """Return the routing of a net of a previously routed PhysicalNetlist
+                   (whose strList is s) as a RoutingTree, or None if it is no longer
+                   legal for a net with the given source and sink pins"""
+                G = self.G
+                tile2wire2node = G.tile2wire2node
+                blocked = self.blocked
+                sinkMask = self.sinkMask
+                tree = RoutingTree()
+                # Stack of (RouteBranch,node,entry) where node (and its entry in the
+                # tree) is the routing node that the branch continues from
+                stack = [(rb,None,-1) for rb in net.sources]
+                while stack:
+                        rb,node,entry = stack.pop()
+                        rs = rb.routeSegment
+                        which = rs.which()
+                        if which == 'sitePin':
+                                sitePin = (s[rs.sitePin.site],s[rs.sitePin.pin])
+                                if node is None:
+                                        # Source site pin
+                                        node = sourcePin2node.get(sitePin)
+                                        if node is None:
+                                                return None
+                                        entry = tree.node2entry.get(node)
+                                        if entry is None:
+                                                entry = tree.addEntry(node, -1, None)
+                                else:
+                                        # Sink site pin
+                                        if sinkPin2node.get(sitePin) != node:
+                                                return None
+                                        tree.sinks.append((entry,sitePin))
+                        elif which == 'pip':
+                                pip = rs.pip
+                                wire2node = tile2wire2node.get(s[pip.tile])
+                                if wire2node is None:
+                                        return None
+                                u,v = wire2node.get(s[pip.wire0]),wire2node.get(s[pip.wire1])
+                                if not pip.forward:
+                                        u,v = v,u
+                                if node is None or u != node or v in tree.node2entry or blocked[v] or sinkMask[u] or not G.has_edge(u, v):
+                                        return None
+                                node,entry = v,tree.addEntry(v, entry, G[u][v]['pip'])
+                        stack.extend((branch,node,entry) for branch in rb.branches)
+                return tree
 
-        def route(self):
+        def blockPIPs(self, s, pips):
+                """Block the nodes driven by all PIPs (as extracted by extractDesign())
+                   so that no other nets will conflict, in a single pass over their
+                   flattened (tile,wire) string indices"""
+                tile2wire2nodeGet = self.G.tile2wire2node.get
+                # Look up each distinct tile only once; out-of-bounds tiles map to None
+                tile2wire2node = {tile: tile2wire2nodeGet(s[tile]) for tile in set(pips[0::2])}
+                blocked = self.blocked
+                for tile,wire in zip(pips[0::2], pips[1::2]):
+                        wire2node = tile2wire2node[tile]
+                        if wire2node:
+                                blockedNode = wire2node.get(s[wire])
+                                if blockedNode is not None:
+                                        blocked[blockedNode] = 1
+
+        def route(self, scheduler=None, checkpointFilename=None, checkpointPins=None):
+                """Route all nets not already routed, in the order given by scheduler
+                   (a NetScheduler). If checkpointFilename is given, save a checkpoint
+                   once checkpointPins have been routed in total, counting the pins
+                   already routed before this call (e.g. restored by resume() or
+                   reused by reuseRoutes()), or once all nets are routed, if fewer
+                   pins than that remain"""
                 tstart = time.time()
-                totalPinsToRoute = sum(len(sinkNodes) for (_,sinkNodes) in self.net2pin2node.values())
+                net2pin2node = {netName: pin2node for netName,pin2node in self.net2pin2node.items()
+                        if netName not in self.routedNets}
+                totalPinsToRoute = sum(len(sinkNodes) for (_,sinkNodes) in net2pin2node.values())
                 print('Routing %d pins...' % totalPinsToRoute)
 
+                if scheduler is None:
+                        scheduler = NetScheduler(self.G)
+                batches = scheduler.schedule(net2pin2node)
+                tend = time.time()
+                print('\tScheduled %d nets in %d batches (%s policy): %.1fs' % (len(net2pin2node),len(batches),scheduler.policy,tend-tstart))
+
+                self.globalRouter = None
+                if self.GLOBAL_CELL_X is not None:
+                        tstart = time.time()
+                        self.globalRouter = GlobalRouter(self.G, self.GLOBAL_CELL_X, self.GLOBAL_CELL_Y, self.blocked)
+                        self.globalRouter.route(itertools.chain.from_iterable(batches), net2pin2node, self.BBOX_MARGIN_X, self.BBOX_MARGIN_Y)
+                        tend = time.time()
+                        print('\tGlobally routed over %dx%d cells of %dx%d tiles (%d cells over capacity): %.1fs' %
+                                (self.globalRouter.numCellsX,self.globalRouter.numCellsY,self.GLOBAL_CELL_X,self.GLOBAL_CELL_Y,
+                                 self.globalRouter.numOverflowing(),tend-tstart))
+
+                self.numNodesExpanded = 0
+                self.numBBoxExpansions = 0
+                self.numCorridorFailures = 0
+                self.numLutPinSwaps = 0
+                sink2equivalents = getattr(self, 'sink2equivalents', None)
+                self.bidirectionalStats = {}
+                # The breadth-first search of findPath() is bidirectional, which needs
+                # the in-edges of every node, and these are not known for nodes of a
+                # lazily-built graph whose out-edges have not been built yet
+                if self.CRITICALITY is None and self.LOOKAHEAD is None and not self.G.LAZY:
+                        self.searchPath = self.findPath
+                else:
+                        # Precompute the blended cost of every node so that the search
+                        # only needs a single array lookup per node
+                        c = self.CRITICALITY or 0.0
+                        self.blendedCost = array('f', ((1 - c) + c * cost for cost in self.G.nodeCost))
+                        self.lookahead = None
+                        if self.LOOKAHEAD is not None:
+                                self.lookahead = Lookahead.load(self.LOOKAHEAD, self.G, self.blendedCost, c)
+                        self.searchPath = self.findCheapestPath
                 numPinsRouted = 0
-                hiddenEdges = []
+                numPinsRoutedBefore = sum(len(tree.sinks) for tree in self.net2tree.values())
+                # Mapping from every node used by the net being routed to its only
+                # allowed driver, and the nodes (of LUT input site pins equivalent
+                # to the sink pin) that the connection being routed may also end at;
+                # searches consult both rather than edges being removed from or
+                # added to the routing graph
+                self.onlyFrom = {}
+                self.sinkEquivalents = ()
                 s = self.netlist.strList
-                nodes = self.G.nodes
-                for netName,(sourcePin2node,sinkNodes) in self.net2pin2node.items():
-                        sourceNodes = sourcePin2node.values()
-                        multiSink = len(sinkNodes) > 1
+                sink2pin = self.sink2pin
+                for netName,sinkNodes in itertools.chain.from_iterable(batches):
+                        sourceNodes = net2pin2node[netName][0].values()
+                        tree = self.net2tree.get(netName)
+                        if tree is None:
+                                tree = self.net2tree[netName] = RoutingTree()
+                        elif tree.nodes:
+                                # Continue from the (reused) routing tree of this net
+                                self.onlyFrom.update((node,tree.nodes[parent]) for parent,node in zip(tree.parents, tree.nodes)
+                                        if parent >= 0)
+                        multiSink = len(sinkNodes) > 1 or len(tree.nodes) > 0
                         for sinkNode in sinkNodes:
-                                path = None
-                                # For every sink node, try all source nodes until one with a routing
-                                # path is found
-                                # Note that nx.shortest_path() only accepts a single source node; other
-                                # implementations may wish to consider all sources simultaneously
-                                for sourceNode in sourceNodes:
-                                        try:
-                                                path = nx.shortest_path(self.G, sourceNode, sinkNode)
-                                        except nx.NetworkXNoPath:
-                                                continue
-                                        break
+                                corridor = None
+                                if self.globalRouter:
+                                        corridor = self.globalRouter.corridor(netName, sinkNode, self.GLOBAL_CORRIDOR)
+                                if sink2equivalents and sinkNode in sink2equivalents:
+                                        self.sinkEquivalents = self.freeEquivalentSinks(sink2equivalents[sinkNode], tree)
+                                path = self.routeConnection(sourceNodes, sinkNode, corridor)
+                                self.sinkEquivalents = ()
                                 if not path:
-                                        print('Unable to route sink pin ' + str(nodes[sinkNode]['sp']) + ' on net ' + s[netName])
+                                        print('Unable to route sink pin ' + str(sink2pin[sinkNode]) + ' on net ' + s[netName])
                                         continue
-                                numHiddenEdges = len(hiddenEdges)
-                                for u,v in zip(path[:-1],path[1:]):
-                                        # Key the next node of the path with the net name
-                                        nodes[u].setdefault(netName, set()).add(v)
-                                        if multiSink:
-                                                # In order to prevent nodes with two different drivers from the same
-                                                # net (breaking the requirement that a net's routing has to be a tree)
-                                                # temporarily remove all incoming edges of used nodes
-                                                # Note that trees from different nets may drive the same node, causing an overlap
-                                                hiddenEdges.extend([edge for edge in self.G.in_edges(v, data=True) if edge[0] != u])
-                                if hiddenEdges:
-                                        self.G.remove_edges_from(hiddenEdges[numHiddenEdges:])
+                                tree.addPath(self.G, path, sink2pin[sinkNode])
+                                if path[-1] != sinkNode:
+                                        # Swapped to an equivalent pin (whose PIP is written followed
+                                        # by the original sink pin); block it from use by any other net
+                                        self.blocked[path[-1]] = 1
+                                        self.numLutPinSwaps += 1
+                                if multiSink:
+                                        # In order to prevent nodes with two different drivers from the same
+                                        # net (breaking the requirement that a net's routing has to be a tree)
+                                        # allow every used node to be driven only as it is by this path
+                                        # Note that trees from different nets may drive the same node, causing an overlap
+                                        self.onlyFrom.update((v,u) for u,v in zip(path[:-1], path[1:]))
                                 numPinsRouted += 1
                                 if numPinsRouted % 10000 == 0:
                                         tend = time.time()
                                         print('\tRouted %d pins: %.1fs' % (numPinsRouted,tend-tstart))
-                        # After routing all sinks of this net, restore all temporarily hidden
-                        # edges so that they are available for other nets to use
-                        for u,v,d in hiddenEdges:
-                                self.G.add_edge(u, v, pip=d['pip'])
-                        hiddenEdges.clear()
+                        if not tree.nodes:
+                                del self.net2tree[netName]
+                        # After routing all sinks of this net, its nodes may be driven
+                        # from anywhere by other nets
+                        self.onlyFrom.clear()
+                        self.routedNets.add(netName)
+                        if checkpointFilename and checkpointPins is not None and numPinsRoutedBefore + numPinsRouted >= checkpointPins:
+                                # Only checkpoint between nets
+                                self.saveCheckpoint(checkpointFilename)
+                                checkpointFilename = None
                 tend = time.time()
                 print('\tRouted %d pins: %.1fs' % (numPinsRouted,tend-tstart))
+                print('\tExpanded %d nodes (%s policy, %d batches)' % (self.numNodesExpanded,scheduler.policy,len(batches)))
+                if self.BBOX_MARGIN_X is not None:
+                        print('\tExpanded %d bounding boxes' % self.numBBoxExpansions)
+                if self.globalRouter:
+                        print('\tFell back from %d global routing corridors' % self.numCorridorFailures)
+                if sink2equivalents:
+                        print('\tSwapped %d LUT input pins' % self.numLutPinSwaps)
+                if self.G.LAZY:
+                        print('\tBuilt out-edges of %d nodes (%d evicted)' % (self.G._succ.numBuilt,self.G._succ.numEvicted))
+                if self.bidirectionalStats:
+                        print('\tBidirectional vs unidirectional search by connection length:')
+                        for bucket,(num,wins,losses,uniExpanded,biExpanded) in sorted(self.bidirectionalStats.items()):
+                                length = '%d-%d' % (1 << (bucket - 1),(1 << bucket) - 1) if bucket else '0'
+                                print('\t\t%9s tiles: %d connections, %d wins, %d losses (expanded %d vs %d nodes)' %
+                                        (length,num,wins,losses,biExpanded,uniExpanded))
+                if checkpointFilename and checkpointPins is not None:
+                        self.saveCheckpoint(checkpointFilename)
+
+        def routeWindowed(self, schedulerFactory=NetScheduler):
+                """Route all nets of a design read by createWindowed() without ever
+                   building the routing graph of more than one window of the device,
+                   routing the nets of each window with route() (in the order given
+                   by the NetScheduler that schedulerFactory returns for its graph).
+                   Nets whose bounding box does not fit inside any window are left
+                   to the next pass, over windows twice as large (and built lazily),
+                   until a single window covers the entire device"""
+                print('Routing in windows...')
+                tstart = time.time()
+                deviceData = NxRoutingGraph.readDeviceResources(self.deviceResourcesFilename)
+                site2XY,maxX,maxY = NxRoutingGraph.siteCoordinates(deviceData)
+
+                # Find the bounding box of the site pins of every net, extended by
+                # the margins that its connections will be searched within
+                s = CachedTextList(self.netlist.strList)
+                design = self.design
+                pins,pinOffsets = design['pins'],design['pinOffsets']
+                if self.BBOX_MARGIN_X is None:
+                        marginX = marginY = 0
+                else:
+                        marginX,marginY = self.BBOX_MARGIN_X,self.BBOX_MARGIN_Y
+                net2bbox = {}
+                for i in range(len(design['netNames'])):
+                        xys = [site2XY.get(s[pins[j]]) for j in range(pinOffsets[2 * i], pinOffsets[2 * i + 2], 2)]
+                        xys = [xy for xy in xys if xy is not None]
+                        if not xys:
+                                continue
+                        xs,ys = zip(*xys)
+                        net2bbox[i] = (max(0, min(xs) - marginX),min(maxX, max(xs) + marginX),
+                                       max(0, min(ys) - marginY),min(maxY, max(ys) + marginY))
+                del site2XY
+                tend = time.time()
+                print('\tFound bounding boxes of %d nets in a %dx%d tile device: %.1fs' % (len(net2bbox),maxX+1,maxY+1,tend-tstart))
+
+                # Routing state accumulated over all windows
+                pipData = self.pipData
+                pipData2index = {d: i for i,d in enumerate(pipData)}
+                net2pin2node,net2tree,routedNets = self.net2pin2node,self.net2tree,self.routedNets
+
+                width,height = self.WINDOW_X,self.WINDOW_Y
+                overlapX,overlapY = self.WINDOW_OVERLAP_X,self.WINDOW_OVERLAP_Y
+                lazy = NxRoutingGraph.LAZY
+                remaining = sorted(net2bbox)
+                numPasses = numWindows = 0
+                while remaining:
+                        numPasses += 1
+                        # Windows start every strideX/Y tiles, such that the last
+                        # window in each dimension reaches the edge of the device
+                        strideX = max(1, width - min(overlapX, width // 2))
+                        strideY = max(1, height - min(overlapY, height // 2))
+                        numX = 1 + max(0, -(-(maxX + 1 - width) // strideX))
+                        numY = 1 + max(0, -(-(maxY + 1 - height) // strideY))
+
+                        # Assign every net to the last window (in each dimension)
+                        # that starts at or before its bounding box, if it fits
+                        window2nets = {}
+                        unassigned = []
+                        for i in remaining:
+                                xmin,xmax,ymin,ymax = net2bbox[i]
+                                kx = min(xmin // strideX, numX - 1)
+                                ky = min(ymin // strideY, numY - 1)
+                                if kx * strideX + width <= xmax or ky * strideY + height <= ymax:
+                                        unassigned.append(i)
+                                        continue
+                                window2nets.setdefault((ky,kx), set()).add(i)
+                        print('\tPass %d: %d nets in %d of %dx%d windows of %dx%d tiles (%d nets left over)' %
+                                (numPasses,len(remaining)-len(unassigned),len(window2nets),numX,numY,width,height,len(unassigned)))
+
+                        for (ky,kx),nets in sorted(window2nets.items()):
+                                numWindows += 1
+                                G = self.G = NxRoutingGraph()
+                                G.MIN_X,G.MAX_X = kx * strideX,kx * strideX + width - 1
+                                G.MIN_Y,G.MAX_Y = ky * strideY,ky * strideY + height - 1
+                                G.LAZY = lazy
+                                print('Window X%d-%dY%d-%d (pass %d): %d nets' % (G.MIN_X,G.MAX_X,G.MIN_Y,G.MAX_Y,numPasses,len(nets)))
+                                G.build(self.deviceResourcesFilename, deviceData)
+                                self.parse(self.netlist, design, nets)
+                                self.route(schedulerFactory(G))
+
+                                # Renumber the PIPs of every tree routed in this window from
+                                # its graph's pipData into the one shared by all windows
+                                remap = []
+                                for d in G.pipData:
+                                        j = pipData2index.get(d)
+                                        if j is None:
+                                                j = pipData2index[d] = len(pipData)
+                                                pipData.append(d)
+                                        remap.append(j)
+                                for netName,tree in self.net2tree.items():
+                                        tree.pips = [pip if pip is None else (pip[0],remap[pip[1]]) for pip in tree.pips]
+                                        net2tree[netName] = tree
+                                net2pin2node.update(self.net2pin2node)
+                                routedNets.update(self.routedNets)
+                                # Release this window's graph before building the next
+                                G.close()
+                                self.G = G = self.lookahead = self.blendedCost = None
+
+                        remaining = unassigned
+                        if numX == 1 and numY == 1:
+                                assert not remaining
+                        width,height = 2 * width,2 * height
+                        overlapX,overlapY = 2 * overlapX,2 * overlapY
+                        lazy = True
+
+                self.net2pin2node,self.net2tree,self.routedNets = net2pin2node,net2tree,routedNets
+                tend = time.time()
+                print('Routed %d nets in %d windows over %d passes: %.1fs' % (len(net2tree),numWindows,numPasses,tend-tstart))
+
+        def freeEquivalentSinks(self, equivalents, tree):
+                """Return those of the equivalent (LUT input site pin) nodes of a sink
+                   that are not already in use, for a connection to that sink to end
+                   at any of them instead (see sinkEquivalents in route())"""
+                blocked = self.blocked
+                sinkMask = self.sinkMask
+                # Node was blocked (or swapped to), is the sink of a net, or is used
+                return [node for node in equivalents
+                        if not (blocked[node] or sinkMask[node] or node in tree.node2entry)]
+
+        def routeConnection(self, sourceNodes, sinkNode, corridor=None):
+                """Return a path from any of sourceNodes to sinkNode that does not
+                   leave the bounding box of their tiles extended by the
+                   BBOX_MARGIN_X/Y margins, growing each margin to 2*margin+1 on
+                   failure up to BBOX_EXPANSIONS times before searching without
+                   any bounding box. If a corridor (as returned
+                   by GlobalRouter.corridor()) is given, a path within it is
+                   searched for first"""
+                nodeX,nodeY = self.G.nodeX,self.G.nodeY
+                searchPath = self.searchPath
+                if (searchPath == self.findCheapestPath and self.G.revOffsets is not None and
+                        (self.BIDIRECTIONAL_DISTANCE is not None or self.BIDIRECTIONAL_REPORT)):
+                        sinkX,sinkY = nodeX[sinkNode],nodeY[sinkNode]
+                        distance = min(abs(nodeX[n] - sinkX) + abs(nodeY[n] - sinkY) for n in sourceNodes)
+                        bidirectional = self.BIDIRECTIONAL_DISTANCE is not None and distance >= self.BIDIRECTIONAL_DISTANCE
+                        if self.BIDIRECTIONAL_REPORT:
+                                searchPath = lambda sourceNodes, sinkNode, bbox=None, corridor=None: \
+                                        self.compareSearches(distance, bidirectional, sourceNodes, sinkNode, bbox, corridor)
+                        elif bidirectional:
+                                searchPath = self.findCheapestPathBidirectional
+                if self.BBOX_MARGIN_X is None:
+                        if corridor is not None:
+                                path = searchPath(sourceNodes, sinkNode, *corridor)
+                                if path:
+                                        return path
+                                self.numCorridorFailures += 1
+                        return searchPath(sourceNodes, sinkNode)
+                xs = [nodeX[n] for n in sourceNodes]
+                xs.append(nodeX[sinkNode])
+                ys = [nodeY[n] for n in sourceNodes]
+                ys.append(nodeY[sinkNode])
+                xmin,xmax,ymin,ymax = min(xs),max(xs),min(ys),max(ys)
+                marginX,marginY = self.BBOX_MARGIN_X,self.BBOX_MARGIN_Y
+                if corridor is not None:
+                        # The corridor only ever narrows the initial bounding box
+                        (cxmin,cxmax,cymin,cymax),inCorridor = corridor
+                        bbox = (max(cxmin, xmin - marginX),min(cxmax, xmax + marginX),
+                                max(cymin, ymin - marginY),min(cymax, ymax + marginY))
+                        path = searchPath(sourceNodes, sinkNode, bbox, inCorridor)
+                        if path:
+                                return path
+                        self.numCorridorFailures += 1
+                for expansion in range(self.BBOX_EXPANSIONS + 1):
+                        if expansion:
+                                self.numBBoxExpansions += 1
+                                marginX,marginY = 2 * marginX + 1,2 * marginY + 1
+                        bbox = (xmin - marginX,xmax + marginX,ymin - marginY,ymax + marginY)
+                        path = searchPath(sourceNodes, sinkNode, bbox)
+                        if path:
+                                return path
+                # Only give up once the entire graph has been searched
+                self.numBBoxExpansions += 1
+                return searchPath(sourceNodes, sinkNode)
+
+        def compareSearches(self, distance, bidirectional, sourceNodes, sinkNode, bbox=None, corridor=None):
+                """Search for a connection of the given length both unidirectionally
+                   and bidirectionally, recording which expanded fewer nodes, and
+                   return the path (and count the expansions) of the search chosen
+                   by bidirectional"""
+                numNodesExpanded = self.numNodesExpanded
+                uniPath = self.findCheapestPath(sourceNodes, sinkNode, bbox, corridor)
+                uniExpanded = self.numNodesExpanded - numNodesExpanded
+                biPath = self.findCheapestPathBidirectional(sourceNodes, sinkNode, bbox, corridor)
+                biExpanded = self.numNodesExpanded - numNodesExpanded - uniExpanded
+                self.numNodesExpanded = numNodesExpanded + (biExpanded if bidirectional else uniExpanded)
+                stats = self.bidirectionalStats.setdefault(distance.bit_length(), [0,0,0,0,0])
+                stats[0] += 1
+                stats[1] += biExpanded < uniExpanded
+                stats[2] += biExpanded > uniExpanded
+                stats[3] += uniExpanded
+                stats[4] += biExpanded
+                return biPath if bidirectional else uniPath
+
+        def findPath(self, sourceNodes, sinkNode, bbox=None, corridor=None):
+                """Return the shortest (fewest-edges) path from any of sourceNodes to
+                   sinkNode as a list of nodes, or None if no such path exists.
+                   Uses a bidirectional breadth-first search that always expands
+                   the smaller of its two frontiers (as nx.shortest_path() does) but
+                   with all source nodes considered simultaneously.
+                   If bbox is given as (xmin,xmax,ymin,ymax), only nodes within it
+                   are explored, and if corridor is given (as a bytearray indexed
+                   by GlobalRouter cell), only nodes in its nonzero cells. Paths never
+                   leave the sink node of any net, only enter nodes in onlyFrom from
+                   their allowed driver, and may also end at any of sinkEquivalents
+                   (see route())"""
+                succ = self.G._succ
+                pred = self.G._pred
+                nodeX,nodeY = self.G.nodeX,self.G.nodeY
+                blocked = self.blocked
+                sinkMask = self.sinkMask
+                onlyFrom = self.onlyFrom
+                xmin,xmax,ymin,ymax = bbox if bbox else (0,sys.maxsize,0,sys.maxsize)
+                nodeCell = self.globalRouter.nodeCell if corridor is not None else None
+                fwdParent = dict.fromkeys(sourceNodes)
+                if sinkNode in fwdParent:
+                        return [sinkNode]
+                bwdParent = dict.fromkeys((sinkNode,*self.sinkEquivalents))
+                fwdFrontier = list(fwdParent)
+                bwdFrontier = list(bwdParent)
+                meetNode = None
+                numExpanded = 0
+                while fwdFrontier and bwdFrontier and meetNode is None:
+                        numExpanded += min(len(fwdFrontier),len(bwdFrontier))
+                        if len(fwdFrontier) <= len(bwdFrontier):
+                                frontier,fwdFrontier = fwdFrontier,[]
+                                for u in frontier:
+                                        for v in succ[u]:
+                                                if v not in fwdParent:
+                                                        if blocked[v] or not (xmin <= nodeX[v] <= xmax and ymin <= nodeY[v] <= ymax):
+                                                                continue
+                                                        if corridor is not None and not corridor[nodeCell[v]]:
+                                                                continue
+                                                        if sinkMask[v] and v != sinkNode or onlyFrom and onlyFrom.get(v, u) != u:
+                                                                continue
+                                                        fwdParent[v] = u
+                                                        fwdFrontier.append(v)
+                                                if v in bwdParent:
+                                                        meetNode = v
+                                                        break
+                                        if meetNode is not None:
+                                                break
+                        else:
+                                frontier,bwdFrontier = bwdFrontier,[]
+                                for v in frontier:
+                                        for u in pred[v]:
+                                                if u not in bwdParent:
+                                                        if blocked[u] or not (xmin <= nodeX[u] <= xmax and ymin <= nodeY[u] <= ymax):
+                                                                continue
+                                                        if corridor is not None and not corridor[nodeCell[u]]:
+                                                                continue
+                                                        if sinkMask[u] or onlyFrom and onlyFrom.get(v, u) != u:
+                                                                continue
+                                                        bwdParent[u] = v
+                                                        bwdFrontier.append(u)
+                                                if u in fwdParent:
+                                                        meetNode = u
+                                                        break
+                                        if meetNode is not None:
+                                                break
+                self.numNodesExpanded += numExpanded
+                if meetNode is None:
+                        return None
+                path = []
+                node = meetNode
+                while node is not None:
+                        path.append(node)
+                        node = fwdParent[node]
+                path.reverse()
+                node = bwdParent[meetNode]
+                while node is not None:
+                        path.append(node)
+                        node = bwdParent[node]
+                return path
+
+        def findCheapestPath(self, sourceNodes, sinkNode, bbox=None, corridor=None):
+                """Return a path from any of sourceNodes to sinkNode as a list of
+                   nodes, or None if no such path exists, where the cost of a path
+                   is the sum of the blended costs of all its nodes after the first.
+                   Uses Dijkstra's algorithm with all source nodes considered
+                   simultaneously, which returns the lowest-cost path, or A* if a
+                   lookahead is present; since the lookahead is not admissible (see
+                   Lookahead) and every node is expanded at most once, the path
+                   found by A* is not guaranteed to be the lowest-cost one.
+                   If bbox is given as (xmin,xmax,ymin,ymax), only nodes within it
+                   are explored, and if corridor is given (as a bytearray indexed
+                   by GlobalRouter cell), only nodes in its nonzero cells. Paths never
+                   leave the sink node of any net, only enter nodes in onlyFrom from
+                   their allowed driver, and may also end at any of sinkEquivalents
+                   (see route())"""
+                succ = self.G._succ
+                nodeX,nodeY = self.G.nodeX,self.G.nodeY
+                blocked = self.blocked
+                sinkMask = self.sinkMask
+                onlyFrom = self.onlyFrom
+                targets = {sinkNode,*self.sinkEquivalents}
+                cost = self.blendedCost
+                estimate = self.lookahead.estimator(nodeX[sinkNode], nodeY[sinkNode]) if self.lookahead else None
+                xmin,xmax,ymin,ymax = bbox if bbox else (0,sys.maxsize,0,sys.maxsize)
+                nodeCell = self.globalRouter.nodeCell if corridor is not None else None
+                parent = dict.fromkeys(sourceNodes)
+                dist = dict.fromkeys(parent, 0.0)
+                heap = [(0.0,u) for u in parent]
+                heapq.heapify(heap)
+                done = set()
+                heappush,heappop = heapq.heappush,heapq.heappop
+                numExpanded = 0
+                while heap:
+                        _,u = heappop(heap)
+                        if u in done:
+                                continue
+                        if u in targets:
+                                break
+                        done.add(u)
+                        numExpanded += 1
+                        d = dist[u]
+                        for v in succ[u]:
+                                if v in done:
+                                        continue
+                                dv = d + cost[v]
+                                if dv < dist.get(v, float('inf')):
+                                        if blocked[v] or not (xmin <= nodeX[v] <= xmax and ymin <= nodeY[v] <= ymax):
+                                                continue
+                                        if corridor is not None and not corridor[nodeCell[v]]:
+                                                continue
+                                        if sinkMask[v] and v != sinkNode or onlyFrom and onlyFrom.get(v, u) != u:
+                                                continue
+                                        dist[v] = dv
+                                        parent[v] = u
+                                        heappush(heap, (dv + estimate(v),v) if estimate else (dv,v))
+                else:
+                        self.numNodesExpanded += numExpanded
+                        return None
+                self.numNodesExpanded += numExpanded
+                path = []
+                node = u
+                while node is not None:
+                        path.append(node)
+                        node = parent[node]
+                path.reverse()
+                return path
+
+        def findCheapestPathBidirectional(self, sourceNodes, sinkNode, bbox=None, corridor=None):
+                """Return the lowest-cost path from any of sourceNodes to sinkNode, as
+                   findCheapestPath() does, but by Dijkstra's algorithm from both the
+                   source nodes (forwards) and the sink node (backwards, over the
+                   graph's reverse CSR) at once, always advancing the side whose
+                   nearest unexpanded node is cheaper. Whenever a node is reached by
+                   both sides, the cost of the path through it is recorded; once the
+                   costs of the nearest unexpanded nodes on both sides sum to no less
+                   than the cheapest such path, no cheaper path can exist and the
+                   search stops. Any lookahead is not used.
+                   If bbox is given as (xmin,xmax,ymin,ymax), only nodes within it
+                   are explored, and if corridor is given (as a bytearray indexed
+                   by GlobalRouter cell), only nodes in its nonzero cells. Paths never
+                   leave the sink node of any net, only enter nodes in onlyFrom from
+                   their allowed driver, and may also end at any of sinkEquivalents
+                   (see route())"""
+                succ = self.G._succ
+                revOffsets,revSources = self.G.revOffsets,self.G.revSources
+                nodeX,nodeY = self.G.nodeX,self.G.nodeY
+                blocked = self.blocked
+                sinkMask = self.sinkMask
+                onlyFrom = self.onlyFrom
+                cost = self.blendedCost
+                xmin,xmax,ymin,ymax = bbox if bbox else (0,sys.maxsize,0,sys.maxsize)
+                nodeCell = self.globalRouter.nodeCell if corridor is not None else None
+                fwdParent = dict.fromkeys(sourceNodes)
+                if sinkNode in fwdParent:
+                        return [sinkNode]
+                # The forward cost of a node includes its own cost, while the backward
+                # cost of a node is that of all nodes after it up to the sink
+                fwdDist = dict.fromkeys(fwdParent, 0.0)
+                bwdParent = dict.fromkeys((sinkNode,*self.sinkEquivalents))
+                bwdDist = dict.fromkeys(bwdParent, 0.0)
+                fwdHeap = [(0.0,u) for u in fwdParent]
+                heapq.heapify(fwdHeap)
+                bwdHeap = [(0.0,v) for v in bwdParent]
+                fwdDone = set()
+                bwdDone = set()
+                heappush,heappop = heapq.heappush,heapq.heappop
+                inf = float('inf')
+                bestCost = inf
+                meetNode = None
+                numExpanded = 0
+                while fwdHeap and bwdHeap:
+                        if fwdHeap[0][0] + bwdHeap[0][0] >= bestCost:
+                                break
+                        if fwdHeap[0][0] <= bwdHeap[0][0]:
+                                d,u = heappop(fwdHeap)
+                                if u in fwdDone:
+                                        continue
+                                fwdDone.add(u)
+                                numExpanded += 1
+                                for v in succ[u]:
+                                        if v in fwdDone:
+                                                continue
+                                        dv = d + cost[v]
+                                        if dv < fwdDist.get(v, inf):
+                                                if blocked[v] or not (xmin <= nodeX[v] <= xmax and ymin <= nodeY[v] <= ymax):
+                                                        continue
+                                                if corridor is not None and not corridor[nodeCell[v]]:
+                                                        continue
+                                                if sinkMask[v] and v != sinkNode or onlyFrom and onlyFrom.get(v, u) != u:
+                                                        continue
+                                                fwdDist[v] = dv
+                                                fwdParent[v] = u
+                                                heappush(fwdHeap, (dv,v))
+                                                if v in bwdDist and dv + bwdDist[v] < bestCost:
+                                                        bestCost = dv + bwdDist[v]
+                                                        meetNode = v
+                        else:
+                                d,v = heappop(bwdHeap)
+                                if v in bwdDone:
+                                        continue
+                                bwdDone.add(v)
+                                numExpanded += 1
+                                du = d + cost[v]
+                                for i in range(revOffsets[v], revOffsets[v + 1]):
+                                        u = revSources[i]
+                                        if u in bwdDone:
+                                                continue
+                                        if du < bwdDist.get(u, inf):
+                                                if blocked[u] or not (xmin <= nodeX[u] <= xmax and ymin <= nodeY[u] <= ymax):
+                                                        continue
+                                                if corridor is not None and not corridor[nodeCell[u]]:
+                                                        continue
+                                                if sinkMask[u] or onlyFrom and onlyFrom.get(v, u) != u:
+                                                        continue
+                                                bwdDist[u] = du
+                                                bwdParent[u] = v
+                                                heappush(bwdHeap, (du,u))
+                                                if u in fwdDist and fwdDist[u] + du < bestCost:
+                                                        bestCost = fwdDist[u] + du
+                                                        meetNode = u
+                self.numNodesExpanded += numExpanded
+                if meetNode is None:
+                        return None
+                path = []
+                node = meetNode
+                while node is not None:
+                        path.append(node)
+                        node = fwdParent[node]
+                path.reverse()
+                node = bwdParent[meetNode]
+                while node is not None:
+                        path.append(node)
+                        node = bwdParent[node]
+                return path
 
         def write(self, filename):
+                """Write the routed design to filename by extending the existing
+                   PhysicalNetlist message rather than copying it into a Builder
+                   (see writeCopy()): the routing of every routed net, along with
+                   any new strings, is emitted into a separate patch message that
+                   is appended as one more segment, and the sources and stubs
+                   pointers of those nets, and the strList pointer, are redirected
+                   to it by far pointers (see SegmentedMessage). The strList
+                   itself becomes a further segment of far pointers to every
+                   existing and new string.
+
+                   Note that the words of the original sources and stubs of every
+                   routed net, and the original strList pointers, remain in the
+                   output unreferenced. Each time the output of this method is
+                   routed and written again (e.g. when iterating with --reuse)
+                   these dead words accumulate, so the file grows by roughly the
+                   size of the replaced routing on every rewrite, rather than
+                   being compacted as writeCopy() does"""
                 print('Writing design...')
                 tstart = time.time()
-                # Copy the PhysicalNetlist from a pycapnp Reader of an existing design
-                # into a Builder
-                self.netlist = self.netlist.as_builder()
+                reader = self.netlist
 
                 # Build the string to stringIdx dictionary for all strings used in
                 # existing design
                 self.strings = {}
-                for i,string in enumerate(self.netlist.strList):
+                for i,string in enumerate(reader.strList):
                         self.strings[string] = i
 
+                # Caches of string indices for every tile name and every pipData
+                # entry, so that each is resolved through self.strings only once
+                self.tile2stringIndex = {}
+                self.pipData2stringIndex = [None] * len(self.pipData)
+
+                data = getattr(self, 'physNetlistData', None)
+                if data is None:
+                        self.writeCopy(filename, tstart, 'contents of the PhysicalNetlist were not kept')
+                        return
+                if sys.byteorder != 'little':
+                        self.writeCopy(filename, tstart, 'words cannot be patched on a big-endian host')
+                        return
+
+                # Emit the routing of every routed net into a fresh (patch) message
+                # containing just those nets, each starting from a copy of its
+                # existing sources, followed by all new strings
+                import PhysicalNetlist_capnp
+                routedNets = []
+                for netIndex,netReader in enumerate(reader.physNets):
+                        tree = self.net2tree.get(netReader.name)
+                        if tree is not None:
+                                routedNets.append((netIndex,netReader,tree))
+                patch = PhysicalNetlist_capnp.PhysNetlist.new_message()
                 numPIPs = 0
-                s = self.netlist.strList
-                for net in self.netlist.physNets:
-                        pin2node = self.net2pin2node.get(net.name)
-                        if not pin2node:
-                                # Net was not routed; nothing to update
-                                continue
-                        sourcePin2node = pin2node[0]
+                s = CachedTextList(reader.strList)
+                for net,(_,netReader,tree) in zip(patch.init('physNets', len(routedNets)), routedNets):
+                        net.name = netReader.name
+                        net.type = netReader.type
+                        net.sources = netReader.sources
+                        numPIPs += self.writeTree(s, net, netReader, tree)
+                numOldStrings = len(reader.strList)
+                newStrList = patch.init('strList', len(self.strings) - numOldStrings)
+                for string,i in self.strings.items():
+                        if i >= numOldStrings:
+                                newStrList[i - numOldStrings] = string
+                numStr = len(newStrList)
 
-                        # Disown all sink pins from the stubs list
-                        sinkPin2orphan = {}
-                        for i,rb in enumerate(net.stubs):
-                                rs = rb.routeSegment
-                                assert rs.which() == 'sitePin'
-                                sp = rs.sitePin
-                                sinkPin2orphan[s[sp.site],s[sp.pin]] = net.stubs.disown(i)
-                        net.disown('stubs')
-
-                        # Walk through all net sources until a source site pin
-                        # is found
-                        queue = list(net.sources)
-                        while queue:
-                                rb = queue.pop()
-                                queue.extend(rb.branches)
-                                rs = rb.routeSegment
-                                if rs.which() != 'sitePin':
-                                        continue
-                                sp = rb.routeSegment.sitePin
-                                sourceNode = sourcePin2node[s[sp.site],s[sp.pin]]
-                                if net.name not in self.G.nodes[sourceNode]:
-                                        # Source pin was not used by this net
-                                        continue
+                # Copy the patch message into a single segment, so that it can be
+                # appended to the existing message as one more segment
+                singlePatch = PhysicalNetlist_capnp.PhysNetlist.new_message(num_first_segment_words=patch.total_size.word_count + 1)
+                singlePatch.physNets = patch.physNets
+                singlePatch.strList = patch.strList
+                del patch
+                segments = singlePatch.to_segments()
+                if len(segments) != 1:
+                        self.writeCopy(filename, tstart, 'patch message spans %d segments' % len(segments))
+                        return
+
+                # Redirect the sources and stubs of every routed net, and the strList,
+                # of the existing message to the patch message
+                fields = PhysicalNetlist_capnp.PhysNetlist.schema.fields
+                physNetsSlot = fields['physNets'].proto.slot.offset
+                strListSlot = fields['strList'].proto.slot.offset
+                fields = PhysicalNetlist_capnp.PhysNetlist.PhysNet.schema.fields
+                netSlots = [fields[name].proto.slot.offset for name in ('sources','stubs')]
+                message = SegmentedMessage(data)
+                patchSegment = message.numSegments
+                strListSegment = patchSegment + 1
+                patchMessage = SegmentedMessage(segments[0], [len(segments[0]) // 8], patchSegment)
+                nets = message.compositeList(0, 0, physNetsSlot)
+                patchNets = patchMessage.compositeList(0, 0, physNetsSlot)
+                strList = message.pointerList(0, 0, strListSlot)
+                if nets is None or strList is None or nets[4] <= max(netSlots):
+                        self.writeCopy(filename, tstart, 'physNets or strList of the PhysicalNetlist has an unexpected layout')
+                        return
+                patches = {}
+                for k,(netIndex,_,_) in enumerate(routedNets):
+                        for slot in netSlots:
+                                segment,offset = message.compositeListSlot(nets, netIndex, slot)
+                                patches[message.wordIndex(segment, offset)] = patchMessage.landTo(*patchMessage.compositeListSlot(patchNets, k, slot))
+                patches[message.wordIndex(*message.structSlot(0, 0, strListSlot))] = SegmentedMessage.farPointer(strListSegment, 0)
+
+                # Build the new strList as a segment of its own: a list pointer
+                # followed by a far pointer to every existing string (and then to
+                # every new string in the patch message)
+                segment,start,count = strList
+                strListWords = array('Q', [SegmentedMessage.listPointer(0, SegmentedMessage.POINTER, count + numStr)])
+                strListWords.extend(message.landTo(segment, start + i) for i in range(count))
+                if numStr:
+                        segment,start,_ = patchMessage.pointerList(0, 0, strListSlot)
+                        strListWords.extend(patchMessage.landTo(segment, start + i) for i in range(numStr))
+
+                tend = time.time()
+                print('\tInserting %d PIPs and %d strings: %.1fs' % (numPIPs,numStr,tend-tstart))
+                tstart = time.time()
+
+                # Write gzipped to disk: the existing segments (with redirected
+                # pointers), then the patch and strList segments
+                with gzip.open(filename, 'wb', compresslevel=6) as f:
+                        message.writeSegments(f, patches, [segments[0],strListWords.tobytes()])
+
+                tend = time.time()
+                print('\tWrite PhysicalNetlist: %.1fs' % (tend-tstart))
 
-                                # Starting at this source node, walk forward through
-                                # the graph following the next-nodes used by this net
-                                graphQueue = [(rb,sourceNode)]
-                                while graphQueue:
-                                        rb,currNode = graphQueue.pop()
-                                        assert not rb.branches
-                                        currNodeAttr = self.G.nodes[currNode]
-                                        nextNodes = currNodeAttr.get(net.name, [])
-                                        sp = currNodeAttr.get('sp')
-                                        if sp is not None:
-                                                # This node is a sink site pin that must be present on this net:
-                                                # move its corresponding stub as this node's last branch
-                                                branches = rb.init('branches', len(nextNodes) + 1)
-                                                orphan = sinkPin2orphan.pop(sp)
-                                                # Adopting this orphan corrupts orphan.get().branches; copy it instead
-                                                #branches.adopt(len(branches) - 1, orphan)
-                                                branches[-1] = orphan.get()
-                                        else:
-                                                # Not a site pin, must have nextNodes
-                                                assert nextNodes
-                                                branches = rb.init('branches', len(nextNodes))
-                                        # For every edge to a next-node, recover the PIP and add it
-                                        # as a routing branch
-                                        for i,nextNode in enumerate(nextNodes):
-                                                nextRb = branches[i]
-                                                pip = nextRb.routeSegment.init('pip')
-                                                tileName,wire0Name,wire1Name,forward = self.G.getPIP(currNode,nextNode)
-                                                pip.tile = self.getStringIndex(tileName)
-                                                pip.wire0 = self.getStringIndex(wire0Name)
-                                                pip.wire1 = self.getStringIndex(wire1Name)
-                                                pip.forward = forward
-                                                graphQueue.append((nextRb,nextNode))
-                                                numPIPs += 1
-
-                        if sinkPin2orphan:
-                                # Compact the stubs list with all unrouted pins
-                                newStubList = net.init('stubs', len(sinkPin2orphan))
-                                for i,orphan in enumerate(sinkPin2orphan.values()):
-                                        # Adopting this orphan corrupts orphan.get().branches; copy it instead
-                                        #newStubList.adopt(i, orphan)
-                                        newStubList[i] = orphan.get()
+        def writeCopy(self, filename, tstart, reason):
+                """Write the routed design by copying the entire PhysicalNetlist into
+                   a Builder, for when the existing message cannot be extended in
+                   place (for the given reason)"""
+                print('\tCannot extend PhysicalNetlist in place (%s); copying it instead' % reason)
+                # Copy the PhysicalNetlist from a pycapnp Reader of an existing design
+                # into a Builder; the Reader is kept so that unrouted stubs can be
+                # copied from it directly
+                reader = self.netlist
+                self.netlist = self.netlist.as_builder()
+
+                numPIPs = 0
+                s = CachedTextList(reader.strList)
+                for net,netReader in zip(self.netlist.physNets, reader.physNets):
+                        tree = self.net2tree.get(netReader.name)
+                        if tree is None:
+                                # Net was not routed; nothing to update
+                                continue
+                        numPIPs += self.writeTree(s, net, netReader, tree)
 
                 # Initialize a new strList entry (capnp does not support resizing
                 # an existing list).
                 # Rather than copying the underlying string text, detach the pointer
                 # ("disown") them from the existing list and reference ("adopt")
                 # them in the new list.
+                s = self.netlist.strList
                 orphanStrList = []
                 for i in range(len(s)):
                         orphanStrList.append(s.disown(i))
@@ -581,6 +2482,166 @@ class NxRouter:
                 tend = time.time()
                 print('\tWrite PhysicalNetlist: %.1fs' % (tend-tstart))
 
+        def writeTree(self, s, net, netReader, tree):
+                """Emit the RoutingTree of a single net into its PhysicalNetlist Builder
+                   in one pass over the tree's flat arrays, returning the number of PIPs"""
+                sourcePin2node = self.net2pin2node[netReader.name][0]
+
+                # Walk through all net sources to find the RouteBranch
+                # of every source site pin
+                node2sourceRb = {}
+                queue = list(net.sources)
+                while queue:
+                        rb = queue.pop()
+                        queue.extend(rb.branches)
+                        rs = rb.routeSegment
+                        if rs.which() != 'sitePin':
+                                continue
+                        sp = rs.sitePin
+                        sourceNode = sourcePin2node.get((s[sp.site],s[sp.pin]))
+                        if sourceNode is not None:
+                                node2sourceRb[sourceNode] = rb
+
+                # Collect all sink pin stubs from the Reader
+                sinkPin2stub = {}
+                for rb in netReader.stubs:
+                        rs = rb.routeSegment
+                        assert rs.which() == 'sitePin'
+                        sp = rs.sitePin
+                        sinkPin2stub[s[sp.site],s[sp.pin]] = rb
+
+                # Count the branches of every tree entry, with each routed sink
+                # pin's stub becoming the last branch of its entry
+                parents = tree.parents
+                numEntries = len(parents)
+                numBranches = [0] * numEntries
+                for parent in parents:
+                        if parent >= 0:
+                                numBranches[parent] += 1
+                stubs = [None] * numEntries
+                for entry,sp in tree.sinks:
+                        stubs[entry] = sinkPin2stub.pop(sp)
+                        numBranches[entry] += 1
+
+                # Precompute the (tile,wire0,wire1,forward) string indices of the
+                # PIP driving every non-root entry
+                pipStrings = self.getPIPStringIndices(tree.pips)
+
+                # Emit all entries in order; since a parent always precedes its
+                # children, the branch list of a parent is always initialized first
+                branchLists = [None] * numEntries
+                nextBranch = [0] * numEntries
+                numPIPs = 0
+                for i,parent in enumerate(parents):
+                        if parent < 0:
+                                rb = node2sourceRb[tree.nodes[i]]
+                                assert not rb.branches
+                        else:
+                                branch = nextBranch[parent]
+                                nextBranch[parent] = branch + 1
+                                rb = branchLists[parent][branch]
+                                pip = rb.routeSegment.init('pip')
+                                pip.tile,pip.wire0,pip.wire1,pip.forward = pipStrings[i]
+                                numPIPs += 1
+                        if numBranches[i]:
+                                branches = branchLists[i] = rb.init('branches', numBranches[i])
+                                if stubs[i] is not None:
+                                        branches[-1] = stubs[i]
+
+                # Rebuild the stubs list with all unrouted pins
+                newStubList = net.init('stubs', len(sinkPin2stub))
+                for i,stub in enumerate(sinkPin2stub.values()):
+                        newStubList[i] = stub
+
+                return numPIPs
+
+        def getPIPStringIndices(self, pips):
+                """Convert a list of (tileName,pipDataIndex) tuples into a list of
+                   (tileIdx,wire0Idx,wire1Idx,forward) string indices"""
+                tile2stringIndex = self.tile2stringIndex
+                pipData2stringIndex = self.pipData2stringIndex
+                pipData = self.pipData
+                getStringIndex = self.getStringIndex
+                pipStrings = [None] * len(pips)
+                for i,pip in enumerate(pips):
+                        if pip is None:
+                                continue
+                        tileName,pipDataIndex = pip
+                        tileIdx = tile2stringIndex.get(tileName)
+                        if tileIdx is None:
+                                tileIdx = tile2stringIndex[tileName] = getStringIndex(tileName)
+                        wireIndices = pipData2stringIndex[pipDataIndex]
+                        if wireIndices is None:
+                                wire0Name,wire1Name,forward = pipData[pipDataIndex]
+                                wireIndices = pipData2stringIndex[pipDataIndex] = (getStringIndex(wire0Name),getStringIndex(wire1Name),forward)
+                        pipStrings[i] = (tileIdx,) + wireIndices
+                return pipStrings
+
+        def wirelengthRoutes(self):
+                """Describe the routing of every routed net in the form accepted by
+                   the routes argument of WirelengthAnalyzer: a dict mapping each
+                   net's index to a list of (sourceBelPin,connections) tuples, where
+                   each connection is a ([(tileName,wire1Name),...],[sinkBelPin,...])
+                   tuple and BEL pins are (site,bel,pin) string indices"""
+                s = CachedTextList(self.netlist.strList)
+                pipData = self.pipData
+                routes = {}
+                for netIndex,net in enumerate(self.netlist.physNets):
+                        tree = self.net2tree.get(net.name)
+                        if tree is None or not tree.sinks:
+                                continue
+                        sourcePin2node = self.net2pin2node[net.name][0]
+
+                        # Map every source node to the BEL pin that drives it
+                        node2sourceBelPin = {}
+                        for rb in net.sources:
+                                bp = rb.routeSegment.belPin
+                                for sp in self.extractSitePins(rb.branches):
+                                        sourceNode = sourcePin2node.get((s[sp.site],s[sp.pin]))
+                                        if sourceNode is not None:
+                                                node2sourceBelPin[sourceNode] = (bp.site,bp.bel,bp.pin)
+
+                        # Collect the BEL pins reached from every sink pin stub
+                        sinkPin2belPins = {}
+                        for rb in net.stubs:
+                                sp = rb.routeSegment.sitePin
+                                sinkPin2belPins[s[sp.site],s[sp.pin]] = self.extractBelPins(rb.branches)
+
+                        # Walk back from every routed sink to its source, collecting
+                        # the PIPs on the way
+                        parents = tree.parents
+                        source2connections = {}
+                        for entry,sp in tree.sinks:
+                                pips = []
+                                while parents[entry] >= 0:
+                                        tileName,pipDataIndex = tree.pips[entry]
+                                        pips.append((tileName,pipData[pipDataIndex][1]))
+                                        entry = parents[entry]
+                                source2connections.setdefault(tree.nodes[entry], []).append((pips,sinkPin2belPins[sp]))
+                        routes[netIndex] = [(node2sourceBelPin[node],connections)
+                                            for node,connections in source2connections.items()]
+                return routes
+
+        def criticalWirelength(self):
+                """Compute the critical-path wirelength of the current routing using
+                   the wirelength analyzer in-process, without writing the routed
+                   PhysicalNetlist out"""
+                from wa import WirelengthAnalyzer
+                wa = WirelengthAnalyzer(self.netlist, routes=self.wirelengthRoutes())
+                return wa.critical_wirelength()
+
+        def extractBelPins(self, branches):
+                belPins = []
+                queue = list(branches)
+                while queue:
+                        rb = queue.pop()
+                        rs = rb.routeSegment
+                        if not rb.branches and rs.which() == 'belPin':
+                                bp = rs.belPin
+                                belPins.append((bp.site,bp.bel,bp.pin))
+                        queue.extend(rb.branches)
+                return belPins
+
         def extractSitePins(self, branches):
                 sitePins = []
                 queue = list(branches)
@@ -595,6 +2656,170 @@ class NxRouter:
         def getStringIndex(self, string):
                 return self.strings.setdefault(string, len(self.strings))
 
+class RoutingTree:
+        """Routing tree of a single net, stored as flat arrays where each entry
+           is a graph node along with the index of its parent entry (-1 for a
+           source node) and the PIP (as a (tileName,pipDataIndex) tuple) that
+           drives it from its parent. Entries are appended in path order so that
+           a parent entry always precedes all of its children."""
+        __slots__ = 'nodes','parents','pips','sinks','node2entry'
+        def __init__(self):
+                self.nodes = []
+                self.parents = array('i')
+                self.pips = []
+                # List of (entry,sinkPin) tuples for every routed sink
+                self.sinks = []
+                self.node2entry = {}
+        def addEntry(self, node, parent, pip):
+                entry = self.node2entry[node] = len(self.nodes)
+                self.nodes.append(node)
+                self.parents.append(parent)
+                self.pips.append(pip)
+                return entry
+        def addPath(self, G, path, sinkPin):
+                node2entry = self.node2entry
+                u = path[0]
+                parent = node2entry.get(u)
+                if parent is None:
+                        parent = self.addEntry(u, -1, None)
+                for v in path[1:]:
+                        entry = node2entry.get(v)
+                        if entry is None:
+                                entry = self.addEntry(v, parent, G[u][v]['pip'])
+                        u,parent = v,entry
+                self.sinks.append((parent,sinkPin))
+
+class SegmentedMessage:
+        """Read-only view of the words of an unpacked Cap'n Proto message, for
+           locating individual pointers within it (following any far pointers)
+           and writing it back out with some of those pointers replaced, without
+           copying or decoding the rest of the message.
+
+           When the message is to be appended to another as further segments, its
+           segments are numbered from firstSegmentId in any pointers constructed
+           by landTo()"""
+
+        # Pointer kinds, and the element size of a list of pointers
+        STRUCT = 0
+        LIST = 1
+        FAR = 2
+        POINTER = 6
+        COMPOSITE = 7
+
+        def __init__(self, data, segmentSizes=None, firstSegmentId=0):
+                """Wrap data, either a complete message starting with its segment
+                   table or (if segmentSizes is given) just its segments"""
+                self.words = memoryview(data).cast('Q')
+                self.headerWords = 0
+                if segmentSizes is None:
+                        numSegments = (self.words[0] & 0xffffffff) + 1
+                        segmentSizes = list(memoryview(data)[4:4 + 4 * numSegments].cast('I'))
+                        self.headerWords = (4 + 4 * numSegments + 7) // 8
+                self.segmentSizes = segmentSizes
+                self.numSegments = len(segmentSizes)
+                self.segmentStarts = list(itertools.accumulate(segmentSizes[:-1], initial=self.headerWords))
+                self.firstSegmentId = firstSegmentId
+
+        def wordIndex(self, segment, offset):
+                return self.segmentStarts[segment] + offset
+
+        def resolve(self, segment, offset):
+                """Follow the pointer at offset within segment, returning the segment
+                   and offset of its target along with the word that describes it,
+                   or None for a null pointer"""
+                word = self.words[self.segmentStarts[segment] + offset]
+                if word == 0:
+                        return None
+                if word & 3 == self.FAR:
+                        segment,pad = word >> 32,(word >> 3) & 0x1fffffff
+                        if not word & 4:
+                                return self.resolve(segment, pad)
+                        # Double-far: the landing pad is a far pointer to the target,
+                        # followed by the word that describes it
+                        far = self.words[self.segmentStarts[segment] + pad]
+                        return far >> 32,(far >> 3) & 0x1fffffff,self.words[self.segmentStarts[segment] + pad + 1]
+                rel = (word >> 2) & 0x3fffffff
+                if rel & 0x20000000:
+                        rel -= 0x40000000
+                return segment,offset + 1 + rel,word
+
+        def structSlot(self, segment, offset, slot):
+                """Return the segment and offset of the given pointer slot of the
+                   struct pointed to from offset within segment, or None if the
+                   struct is null or has no such slot"""
+                target = self.resolve(segment, offset)
+                if target is None or target[2] & 3 != self.STRUCT:
+                        return None
+                segment,start,word = target
+                if slot >= word >> 48:
+                        return None
+                return segment,start + ((word >> 32) & 0xffff) + slot
+
+        def compositeList(self, segment, offset, slot):
+                """Return the list of structs in the given pointer slot of the struct
+                   pointed to from offset within segment as (segment,start,count,
+                   dataWords,pointerCount), or None"""
+                location = self.structSlot(segment, offset, slot)
+                target = location and self.resolve(*location)
+                if not target or target[2] & 3 != self.LIST or (target[2] >> 32) & 7 != self.COMPOSITE:
+                        return None
+                segment,start,_ = target
+                tag = self.words[self.segmentStarts[segment] + start]
+                return segment,start + 1,(tag >> 2) & 0x3fffffff,(tag >> 32) & 0xffff,tag >> 48
+
+        def compositeListSlot(self, elements, i, slot):
+                """Return the segment and offset of the given pointer slot of element
+                   i of a list returned by compositeList()"""
+                segment,start,_,dataWords,pointerCount = elements
+                return segment,start + i * (dataWords + pointerCount) + dataWords + slot
+
+        def pointerList(self, segment, offset, slot):
+                """Return the list of pointers in the given pointer slot of the struct
+                   pointed to from offset within segment as (segment,start,count), or
+                   None"""
+                location = self.structSlot(segment, offset, slot)
+                target = location and self.resolve(*location)
+                if not target or target[2] & 3 != self.LIST or (target[2] >> 32) & 7 != self.POINTER:
+                        return None
+                segment,start,word = target
+                return segment,start,word >> 35
+
+        def landTo(self, segment, offset):
+                """Return a word that, placed anywhere in the combined message, points
+                   to the same target as the pointer at offset within segment (which
+                   becomes the landing pad of a far pointer)"""
+                word = self.words[self.segmentStarts[segment] + offset]
+                if word == 0 or word & 3 == self.FAR:
+                        return word
+                return self.farPointer(self.firstSegmentId + segment, offset)
+
+        @staticmethod
+        def farPointer(segment, offset):
+                return SegmentedMessage.FAR | offset << 3 | segment << 32
+
+        @staticmethod
+        def listPointer(offset, elementSize, count):
+                return SegmentedMessage.LIST | (offset & 0x3fffffff) << 2 | elementSize << 32 | count << 35
+
+        def writeSegments(self, f, patches, extraSegments):
+                """Write the message to file f, with the word at each index of patches
+                   (see wordIndex()) replaced by its value, followed by extraSegments
+                   (each as bytes)"""
+                sizes = self.segmentSizes + [len(segment) // 8 for segment in extraSegments]
+                header = array('I', [len(sizes) - 1] + sizes)
+                if len(header) % 2:
+                        header.append(0)
+                f.write(header.tobytes())
+                data = self.words.cast('B')
+                pos = self.headerWords
+                for index in sorted(patches):
+                        f.write(data[8 * pos:8 * index])
+                        f.write(array('Q', [patches[index]]).tobytes())
+                        pos = index + 1
+                f.write(data[8 * pos:8 * (self.segmentStarts[-1] + self.segmentSizes[-1])])
+                for segment in extraSegments:
+                        f.write(segment)
+
 class CachedTextList:
         """Drop-in class for wrapping capnp's 'List<Text>' objects where
            gotten strings are cached rather than deep copied on each lookup"""
@@ -608,12 +2833,144 @@ class CachedTextList:
                 return v
 
 
-if len(sys.argv) != 3:
-        print('USAGE: <unrouted.phys> <routed.phys>')
-        sys.exit(1)
+def main():
+        parser = argparse.ArgumentParser(
+                prog='nxroute-poc',
+                description='Route all unrouted signal nets in an FPGA Interchange PhysicalNetlist')
+        parser.add_argument('unrouted', type=str, help='unrouted PhysicalNetlist to read')
+        parser.add_argument('routed', type=str, help='routed PhysicalNetlist to write')
+        parser.add_argument('--save-checkpoint', metavar='FILE', type=str,
+                            help='save a checkpoint of the router state after parsing the design')
+        parser.add_argument('--checkpoint-pins', metavar='N', type=int,
+                            help='with --save-checkpoint, save the checkpoint only once N pins have '
+                                 'been routed in total, including any routed before --resume or reused '
+                                 'by --reuse (or all pins, if fewer)')
+        parser.add_argument('--net-order', metavar='POLICY', type=str, default='default',
+                            choices=['default', 'fanout', 'bbox', 'hilbert'],
+                            help='order in which nets are routed: default, fanout, bbox or hilbert')
+        parser.add_argument('--cluster-size', metavar='TILES', type=int, default=0,
+                            help='batch nets whose bounding box centres fall in the same TILES x TILES '
+                                 'region (0 to disable)')
+        parser.add_argument('--sort-sinks', action='store_true',
+                            help='route the sinks of each net nearest-first')
+        parser.add_argument('--bbox-margin', metavar=('X','Y'), type=int, nargs=2,
+                            default=(NxRouter.BBOX_MARGIN_X, NxRouter.BBOX_MARGIN_Y),
+                            help='extend each connection\'s search bounding box by X and Y tiles '
+                                 '(default: %(default)s)')
+        parser.add_argument('--bbox-expansions', metavar='N', type=int, default=NxRouter.BBOX_EXPANSIONS,
+                            help='grow the bounding box of a failed connection up to N times before '
+                                 'searching without one '
+                                 '(default: %(default)s)')
+        parser.add_argument('--no-bbox', action='store_true',
+                            help='search the entire routing graph for every connection')
+        parser.add_argument('--criticality', metavar='C', type=float,
+                            help='route each connection by the lowest cost, where the cost of each node '
+                                 'blends (by C, between 0 and 1) its hop count with the wirelength that '
+                                 'it is scored for, rather than by the fewest hops')
+        parser.add_argument('--lookahead', metavar='FILE', type=str,
+                            help='guide each connection\'s lowest-cost search by the lookahead table '
+                                 'in FILE (computed from the routing graph and saved there first if '
+                                 'FILE does not exist, or was computed for a different graph)')
+        parser.add_argument('--bidirectional-distance', metavar='TILES', type=int,
+                            help='route connections whose source and sink are at least TILES apart by '
+                                 'a lowest-cost search from both ends (with --criticality or --lookahead)')
+        parser.add_argument('--bidirectional-report', action='store_true',
+                            help='search every connection both unidirectionally and bidirectionally, and '
+                                 'report which expanded fewer nodes by connection length')
+        parser.add_argument('--global-cell', metavar=('X','Y'), type=int, nargs=2,
+                            help='first route every connection over a coarse grid of cells of X by Y '
+                                 'tiles, and confine its detailed search to the cells near that route')
+        parser.add_argument('--global-corridor', metavar='CELLS', type=int, default=NxRouter.GLOBAL_CORRIDOR,
+                            help='with --global-cell, widen each connection\'s global route by CELLS '
+                                 'cells for its detailed search (default: %(default)s)')
+        parser.add_argument('--lut-pin-swapping', action='store_true',
+                            help='allow connections to LUT input site pins to end at any other free '
+                                 'input site pin of the same LUT instead')
+        parser.add_argument('--lazy', action='store_true',
+                            help='build the out-edges of each node of the routing graph only when '
+                                 'the router first needs them (implies a lowest-cost search)')
+        parser.add_argument('--lazy-cache-nodes', metavar='N', type=int, default=NxRoutingGraph.LAZY_CACHE_NODES,
+                            help='with --lazy, keep the out-edges of at most N nodes '
+                                 '(default: %(default)s)')
+        parser.add_argument('--window', metavar=('X','Y'), type=int, nargs=2,
+                            help='never build the routing graph of more than X by Y tiles at once, by '
+                                 'routing the nets that fit inside each window of that size in turn '
+                                 '(and the rest in passes over ever larger windows)')
+        parser.add_argument('--window-overlap', metavar=('X','Y'), type=int, nargs=2,
+                            default=(NxRouter.WINDOW_OVERLAP_X, NxRouter.WINDOW_OVERLAP_Y),
+                            help='with --window, overlap adjacent windows by X and Y tiles '
+                                 '(default: %(default)s)')
+        parser.add_argument('--window-memory', metavar='GB', type=float,
+                            help='as --window, with the largest windows whose routing graph is '
+                                 'expected to fit within GB gigabytes')
+        parser.add_argument('--memory-report', action='store_true',
+                            help='build the routing graph, report the memory used by each of its '
+                                 'data structures (extrapolated to the entire device) and exit')
+        parser.add_argument('--report-wirelength', action='store_true',
+                            help='report the critical-path wirelength of the routing, computed '
+                                 'in-process by the wirelength analyzer')
+        parser.add_argument('--reuse', metavar='FILE', type=str,
+                            help='reuse the routing of every net of FILE, a previously routed '
+                                 'PhysicalNetlist, that is still legal, and route only the rest')
+        parser.add_argument('--resume', metavar='FILE', type=str,
+                            help='resume from a checkpoint instead of building the routing graph '
+                                 'and parsing the design')
+        args = parser.parse_args()
+        if args.lazy and (args.save_checkpoint or args.resume):
+                parser.error('--lazy cannot be used with checkpoints')
+        if args.window_memory is not None:
+                args.window = NxRouter.windowForMemory(args.window_memory * (1 << 30))
+        if args.window and (args.save_checkpoint or args.resume):
+                parser.error('--window cannot be used with checkpoints')
+        if args.reuse and (args.window or args.resume):
+                parser.error('--reuse cannot be used with --window or --resume')
+        NxRoutingGraph.LAZY = args.lazy
+        NxRoutingGraph.LAZY_CACHE_NODES = args.lazy_cache_nodes
+        NxRouter.LUT_PIN_SWAPPING = args.lut_pin_swapping
+
+        if args.memory_report:
+                NxRoutingGraph.MEMORY_REPORT = True
+                NxRoutingGraph().build('xcvu3p.device')
+                print('Peak memory:', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'KB')
+                return
+
+        if args.resume:
+                context = NxRouter.resume(args.resume, args.unrouted)
+        elif args.window:
+                context = NxRouter.createWindowed('xcvu3p.device', args.unrouted)
+        else:
+                context = NxRouter.create('xcvu3p.device', args.unrouted, args.reuse)
+        with context as router:
+                if args.save_checkpoint and args.checkpoint_pins is None:
+                        router.saveCheckpoint(args.save_checkpoint)
+                if args.no_bbox:
+                        router.BBOX_MARGIN_X = router.BBOX_MARGIN_Y = None
+                else:
+                        router.BBOX_MARGIN_X,router.BBOX_MARGIN_Y = args.bbox_margin
+                router.BBOX_EXPANSIONS = args.bbox_expansions
+                router.CRITICALITY = args.criticality
+                router.LOOKAHEAD = args.lookahead
+                router.BIDIRECTIONAL_DISTANCE = args.bidirectional_distance
+                router.BIDIRECTIONAL_REPORT = args.bidirectional_report
+                if args.global_cell:
+                        router.GLOBAL_CELL_X,router.GLOBAL_CELL_Y = args.global_cell
+                router.GLOBAL_CORRIDOR = args.global_corridor
+                if args.window:
+                        router.WINDOW_X,router.WINDOW_Y = args.window
+                        router.WINDOW_OVERLAP_X,router.WINDOW_OVERLAP_Y = args.window_overlap
+                        router.routeWindowed(lambda G: NetScheduler(G, args.net_order, args.cluster_size, args.sort_sinks))
+                else:
+                        scheduler = NetScheduler(router.G, args.net_order, args.cluster_size, args.sort_sinks)
+                        router.route(scheduler, args.save_checkpoint, args.checkpoint_pins)
+                if args.report_wirelength:
+                        print('Analyzing wirelength...')
+                        tstart = time.time()
+                        wirelength = router.criticalWirelength()
+                        tend = time.time()
+                        print('\tCritical-path wirelength %d: %.1fs' % (wirelength,tend-tstart))
+                router.write(args.routed)
 
-with NxRouter.create('xcvu3p.device', sys.argv[1]) as router:
-        router.route()
-        router.write(sys.argv[2])
+        print('Peak memory:', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'KB')
 
-print('Peak memory:', resource.getrusage(resource.RUSAGE_SELF).ru_maxrss, 'KB')
+if __name__ == "__main__":
+        main()
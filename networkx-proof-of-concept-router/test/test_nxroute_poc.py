@@ -0,0 +1,257 @@
+# Copyright (C) 2024, Advanced Micro Devices, Inc.  All rights reserved.
+#
+# SPDX-License-Identifier: MIT
+#
+
+import os
+import io
+import sys
+import gzip
+import tempfile
+import unittest
+from contextlib import redirect_stdout
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.append(os.path.join(THIS_DIR, '..', '..', 'fpga-interchange-schema', 'interchange'))
+sys.path.append(os.path.join(THIS_DIR, '..', '..', 'benchmark_generator'))
+import PhysicalNetlist_capnp
+from bg import BenchmarkGenerator, import_router
+
+# DeviceResources downloaded (or generated) by `make xcvu3p.device` at the root
+# of the repository
+DEVICE = os.path.join(THIS_DIR, '..', '..', 'xcvu3p.device')
+
+@unittest.skipUnless(os.path.exists(DEVICE), "requires xcvu3p.device at the root of the repository")
+class TestNxRouter(unittest.TestCase):
+    """
+    This class provides some test cases for the proof-of-concept router, on a
+    small synthetic design generated by bg.py.
+    """
+
+    # Tile coordinates of the region to build the routing graph of, and to
+    # place the design in
+    REGION = (36, 55, 60, 119)
+    NUM_NETS = 200
+    SEED = 1
+
+    @classmethod
+    def setUpClass(cls):
+        cls.nxroute = import_router()
+        # Register the router module so that create() can pass its functions
+        # to a background process
+        sys.modules[cls.nxroute.__name__] = cls.nxroute
+        NxRoutingGraph = cls.nxroute.NxRoutingGraph
+        NxRoutingGraph.MIN_X, NxRoutingGraph.MAX_X, NxRoutingGraph.MIN_Y, NxRoutingGraph.MAX_Y = cls.REGION
+        cls.work_dir = tempfile.TemporaryDirectory()
+        cls.unrouted = os.path.join(cls.work_dir.name, 'synthetic_unrouted.phys')
+        with redirect_stdout(io.StringIO()):
+            generator = BenchmarkGenerator(DEVICE, cls.REGION)
+            generator.generate(cls.NUM_NETS, 2.0, 64, (3.0, 15.0), 0.5, cls.SEED)
+            generator.write_phys_netlist(cls.unrouted)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.work_dir.cleanup()
+
+    def read_data(self, filename):
+        """
+        Read a gzipped Physical Netlist written by the router
+
+        Args:
+            filename: filename of the Physical Netlist
+        Returns:
+            its un-gzipped contents
+        """
+        with open(filename, 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def read_phys_netlist(self, filename):
+        """
+        Read a gzipped Physical Netlist written by the router
+
+        Args:
+            filename: filename of the Physical Netlist
+        Returns:
+            a context manager of its reader
+        """
+        return PhysicalNetlist_capnp.PhysNetlist.from_bytes(self.read_data(filename),
+                                                            traversal_limit_in_words=sys.maxsize, nesting_limit=2**16)
+
+    def assertSameNets(self, a_fname, b_fname):
+        """
+        Check that two Physical Netlists have the same string list and the
+        same (routing of every) net.
+        """
+        with self.read_phys_netlist(a_fname) as a, self.read_phys_netlist(b_fname) as b:
+            self.assertEqual(list(a.strList), list(b.strList))
+            self.assertEqual(len(a.physNets), len(b.physNets))
+            for i, (net_a, net_b) in enumerate(zip(a.physNets, b.physNets)):
+                with self.subTest(net = i):
+                    self.assertEqual(net_a.to_dict(), net_b.to_dict())
+
+    def net_routing(self, filename):
+        """
+        Return the routing of every net of a Physical Netlist, independent of
+        the order of its branches and of its string list.
+
+        Args:
+            filename: filename of the Physical Netlist
+        Returns:
+            a mapping from net name to its sorted PIPs and site pins
+        """
+        routing = {}
+        with self.read_phys_netlist(filename) as netlist:
+            s = netlist.strList
+            for net in netlist.physNets:
+                pips, site_pins = [], []
+                stack = list(net.sources)
+                while stack:
+                    rb = stack.pop()
+                    rs = rb.routeSegment
+                    which = rs.which()
+                    if which == 'pip':
+                        pips.append((s[rs.pip.tile], s[rs.pip.wire0], s[rs.pip.wire1], rs.pip.forward))
+                    elif which == 'sitePin':
+                        site_pins.append((s[rs.sitePin.site], s[rs.sitePin.pin]))
+                    stack.extend(rb.branches)
+                routing[s[net.name]] = (sorted(pips), sorted(site_pins))
+        return routing
+
+    def test_write(self):
+        """
+        Check that extending the existing Physical Netlist in place (write())
+        produces the same nets and string list as copying it into a Builder
+        (writeCopy()), which write() falls back to when the contents of the
+        Physical Netlist were not kept.
+        """
+        extended = os.path.join(self.work_dir.name, 'extended.phys')
+        copied = os.path.join(self.work_dir.name, 'copied.phys')
+        with redirect_stdout(io.StringIO()) as out:
+            with self.nxroute.NxRouter.create(DEVICE, self.unrouted) as router:
+                router.route()
+                self.assertGreater(len(router.net2tree), 0)
+                router.write(extended)
+                self.assertNotIn('copying it instead', out.getvalue())
+                router.physNetlistData = None
+                router.write(copied)
+                self.assertIn('copying it instead', out.getvalue())
+        self.assertSameNets(extended, copied)
+
+    def test_write_twice(self):
+        """
+        Check that writing the same routed design twice, which extends the
+        same PhysicalNetlist message again, produces identical output.
+        """
+        first = os.path.join(self.work_dir.name, 'first.phys')
+        second = os.path.join(self.work_dir.name, 'second.phys')
+        with redirect_stdout(io.StringIO()):
+            with self.nxroute.NxRouter.create(DEVICE, self.unrouted) as router:
+                router.route()
+                router.write(first)
+                router.write(second)
+        self.assertEqual(self.read_data(first), self.read_data(second))
+        self.assertSameNets(first, second)
+
+    def test_resume(self):
+        """
+        Check that resuming from a checkpoint saved after the first net was
+        routed, and routing the remaining nets, gives the same routing as
+        routing every net without stopping.
+        """
+        checkpoint = os.path.join(self.work_dir.name, 'checkpoint.pkl')
+        uninterrupted = os.path.join(self.work_dir.name, 'uninterrupted.phys')
+        resumed = os.path.join(self.work_dir.name, 'resumed.phys')
+        NxRouter = self.nxroute.NxRouter
+        with redirect_stdout(io.StringIO()):
+            with NxRouter.create(DEVICE, self.unrouted) as router:
+                router.route(checkpointFilename=checkpoint, checkpointPins=1)
+                router.write(uninterrupted)
+                num_routed_nets = len(router.routedNets)
+            with NxRouter.resume(checkpoint, self.unrouted) as router:
+                self.assertTrue(0 < len(router.routedNets) < num_routed_nets)
+                router.route()
+                router.write(resumed)
+                self.assertEqual(len(router.routedNets), num_routed_nets)
+        self.assertSameNets(uninterrupted, resumed)
+
+    def test_reuse(self):
+        """
+        Check that routing again while reusing the routing of a previously
+        routed Physical Netlist reuses every routed pin of every net, and
+        writes the same routing.
+        """
+        previous = os.path.join(self.work_dir.name, 'previous.phys')
+        reused = os.path.join(self.work_dir.name, 'reused.phys')
+        NxRouter = self.nxroute.NxRouter
+        with redirect_stdout(io.StringIO()) as out:
+            with NxRouter.create(DEVICE, self.unrouted) as router:
+                router.route()
+                router.write(previous)
+                num_pins = sum(len(tree.sinks) for tree in router.net2tree.values())
+            with NxRouter.create(DEVICE, self.unrouted, previous) as router:
+                self.assertIn('(0 nets ripped up)', out.getvalue())
+                self.assertEqual(sum(len(tree.sinks) for tree in router.net2tree.values()), num_pins)
+                router.route()
+                router.write(reused)
+        self.assertEqual(self.net_routing(reused), self.net_routing(previous))
+
+    def test_lut_pin_swapping(self):
+        """
+        Check that with LUT pin swapping enabled, every connection written
+        ends either at its sink pin or at a free input pin of the same LUT
+        (whose PIP is followed by the original sink pin, for CheckPhysNetlist
+        to swap), and that no two connections end at the same pin.
+        """
+        routed = os.path.join(self.work_dir.name, 'swapped.phys')
+        NxRouter = self.nxroute.NxRouter
+        NxRouter.LUT_PIN_SWAPPING = True
+        try:
+            with redirect_stdout(io.StringIO()):
+                with NxRouter.create(DEVICE, self.unrouted) as router:
+                    router.route()
+                    router.write(routed)
+        finally:
+            NxRouter.LUT_PIN_SWAPPING = False
+        self.assertGreater(router.numLutPinSwaps, 0)
+
+        # Map the (tile,wire) driven by every PIP of every routed net back to
+        # its node, and every sink pin to its own node
+        wire2node = {}
+        for tree in router.net2tree.values():
+            for node, pip in zip(tree.nodes, tree.pips):
+                if pip is not None:
+                    tile, pip_data_index = pip
+                    wire0, wire1, forward = router.pipData[pip_data_index]
+                    wire2node[tile, wire1 if forward else wire0] = node
+        pin2node = {pin: node for node, pin in router.sink2pin.items()}
+
+        end2pin = {}
+        num_swapped = 0
+        with self.read_phys_netlist(routed) as netlist:
+            s = netlist.strList
+            for net in netlist.physNets:
+                # Stack of (RouteBranch,(tile,wire) driven by its parent if a PIP)
+                stack = [(rb, None) for rb in net.sources]
+                while stack:
+                    rb, driven = stack.pop()
+                    rs = rb.routeSegment
+                    which = rs.which()
+                    if which == 'sitePin' and driven is not None:
+                        pin = (s[rs.sitePin.site], s[rs.sitePin.pin])
+                        sink_node, end_node = pin2node[pin], wire2node[driven]
+                        with self.subTest(net = s[net.name], pin = pin):
+                            self.assertNotIn(end_node, end2pin)
+                            end2pin[end_node] = pin
+                            if end_node != sink_node:
+                                num_swapped += 1
+                                self.assertIn(end_node, router.sink2equivalents[sink_node])
+                                self.assertFalse(router.sinkMask[end_node])
+                    if which == 'pip':
+                        driven = (s[rs.pip.tile], s[rs.pip.wire1] if rs.pip.forward else s[rs.pip.wire0])
+                    else:
+                        driven = None
+                    stack.extend((branch, driven) for branch in rb.branches)
+        self.assertEqual(num_swapped, router.numLutPinSwaps)
+
+if __name__ == '__main__':
+    unittest.main()
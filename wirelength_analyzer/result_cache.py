@@ -0,0 +1,174 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc.  All rights reserved.
+#
+# SPDX-License-Identifier: MIT
+#
+
+import os
+import json
+import hashlib
+
+THIS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Source files whose contents determine the analysis results
+SOURCES = ['wa.py', 'xcvup_device_data.py']
+
+def sources_digest():
+    """
+    Return a hex digest of the sources that determine the analysis results,
+    for use as the version of anything derived from an analysis.
+    """
+    h = hashlib.sha256()
+    for s in SOURCES:
+        with open(os.path.join(THIS_DIR, s), 'rb') as f:
+            h.update(f.read())
+    return h.hexdigest()
+
+class ResultCache:
+    """
+    This class provides an on-disk cache of wirelength analysis results.
+
+    Results are keyed on the SHA-256 of the contents of the Physical Netlist
+    file, the analysis options, and a digest of the analyzer and device data
+    sources, so that any change to how wirelength is computed invalidates every
+    previous result. So that a lookup need not read the whole netlist, the
+    digest of each file's contents is recorded in a side index, keyed on its
+    path, size and modification time, and only recomputed once any of these
+    change.
+
+    Each result is stored as a single JSON file in the cache directory, whose
+    modification time is refreshed on every hit. Once the total size of the
+    cache exceeds its bound the least recently used files are evicted.
+    """
+
+    # Name of the side index of file content digests in the cache directory
+    INDEX = 'digests.idx'
+
+    def __init__(self, cache_dir, max_bytes):
+        """
+        Args:
+            cache_dir: directory in which to store results, created if it
+            does not already exist
+            max_bytes: bound on the total size of all stored results
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self.version = sources_digest()
+        self.index = self.load_index()
+
+    def key(self, physical_netlist, *options):
+        """
+        Compute the cache key for a Physical Netlist analyzed with the
+        provided options.
+
+        Args:
+            physical_netlist: filepath of the FPGA Interchange Format Physical
+            Netlist
+            options: any further values that affect the result
+
+        Returns:
+            the key as a hex string
+        """
+        h = hashlib.sha256(self.version.encode())
+        h.update(json.dumps(options).encode())
+        h.update(self.digest(physical_netlist).encode())
+        return h.hexdigest()
+
+    def digest(self, filename):
+        """
+        Return the SHA-256 of the contents of a file, which is only computed
+        (and recorded in the side index) if the file's size or modification
+        time differ from those last recorded for its path.
+        """
+        path = os.path.abspath(filename)
+        st = os.stat(path)
+        stamp = [st.st_size, st.st_mtime_ns]
+        entry = self.index.get(path)
+        if entry is not None and entry[:2] == stamp:
+            return entry[2]
+
+        h = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                h.update(chunk)
+        digest = h.hexdigest()
+        # Merge with any entries recorded by other processes since the index
+        # was loaded, then replace it atomically
+        self.index = self.load_index()
+        self.index[path] = stamp + [digest]
+        p = os.path.join(self.cache_dir, self.INDEX)
+        tmp = p + '.%d.tmp' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(self.index, f)
+        os.replace(tmp, p)
+        return digest
+
+    def load_index(self):
+        """
+        Return the side index of file content digests, mapping each path to
+        its [size, modification time, digest], or an empty index if there is
+        none (or it is unreadable).
+        """
+        try:
+            with open(os.path.join(self.cache_dir, self.INDEX)) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        return index if isinstance(index, dict) else {}
+
+    def path(self, key):
+        return os.path.join(self.cache_dir, key + '.json')
+
+    def get(self, key):
+        """
+        Return the result stored under the provided key, or None if there is
+        no such result.
+        """
+        p = self.path(key)
+        try:
+            with open(p) as f:
+                result = json.load(f)
+            os.utime(p)
+        except (OSError, ValueError):
+            return None
+        return result
+
+    def put(self, key, result):
+        """
+        Store a JSON serializable result under the provided key, then evict
+        the least recently used results until the cache is within its bound.
+        """
+        p = self.path(key)
+        tmp = p + '.%d.tmp' % os.getpid()
+        with open(tmp, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp, p)
+        self.evict()
+
+    def evict(self):
+        """
+        Remove the least recently used results until the total size of the
+        cache is within its bound. Results that have already been removed by
+        another process are ignored.
+        """
+        entries = []
+        total = 0
+        with os.scandir(self.cache_dir) as it:
+            for e in it:
+                if not e.name.endswith('.json'):
+                    continue
+                try:
+                    st = e.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, e.path))
+                total += st.st_size
+        entries.sort()
+        for _, size, p in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(p)
+            except FileNotFoundError:
+                pass
+            total -= size
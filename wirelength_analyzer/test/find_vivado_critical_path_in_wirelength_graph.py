@@ -130,10 +130,9 @@ class FindVivadoCriticalPathInWirelengthGraph:
         found_bels = set()
         vcp_bels = {(element[0], element[1]) for element in self.vivado_critical_path}
         for n in self.wa.G:
-            seg = self.wa.G.nodes[n]['segment']
-            if seg.which() == 'belPin':
-                site = sl[seg.belPin.site]
-                bel = sl[seg.belPin.bel]
+            if self.wa.node_kind[n] == self.wa.BEL_PIN:
+                site = sl[self.wa.node_site[n]]
+                bel = sl[self.wa.node_bel[n]]
                 element = (site, bel)
                 if element in vcp_bels:
                     found_bels.add(element)
@@ -163,8 +162,8 @@ class FindVivadoCriticalPathInWirelengthGraph:
             self.vivado_critical_path
         """
         sl = self.wa.phys.strList
-        first_bel = self.wa.G.nodes[self.wirelength_path[0]]['segment'].belPin.bel
-        second_bel = self.wa.G.nodes[self.wirelength_path[1]]['segment'].belPin.bel
+        first_bel = self.wa.node_bel[self.wirelength_path[0]]
+        second_bel = self.wa.node_bel[self.wirelength_path[1]]
         if first_bel == second_bel:
             wa_edges = zip(self.wirelength_path[1::2], self.wirelength_path[2::2])
         else:
@@ -174,18 +173,16 @@ class FindVivadoCriticalPathInWirelengthGraph:
 
         wl = 0
         for e in wa_edges:
-            seg = self.wa.G.nodes[e[0]]['segment']
-            site = seg.belPin.site
-            bel = seg.belPin.bel
+            site = self.wa.node_site[e[0]]
+            bel = self.wa.node_bel[e[0]]
             cell_name = sl[self.wa.placements[(site, bel)].cellName]
             wa_path.append((sl[site], sl[bel], cell_name))
             assert self.wa.G.has_edge(*e)
             incr = self.wa.G.get_edge_data(*e)['wirelength']
             wl += incr
             wl_incr.append(incr)
-        seg = self.wa.G.nodes[self.wirelength_path[-1]]['segment']
-        site = seg.belPin.site
-        bel = seg.belPin.bel
+        site = self.wa.node_site[self.wirelength_path[-1]]
+        bel = self.wa.node_bel[self.wirelength_path[-1]]
         cell_name = sl[self.wa.placements[(site, bel)].cellName]
         wa_path.append((sl[site], sl[bel], cell_name))
 
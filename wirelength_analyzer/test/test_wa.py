@@ -6,8 +6,18 @@
 #
 
 import os
+import io
+import sys
+import gzip
+import json
+import random
+import tempfile
 import unittest
-from wa import WirelengthAnalyzer
+import warnings
+from contextlib import redirect_stdout
+from wa import WirelengthAnalyzer, analyze
+from result_cache import ResultCache
+import PhysicalNetlist_capnp
 from test.parse_vivado_route_tree import ParseVivadoRouteTree
 from test.find_vivado_critical_path_in_wirelength_graph import FindVivadoCriticalPathInWirelengthGraph
 
@@ -135,3 +145,270 @@ class TestWirelengthAnalyzer(unittest.TestCase):
             with self.subTest(config = config):
                 test = FindVivadoCriticalPathInWirelengthGraph(config[0], config[1], config[2])
                 self.assertTrue(test.success, "Could Not Find Vivado Critical Path in "+config[2])
+
+    def test_batch(self):
+        """
+        Check that analyzing several netlists with their output captured, as
+        is done in batch mode, gives JSON serializable results that agree with
+        the output printed when each netlist is analyzed on its own.
+        """
+        phys_fnames = [self.data_path(x+'.phys') for x in self.benchmarks]
+        results = [analyze(fname, 'both', 0, capture_output=True) for fname in phys_fnames]
+        self.assertEqual(json.loads(json.dumps(results)), results)
+        for fname, result in zip(phys_fnames, results):
+            with self.subTest(physical_netlist = fname):
+                self.assertEqual(result['physical_netlist'], fname)
+                self.assertIsInstance(result['longest_single_net']['net'], str)
+                self.assertIsInstance(result['longest_single_net']['wirelength'], int)
+                self.assertIsInstance(result['critical_path']['wirelength'], int)
+                self.assertIsInstance(result['warnings'], list)
+
+                out = io.StringIO()
+                with redirect_stdout(out):
+                    single = analyze(fname, 'both', 0)
+                self.assertEqual(result['output'], out.getvalue())
+                self.assertEqual(self.wirelength_lines(result['output']), [
+                    'Longest Single Net (' + single['longest_single_net']['net'] + ') Wirelength: ' +
+                    str(single['longest_single_net']['wirelength']),
+                    'Critical Path Wirelength: ' + str(single['critical_path']['wirelength']),
+                ])
+                self.assertEqual(result['longest_single_net'], single['longest_single_net'])
+                self.assertEqual(result['critical_path'], single['critical_path'])
+
+    def wirelength_lines(self, output):
+        """
+        Return every line of the output of an analysis that reports a
+        wirelength
+        """
+        return [l for l in output.splitlines() if 'Wirelength:' in l]
+
+    def test_routes(self):
+        """
+        Check that analyzing a netlist with the routing of its nets given as
+        in-memory routes gives the same critical-path wirelength as analyzing
+        the netlist itself.
+        """
+        for x in self.benchmarks:
+            with self.subTest(benchmark = x):
+                wa = WirelengthAnalyzer(self.data_path(x+'.phys'), 0)
+                routes = self.routes_from_netlist(wa.phys)
+                self.assertGreater(len(routes), 0)
+                in_memory = WirelengthAnalyzer(wa.phys, 0, routes=routes)
+                self.assertEqual(in_memory.critical_wirelength(), wa.critical_wirelength())
+
+    def routes_from_netlist(self, phys):
+        """
+        Rebuild the routing of the signal nets of a physical netlist in the
+        form accepted by the routes argument of WirelengthAnalyzer, with one
+        connection for every BEL pin that the routing reaches.
+
+        Nets with a branch that ends anywhere but at a BEL pin cannot be
+        described this way, and are left out (so that they are read from the
+        netlist instead).
+
+        Args:
+            phys: a loaded physical netlist
+        Returns:
+            a dict mapping net indices to their routes
+        """
+        sl = phys.strList
+        routes = {}
+        for net_index, n in enumerate(phys.physNets):
+            if n.type != 'signal':
+                continue
+            net_routes = []
+            for source in n.sources:
+                bp = source.routeSegment.belPin
+                connections = []
+                stack = [(b, ()) for b in source.branches]
+                while stack and connections is not None:
+                    rb, pips = stack.pop()
+                    seg = rb.routeSegment
+                    if seg.which() == 'pip':
+                        pips = pips + ((sl[seg.pip.tile], sl[seg.pip.wire1]),)
+                    if len(rb.branches) != 0:
+                        stack.extend((b, pips) for b in rb.branches)
+                    elif seg.which() == 'belPin':
+                        connections.append((pips, [(seg.belPin.site, seg.belPin.bel, seg.belPin.pin)]))
+                    else:
+                        connections = None
+                if connections is None:
+                    break
+                if connections:
+                    net_routes.append(((bp.site, bp.bel, bp.pin), connections))
+            else:
+                if net_routes:
+                    routes[net_index] = net_routes
+        return routes
+
+    def test_result_cache_key(self):
+        """
+        Check that the cache key of a netlist depends on its contents and the
+        analysis options, and that the digest of its contents is only
+        recomputed once its size or modification time changes.
+        """
+        with tempfile.TemporaryDirectory() as d:
+            cache = ResultCache(os.path.join(d, 'cache'), 1 << 20)
+            data = bytes(range(256)) * 4096
+            fnames = []
+            for name, contents in [('plain.phys', data),
+                                   ('copy.phys', data),
+                                   ('other.phys', data[1:] + b'\0')]:
+                fnames.append(os.path.join(d, name))
+                with open(fnames[-1], 'wb') as f:
+                    f.write(contents)
+            key = cache.key(fnames[0], 'cp', 0)
+            self.assertEqual(cache.key(fnames[1], 'cp', 0), key)
+            self.assertNotEqual(cache.key(fnames[2], 'cp', 0), key)
+            self.assertNotEqual(cache.key(fnames[0], 'cp', 1), key)
+
+            # Overwrite the netlist without changing its size or modification
+            # time: the recorded digest is used, by this cache and any other
+            # sharing its directory
+            st = os.stat(fnames[0])
+            with open(fnames[0], 'wb') as f:
+                f.write(data[1:] + b'\0')
+            os.utime(fnames[0], ns=(st.st_atime_ns, st.st_mtime_ns))
+            self.assertEqual(cache.key(fnames[0], 'cp', 0), key)
+            other = ResultCache(os.path.join(d, 'cache'), 1 << 20)
+            self.assertEqual(other.key(fnames[0], 'cp', 0), key)
+
+            # Once its modification time changes, it is hashed again
+            os.utime(fnames[0], ns=(st.st_atime_ns, st.st_mtime_ns + 1))
+            self.assertEqual(cache.key(fnames[0], 'cp', 0), cache.key(fnames[2], 'cp', 0))
+
+    def test_result_cache_eviction(self):
+        """
+        Check that the cache stays within its bound by evicting the least
+        recently used results, where getting a result counts as a use.
+        """
+        with tempfile.TemporaryDirectory() as d:
+            result = {'output': 'x' * 1000}
+            size = len(json.dumps(result))
+            cache = ResultCache(d, 2 * size + size // 2)
+            # Give each result a distinct modification time in the past, so
+            # that the order of use does not depend on the timer resolution
+            for i, key in enumerate(['a', 'b', 'c']):
+                cache.put(key, result)
+                os.utime(cache.path(key), (i, i))
+            self.assertEqual(sorted(os.listdir(d)), ['b.json', 'c.json'])
+            self.assertEqual(cache.get('b'), result)
+            cache.put('d', result)
+            self.assertEqual(sorted(os.listdir(d)), ['b.json', 'd.json'])
+            self.assertIsNone(cache.get('c'))
+            self.assertLessEqual(sum(os.path.getsize(os.path.join(d, f)) for f in os.listdir(d)), cache.max_bytes)
+
+    def test_result_cache_replay(self):
+        """
+        Check that a cache hit replays the output (after a line saying so) and
+        warnings of the stored result, rather than analyzing the netlist again.
+        """
+        phys_fname = self.data_path(self.benchmarks[0]+'.phys')
+        with tempfile.TemporaryDirectory() as d:
+            cache = ResultCache(d, 1 << 20)
+            missed = analyze(phys_fname, 'cp', 0, capture_output=True, cache=cache)
+            hit = analyze(phys_fname, 'cp', 0, capture_output=True, cache=cache)
+            notice, output = hit.pop('output').split('\n', 1)
+            self.assertIn('cached', notice)
+            self.assertEqual(output, missed.pop('output'))
+            self.assertEqual(hit, missed)
+
+            # Replace the stored result, so that replaying it can be told
+            # apart from analyzing the netlist again
+            key = cache.key(phys_fname, 'cp', 0)
+            cache.put(key, {
+                'critical_path': {'wirelength': 1},
+                'output': 'Critical Path Wirelength: 1\n',
+                'warnings': [{'message': 'Found 1 stubs across 1 nets', 'category': 'UserWarning',
+                              'filename': 'wa.py', 'lineno': 1}],
+            })
+            out = io.StringIO()
+            with redirect_stdout(out), warnings.catch_warnings(record=True) as caught:
+                warnings.simplefilter('always')
+                result = analyze(phys_fname, 'cp', 0, cache=cache)
+            self.assertEqual(result, {'physical_netlist': phys_fname, 'critical_path': {'wirelength': 1}})
+            self.assertEqual(out.getvalue().split('\n', 1)[1], 'Critical Path Wirelength: 1\n')
+            self.assertEqual([(str(w.message), w.category, w.filename, w.lineno) for w in caught],
+                             [('Found 1 stubs across 1 nets', UserWarning, 'wa.py', 1)])
+
+            # Analyzing with a state file bypasses the cache
+            state_fname = os.path.join(d, 'state')
+            result = analyze(phys_fname, 'cp', 0, capture_output=True, cache=cache, state_file=state_fname)
+            self.assertEqual(result['critical_path'], missed['critical_path'])
+            self.assertTrue(os.path.exists(state_fname))
+
+    def test_update_from_state(self):
+        """
+        Check that updating the analysis state of one netlist to another
+        netlist of the same design gives the same critical-path wirelength
+        as analyzing that netlist from scratch.
+
+        Each benchmark is analyzed while saving its state. Then a copy of it,
+        in which the nets on its critical path (along with a random selection
+        of other nets) have each lost the routing to one of their sinks, is
+        analyzed from that state, followed by the original netlist once again
+        (so that the perturbed nets are added back to the graph).
+        """
+        for x in self.benchmarks:
+            with self.subTest(benchmark = x), tempfile.TemporaryDirectory() as d:
+                phys_fname = self.data_path(x+'.phys')
+                perturbed_fname = os.path.join(d, x+'_perturbed.phys')
+                state_fname = os.path.join(d, x+'.state')
+
+                wa = WirelengthAnalyzer(phys_fname, 0, state_file=state_fname)
+                wa.critical_wirelength()
+                wa.save_state(state_fname)
+                critical_nets = {wa.node_net_index[v] for v in wa.critical_path if wa.node_net_index[v] >= 0}
+                self.perturb_nets(phys_fname, perturbed_fname, critical_nets, random.Random(x))
+
+                for fname in [perturbed_fname, phys_fname]:
+                    wa = WirelengthAnalyzer(fname, 0, state_file=state_fname)
+                    # The graph was updated rather than rebuilt
+                    self.assertIsNotNone(wa.dirty)
+                    wirelength = wa.critical_wirelength()
+                    wa.save_state(state_fname)
+                    self.assertEqual(wirelength, WirelengthAnalyzer(fname, 0).critical_wirelength(), msg=fname)
+
+    def perturb_nets(self, phys_fname, perturbed_fname, net_indices, rng, num_nets=50):
+        """
+        Write a copy of a physical netlist in which the given nets, along with
+        a random selection of other nets, have had the routing to one of their
+        sinks removed
+
+        Args:
+            phys_fname: filename of a placed and routed physical netlist
+            perturbed_fname: filename to write the perturbed copy to
+            net_indices: indices of the nets that are always perturbed
+            rng: random.Random to make the selection with
+            num_nets: number of further nets to perturb
+        """
+        with open(phys_fname, 'rb') as f:
+            data = f.read()
+        if data[:2] == b'\x1f\x8b':
+            data = gzip.decompress(data)
+        with PhysicalNetlist_capnp.PhysNetlist.from_bytes(data, traversal_limit_in_words=sys.maxsize, nesting_limit=2**20) as reader:
+            phys = reader.as_builder()
+        physNets = phys.physNets
+        routed = [i for i, n in enumerate(physNets) if len(n.sources)]
+        net_indices = set(net_indices)
+        net_indices.update(rng.sample(routed, min(num_nets, len(routed))))
+        for i in sorted(net_indices):
+            n = physNets[i]
+            # Find every route branch that forks, and drop one of its branches
+            forks = []
+            queue = list(n.sources)
+            while queue:
+                rb = queue.pop()
+                if len(rb.branches) > 1:
+                    forks.append(rb)
+                queue.extend(rb.branches)
+            if not forks:
+                continue
+            rb = rng.choice(forks)
+            kept = [b.copy() for b in rb.branches]
+            del kept[rng.randrange(len(kept))]
+            branches = rb.init('branches', len(kept))
+            for j, b in enumerate(kept):
+                branches[j] = b
+        with open(perturbed_fname, 'wb') as f:
+            f.write(phys.to_bytes())
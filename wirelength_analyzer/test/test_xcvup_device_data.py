@@ -0,0 +1,51 @@
+# Copyright (C) 2023, Advanced Micro Devices, Inc.  All rights reserved.
+#
+# SPDX-License-Identifier: MIT
+#
+
+import unittest
+from xcvup_device_data import xcvupDeviceData
+
+class TestXcvupDeviceData(unittest.TestCase):
+    """
+    This class checks that the compiled connectivity masks agree with the
+    connectivity rules they are compiled from.
+    """
+
+    def setUp(self):
+        self.xcvup = xcvupDeviceData()
+
+    def test_cell_masks(self):
+        """
+        Test that every input pin of every table-driven cell type is in an
+        output pin's mask exactly when it is in the rule's set of connections
+        """
+        xcvup = self.xcvup
+        for cell_type, join_fn in xcvup.cells.items():
+            default, output_masks = xcvup.cell_masks[cell_type]
+            if default is not None:
+                continue
+            inputs = set()
+            for o in output_masks:
+                inputs.update(join_fn(o))
+            for o in output_masks:
+                mask = xcvup.output_pin_mask(cell_type, o)
+                for i in inputs:
+                    with self.subTest(cell_type=cell_type, o=o, i=i):
+                        self.assertEqual(bool(xcvup.input_pin_bit(i) & mask), i in join_fn(o))
+            with self.assertRaises(KeyError):
+                xcvup.output_pin_mask(cell_type, 'NOT_A_PIN')
+
+    def test_default_masks(self):
+        """
+        Test the masks of cell types without a connectivity table, and of
+        unrecognized cell types
+        """
+        xcvup = self.xcvup
+        for i in ('I0', 'A6', 'NOT_A_PIN'):
+            self.assertTrue(xcvup.input_pin_bit(i) & xcvup.output_pin_mask('LUT6', 'O6'))
+            self.assertFalse(xcvup.input_pin_bit(i) & xcvup.output_pin_mask('FDRE', 'Q'))
+        self.assertIsNone(xcvup.output_pin_mask('NOT_A_CELL', 'O'))
+
+if __name__ == '__main__':
+    unittest.main()
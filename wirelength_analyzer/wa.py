@@ -7,6 +7,7 @@
 
 import sys
 import os
+import builtins
 import time
 import capnp
 import gzip
@@ -17,7 +18,16 @@ sys.path.append(os.path.join(THIS_DIR, '..','fpga-interchange-schema','interchan
 import PhysicalNetlist_capnp
 import warnings
 import itertools
+import io
+import json
+import pickle
+import hashlib
+import multiprocessing
+from contextlib import redirect_stdout
+from array import array
+from bisect import bisect_right
 from xcvup_device_data import xcvupDeviceData
+from result_cache import ResultCache, sources_digest
 import re
 
 class WirelengthAnalyzer:
@@ -56,6 +66,11 @@ class WirelengthAnalyzer:
         __slots__ = 'wirelength'
         def update(self, other):
             self.wirelength = other['wirelength']
+        # Pickle only the wirelength itself, rather than a dict of all slots
+        def __getstate__(self):
+            return self.wirelength
+        def __setstate__(self, wirelength):
+            self.wirelength = wirelength
         def get(self, key, default=None):
             return getattr(self, key, default)
         def __getitem__(self, key):
@@ -66,60 +81,159 @@ class WirelengthAnalyzer:
     class CustomNodeAttribute:
         """
         By default, networkx uses a dict object as the container for all node
-        attributes. Since our nodes only ever need net_index and segment
-        attributes we can improve memory efficiency by using a custom slotted
-        class that implements the bare minimum of methods
+        attributes. Since the payload of each node is instead stored in the
+        node_* arrays of the analyzer, we can improve memory efficiency by
+        using an empty slotted class that implements the bare minimum of
+        methods
         """
-        __slots__ = 'net_index', 'segment'
+        __slots__ = ()
         def update(self, other):
-            self.net_index = other.get('net_index')
-            self.segment = other['segment']
+            assert not other
         def get(self, key, default=None):
-            return getattr(self, key, default)
+            return default
         def __getitem__(self, key):
-            if key == 'net_index':
-                return self.net_index
-            if key == 'segment':
-                return self.segment
             raise KeyError(key)
 
+    # Since node attributes are always empty, every node shares this object
+    # (which also lets a pickled graph store it only once)
+    NO_NODE_ATTRIBUTES = CustomNodeAttribute()
+
+    @staticmethod
+    def node_attributes():
+        return WirelengthAnalyzer.NO_NODE_ATTRIBUTES
+
+    class PlacementIndex:
+        """
+        A read-only mapping from (site, bel) string indices to the FPGA
+        Interchange Format placement of the cell at that BEL. Rather than
+        holding a dict entry and a capnp reader for every cell in the design,
+        only a sorted array of site<<32|bel keys and a parallel array of
+        placement indices are kept, and these are not built until the first
+        lookup. If more than one cell is placed on the same BEL, the last one
+        is returned.
+        """
+        __slots__ = ('placements', 'keys', 'indices')
+        def __init__(self, placements):
+            self.placements = placements
+            self.keys = None
+            self.indices = None
+        def build(self):
+            keys = array('Q', ((c.site << 32) | c.bel for c in self.placements))
+            # sorted() is stable, so equal keys retain their placement order
+            self.indices = array('I', sorted(range(len(keys)), key=keys.__getitem__))
+            self.keys = array('Q', (keys[i] for i in self.indices))
+        def find(self, key):
+            if self.keys is None:
+                self.build()
+            k = (key[0] << 32) | key[1]
+            i = bisect_right(self.keys, k) - 1
+            if i >= 0 and self.keys[i] == k:
+                return self.indices[i]
+            return -1
+        def get(self, key, default=None):
+            i = self.find(key)
+            if i < 0:
+                return default
+            return self.placements[i]
+        def __getitem__(self, key):
+            i = self.find(key)
+            if i < 0:
+                raise KeyError(key)
+            return self.placements[i]
+        def __contains__(self, key):
+            return self.find(key) >= 0
+
+    # Kinds of routeSegment that a graph node can represent
+    BEL_PIN = 0
+    SITE_PIN = 1
+
+    # Version of the analysis state written by save_state()
+    STATE_VERSION = 1
+
 
-    def __init__(self, netlist, verbosity=0):
+    def __init__(self, netlist, verbosity=0, device_data=None, state_file=None, routes=None):
         """
         Initialize all of the major data structures required for wirelength
         analysis, from the provided netlist.
 
         Args:
             netlist: filepath of the FPGA Interchange Format Physical Netlist
-            to analyze
+            to analyze, or an already loaded PhysNetlist reader
             verbosity: control the verbosity of the output. Higher numbers
             produce more detailed output, but may take longer to run
+            device_data: an xcvupDeviceData object to share between analyzers,
+            a new one is created if not provided
+            state_file: if provided, track the length of the longest path to
+            every node so that the analysis can be saved with save_state().
+            If this file contains a compatible state saved from a previous
+            netlist, the graph is updated from it rather than rebuilt
+            routes: if provided, a dict mapping net indices to in-memory
+            routes, which are used instead of the routing of those nets in
+            the netlist. This allows a router to evaluate its routing without
+            writing it out first (see add_routes_to_graph() for the format of
+            each net's routes). Since the netlist then holds no detailed
+            routing for these nets, verbosity is limited to 1
         """
         self.nodeid = itertools.count()
+        # Rather than storing the FPGA Interchange Format routeSegment of each
+        # graph node, its (kind, site, bel, pin) string indices are packed into
+        # the following arrays (indexed by nodeid), along with the index of the
+        # physical net that a root node is the source of (-1 otherwise).
+        # Note that the bel index of a SITE_PIN node is unused.
+        self.node_kind = array('B')
+        self.node_site = array('I')
+        self.node_bel = array('I')
+        self.node_pin = array('I')
+        self.node_net_index = array('i')
         self.G = nx.DiGraph()
         self.G.edge_attr_dict_factory = WirelengthAnalyzer.CustomEdgeAttribute
-        self.G.node_attr_dict_factory = WirelengthAnalyzer.CustomNodeAttribute
+        self.G.node_attr_dict_factory = WirelengthAnalyzer.node_attributes
         self.verbosity = verbosity
         self.print_timing_commands = False
         self.start_time = None
         self.joined = False
         self.roots = []
         self.leaves = []
-        xcvup = xcvupDeviceData()
+        xcvup = device_data if device_data is not None else xcvupDeviceData()
         self.cells = xcvup.cells
+        self.input_pin_bit = xcvup.input_pin_bit
+        self.output_pin_mask = xcvup.output_pin_mask
         self.pips = xcvup.pips
+        self.pip_wirelength = xcvup.pip_wirelength
         self.tile_root_name_regex = xcvup.tile_root_name_regex
         self.tile_types = xcvup.tile_types
         self.global_net_drivers = xcvup.global_net_drivers
         self.pip_cache = {}
         self.tile_cache = {}
+        self.tile_name_cache = {}
+        self.lsn = None
+        self.lsn_name = None
+        self.critical_path = None
+        # When tracking path lengths, dist maps each node to the wirelength of
+        # the longest path ending at it, and dirty holds the nodes whose
+        # in-edges have changed since dist was last updated (None for all)
+        self.dist = None if state_file is None else {}
+        self.dirty = None
+        self.net_digests = None
+        self.string_digests = {}
+        self.placement_digest = None
         if self.verbosity > 0:
             print("Building Graph")
-        self.phys = self.read_phys_netlist(netlist)
-        self.placements = {}
-        for c in self.phys.placements:
-            self.placements[(c.site, c.bel)] = c
-        self.add_all_nets_to_graph()
+        if isinstance(netlist, str):
+            self.phys = self.read_phys_netlist(netlist)
+        else:
+            self.phys = netlist
+        self.placements = WirelengthAnalyzer.PlacementIndex(self.phys.placements)
+        if routes is not None:
+            assert state_file is None, "Cannot update in-memory routes from a saved state"
+            self.verbosity = min(self.verbosity, 1)
+            self.add_all_nets_to_graph(routes=routes)
+            return
+        state = None
+        if state_file is not None:
+            state = self.load_state(state_file)
+        if state is None or not self.update_from_state(state):
+            self.add_all_nets_to_graph()
 
     def tstart(self):
         """
@@ -185,6 +299,102 @@ class WirelengthAnalyzer:
         elif w == 'sitePIP':
             return ' '.join([fw, sl[seg.sitePIP.site], sl[seg.sitePIP.bel], sl[seg.sitePIP.pin], str(seg.sitePIP.isFixed)])
 
+    def add_segment_node(self, seg, net_index=-1):
+        """
+        Add a new node to the graph representing the provided belPin or
+        sitePin routeSegment, packing its string indices into the node_*
+        arrays.
+
+        Args:
+            seg: FPGA Interchange Format RouteBranch.routeSegment
+            net_index: index of the physical net that this node is the source
+            of, or -1 if it is not a source
+
+        Returns:
+            the nodeid of the new node
+
+        Raises:
+            ValueError: if the routeSegment is not a belPin or sitePin
+        """
+        w = seg.which()
+        if w == 'belPin':
+            return self.add_node(self.BEL_PIN, seg.belPin.site, seg.belPin.bel, seg.belPin.pin, net_index)
+        elif w == 'sitePin':
+            return self.add_node(self.SITE_PIN, seg.sitePin.site, 0, seg.sitePin.pin, net_index)
+        raise ValueError("Segment: "+self.format_segment(seg)+" not a belPin or sitePin")
+
+    def add_node(self, kind, site, bel, pin, net_index=-1):
+        """
+        Add a new node to the graph, packing the provided string indices into
+        the node_* arrays.
+
+        Args:
+            kind: BEL_PIN or SITE_PIN
+            site: string index of the site name
+            bel: string index of the BEL name (unused for a SITE_PIN)
+            pin: string index of the pin name
+            net_index: index of the physical net that this node is the source
+            of, or -1 if it is not a source
+
+        Returns:
+            the nodeid of the new node
+        """
+        node = next(self.nodeid)
+        self.node_kind.append(kind)
+        self.node_site.append(site)
+        self.node_bel.append(bel)
+        self.node_pin.append(pin)
+        self.node_net_index.append(net_index)
+        self.G.add_node(node)
+        return node
+
+    def node_segment(self, node):
+        """
+        Materialize the FPGA Interchange Format RouteBranch.routeSegment that
+        the provided graph node represents (e.g. for printing).
+
+        Args:
+            node: nodeid of a graph node
+
+        Returns:
+            a RouteBranch.routeSegment builder
+        """
+        seg = PhysicalNetlist_capnp.PhysNetlist.RouteBranch.new_message().routeSegment
+        if self.node_kind[node] == self.BEL_PIN:
+            bel_pin = seg.init('belPin')
+            bel_pin.site = self.node_site[node]
+            bel_pin.bel = self.node_bel[node]
+            bel_pin.pin = self.node_pin[node]
+        else:
+            site_pin = seg.init('sitePin')
+            site_pin.site = self.node_site[node]
+            site_pin.pin = self.node_pin[node]
+        return seg
+
+    def segment_matches_node(self, seg, node):
+        """
+        Determine whether the provided routeSegment is the one that the
+        provided graph node represents.
+
+        Args:
+            seg: FPGA Interchange Format RouteBranch.routeSegment
+            node: nodeid of a graph node
+
+        Returns:
+            True if the routeSegment matches the node
+        """
+        w = seg.which()
+        if w == 'belPin':
+            return (self.node_kind[node] == self.BEL_PIN and
+                    seg.belPin.site == self.node_site[node] and
+                    seg.belPin.bel == self.node_bel[node] and
+                    seg.belPin.pin == self.node_pin[node])
+        if w == 'sitePin':
+            return (self.node_kind[node] == self.SITE_PIN and
+                    seg.sitePin.site == self.node_site[node] and
+                    seg.sitePin.pin == self.node_pin[node])
+        return False
+
     def net_index_to_name(self, net_index):
         """
         Return the name of the net located in the list of physical nets at the
@@ -215,10 +425,10 @@ class WirelengthAnalyzer:
         Returns:
             the name of the associated net as a string
         """
-        net_index = self.G.nodes[edge[0]]['net_index']
-        if net_index is None:
-            net_index = self.G.nodes[edge[1]]['net_index']
-            if net_index is None:
+        net_index = self.node_net_index[edge[0]]
+        if net_index < 0:
+            net_index = self.node_net_index[edge[1]]
+            if net_index < 0:
                 return 'NULL'
         net_name = self.net_index_to_name(net_index)
         return net_name
@@ -234,7 +444,9 @@ class WirelengthAnalyzer:
         the table of pips provided in the architecture file to determine the
         wirelength associated with this pip. Since checking the table of pips
         requires an expensive regex operation, cache the result of the lookup
-        to reduce runtime of subsequent look ups.
+        to reduce runtime of subsequent look ups. The device data additionally
+        caches the result by wire name, so that it can be reused by subsequent
+        netlists.
 
         Further, since determining if a pip is in an intersite switchbox
         requires an expensive string comparison we also cache these results.
@@ -266,17 +478,78 @@ class WirelengthAnalyzer:
 
             if is_int_tile:
                 wl = self.pip_cache.get(wire1)
-                if wl is not None:
-                    return wl
-                for p in self.pips:
-                    if p[0].fullmatch(wire1_name):
-                        self.pip_cache[wire1] = p[1]
-                        return p[1]
-                assert False, "Found unrecognized pip wire1: "+wire1_name+" in tile: "+tile_name
+                if wl is None:
+                    wl = self.pip_wirelength(wire1_name)
+                    assert wl is not None, "Found unrecognized pip wire1: "+wire1_name+" in tile: "+tile_name
+                    self.pip_cache[wire1] = wl
+                return wl
             else:
                 return 0
         return 0
 
+    def pip_name_to_wirelength(self, tile_name, wire1_name):
+        """
+        Determine the wirelength of a PIP given the names of its tile and end
+        wire, as segment_to_wirelength() does for a routeSegment. Results are
+        cached by tile name and (in the device data) by wire name.
+
+        Args:
+            tile_name: name of the tile containing the PIP
+            wire1_name: name of the PIP's end wire
+
+        Returns:
+            wirelength as an integer
+
+        Raises:
+            ValueError: if the tile is not recognized
+            AssertionError: if the PIP is in an intersite switchbox and its
+            end wire is not in the table of pips
+        """
+        is_int_tile = self.tile_name_cache.get(tile_name)
+        if is_int_tile is None:
+            is_int_tile = tile_name.startswith('INT_')
+            if not is_int_tile and self.tile_root_name_regex.match(tile_name).group(1) not in self.tile_types:
+                raise ValueError("Unrecognized tile on PIP: " + tile_name + ',' + wire1_name)
+            self.tile_name_cache[tile_name] = is_int_tile
+        if not is_int_tile:
+            return 0
+        wl = self.pip_wirelength(wire1_name)
+        assert wl is not None, "Found unrecognized pip wire1: "+wire1_name+" in tile: "+tile_name
+        return wl
+
+    def add_routes_to_graph(self, net_index, routes):
+        """
+        Add a net described by in-memory routes to the graph. Each route is a
+        (source, connections) tuple, where source is one of the net's source
+        BEL pins and each connection is a (pips, sinks) tuple: pips is an
+        iterable of the (tile name, wire1 name) of every PIP on the path from
+        the source to a sink site pin, and sinks is a list of the BEL pins
+        reached from that site pin. BEL pins are given as (site, bel, pin)
+        tuples of string indices into the netlist's string list, whereas PIPs
+        are given by name since they need not appear in it.
+
+        As for nets in the netlist, routes from global net drivers are
+        ignored.
+
+        Args:
+            net_index: index of the net in the list of physical nets
+            routes: list of routes as described above
+        """
+        sl = self.phys.strList
+        for source, connections in routes:
+            if sl[source[1]] in self.global_net_drivers:
+                continue
+            root = self.add_node(self.BEL_PIN, source[0], source[1], source[2], net_index)
+            self.roots.append(root)
+            for pips, sinks in connections:
+                wirelength = 0
+                for tile_name, wire1_name in pips:
+                    wirelength += self.pip_name_to_wirelength(tile_name, wire1_name)
+                for site, bel, pin in sinks:
+                    leaf = self.add_node(self.BEL_PIN, site, bel, pin)
+                    self.G.add_edge(root, leaf, wirelength=wirelength)
+                    self.leaves.append(leaf)
+
     def add_net_to_graph(self, source, route_branch):
         """
         Perform a Depth First Search of the net rooted at route_branch. As
@@ -301,20 +574,18 @@ class WirelengthAnalyzer:
             seg = route_branch.routeSegment
             wirelength += self.segment_to_wirelength(seg)
             if len(route_branch.branches) == 0:
-                sink = next(self.nodeid)
-                self.G.add_node(sink, segment=seg)
+                w = seg.which()
+                if w != 'sitePin' and w != 'belPin':
+                    raise ValueError("Leaf segment: "+self.format_segment(seg)+" on net: "+self.net_index_to_name(self.node_net_index[source])+" not a belPin or sitePin")
+                sink = self.add_segment_node(seg)
                 self.G.add_edge(source, sink, wirelength=wirelength)
-                if seg.which() == 'sitePin':
-                    pass
-                elif seg.which() != 'belPin':
-                    raise ValueError("Leaf segment: "+self.format_segment(seg)+" on net: "+self.find_net_name_from_edge((source, sink))+" not a belPin or sitePin")
-                else:
+                if w == 'belPin':
                     self.leaves.append(sink)
             else:
                 for b in route_branch.branches:
                     stack.append((b, wirelength))
 
-    def add_all_nets_to_graph(self):
+    def add_all_nets_to_graph(self, nets=None, routes=None):
         """
         Add each physical signal net in the netlist to the graph. Ignore global
         nets (as determined by its source pin originating on a global buffer)
@@ -323,6 +594,12 @@ class WirelengthAnalyzer:
         method also ignores source-less or sink-less nets, since they cannot
         contribute to overall wirelength.
 
+        Args:
+            nets: list of (net index, physical net) tuples to add, instead of
+            every physical net in the netlist
+            routes: dict mapping net indices to in-memory routes (see
+            add_routes_to_graph()) to add instead of the routing of those nets
+
         Raises:
             AssertionError: if an unknown net type is found
             AssertionError: if a net with a non belPin source is found
@@ -333,13 +610,20 @@ class WirelengthAnalyzer:
         stub_count = 0
         nets_with_multiple_sources = 0
         multisource_count = 0
-        for net_index, n in enumerate(self.phys.physNets):
+        if nets is None:
+            nets = enumerate(self.phys.physNets)
+        for net_index, n in nets:
             this_net = sl[n.name]
             if n.type != "signal":
                 assert n.type in ('gnd', 'vcc')
                 continue
             if this_net == 'GLOBAL_USEDNET':
                 continue
+            if routes is not None:
+                net_routes = routes.get(net_index)
+                if net_routes is not None:
+                    self.add_routes_to_graph(net_index, net_routes)
+                    continue
             if len(n.stubs) != 0:
                 if len(n.sources) == 0:
                     # Nets with stubs but no sources are assumed to be hierarchical ports
@@ -360,9 +644,8 @@ class WirelengthAnalyzer:
                     if self.verbosity > 1:
                         print("Skipping global net:",this_net)
                 else:
-                    source = next(self.nodeid)
+                    source = self.add_segment_node(branch.routeSegment, net_index)
                     self.roots.append(source)
-                    self.G.add_node(source, net_index=net_index, segment=branch.routeSegment)
                     self.add_net_to_graph(source, branch)
         if nets_with_stubs != 0:
             warnings.warn("Found "+str(stub_count)+" stubs across "+str(nets_with_stubs)+" nets")
@@ -370,47 +653,341 @@ class WirelengthAnalyzer:
             warnings.warn("Found "+str(multisource_count)+" sources across "+str(nets_with_multiple_sources)+" nets")
         self.tstop("Added nets to graph")
 
-    def join_nets(self):
+    def join_nets(self, leaves=None, roots=None):
         """
         For each BEL/cell collect all of the leaves that drive its inputs. Then
         for each root driven by the BEL/cell add edges between the inputs and
         ouputs according to the connectivity rule defined in the device data
         file.
 
+        The connectivity rules are applied as precompiled bitmasks: each input
+        pin is represented by a bit, and an edge is added from every leaf
+        whose bit is present in the mask of the root's output pin. Both bits
+        and masks are cached by string index so that each distinct pin name
+        and (cell type, output pin) pair is only looked up once.
+
+        Args:
+            leaves: list of leaves to join, instead of all leaves. Every leaf
+            on the BELs of the provided roots must be included
+            roots: list of roots to join, instead of all roots
+
         Raises:
             AssertionError: if unrecognized cells are found
         """
 
         self.tstart()
+        if leaves is None:
+            leaves = self.leaves
+        if roots is None:
+            roots = self.roots
         join_points = {}
         unrecognized_cells = {}
 
         sl = self.phys.strList
-        for l in self.leaves:
-            leaf = self.G.nodes[l]['segment']
-            bel = (leaf.belPin.site, leaf.belPin.bel)
-            join_points.setdefault(bel, {})[sl[leaf.belPin.pin]] = l
-
-        for r in self.roots:
-            root = self.G.nodes[r]['segment']
-            bel = (root.belPin.site, root.belPin.bel)
+        node_site = self.node_site
+        node_bel = self.node_bel
+        node_pin = self.node_pin
+        for l in leaves:
+            bel = (node_site[l], node_bel[l])
+            join_points.setdefault(bel, {})[node_pin[l]] = l
+
+        # Replace each BEL's mapping of input pin to leaf with a tuple of the
+        # union of all its input pin bits, and a list of (bit, leaf) tuples
+        pin_bits = {}
+        for bel, pin_to_leaf in join_points.items():
+            inputs = []
+            union = 0
+            for pin, l in pin_to_leaf.items():
+                bit = pin_bits.get(pin)
+                if bit is None:
+                    bit = pin_bits[pin] = self.input_pin_bit(sl[pin])
+                inputs.append((bit, l))
+                union |= bit
+            join_points[bel] = (union, inputs)
+
+        output_masks = {}
+        for r in roots:
+            bel = (node_site[r], node_bel[r])
             bel_inputs = join_points.get(bel)
             if not bel_inputs:
                 continue
-            cell_type = sl[self.placements[bel].type]
-            join_fn = self.cells.get(cell_type)
-            if join_fn is None:
-                unrecognized_cells.setdefault((cell_type, sl[bel[1]]), []).append(self.find_net_name_from_edge(list(self.G.out_edges(r))[0]))
+            key = (self.placements[bel].type, node_pin[r])
+            if key in output_masks:
+                mask = output_masks[key]
+            else:
+                mask = output_masks[key] = self.output_pin_mask(sl[key[0]], sl[key[1]])
+            if mask is None:
+                unrecognized_cells.setdefault((sl[key[0]], sl[bel[1]]), []).append(self.find_net_name_from_edge(list(self.G.out_edges(r))[0]))
+                continue
+            union, inputs = bel_inputs
+            if not union & mask:
                 continue
-            connections = join_fn(sl[root.belPin.pin])
-            for i in bel_inputs.keys():
-                if i in connections:
-                    self.G.add_edge(bel_inputs[i], r, wirelength=0)
+            for bit, l in inputs:
+                if bit & mask:
+                    self.G.add_edge(l, r, wirelength=0)
 
         assert len(unrecognized_cells) == 0, "Found unrecognized cell(s): "+str(unrecognized_cells)
         self.joined = True
         self.tstop("Joined nets")
 
+    def update_path_lengths(self):
+        """
+        Update the wirelength of the longest path ending at each node, for
+        every node reachable from a dirty node (or for all nodes if every node
+        is dirty). Nodes are visited in topological order, so that the lengths
+        of all their predecessors are already up to date.
+        """
+        G = self.G
+        dist = self.dist
+        if self.dirty is None:
+            nodes = nx.topological_sort(G)
+        else:
+            reachable = set(self.dirty)
+            stack = list(reachable)
+            while stack:
+                for v in G._succ[stack.pop()]:
+                    if v not in reachable:
+                        reachable.add(v)
+                        stack.append(v)
+            nodes = nx.topological_sort(G.subgraph(reachable))
+        pred = G._pred
+        for v in nodes:
+            length = 0
+            for u, e in pred[v].items():
+                d = dist[u] + e.wirelength
+                if d > length:
+                    length = d
+            dist[v] = length
+        self.dirty = set()
+
+    def longest_path_from_lengths(self):
+        """
+        Reconstruct a longest path in the graph from the tracked path lengths,
+        by walking backwards from a node with the greatest length through any
+        predecessor that it was reached from.
+
+        Returns:
+            a list of nodes that form the longest path in the graph
+        """
+        dist = self.dist
+        pred = self.G._pred
+        v = max(dist, key=dist.get)
+        lp = [v]
+        while pred[v]:
+            for u, e in pred[v].items():
+                if dist[u] + e.wirelength == dist[v]:
+                    v = u
+                    break
+            lp.append(v)
+        lp.reverse()
+        return lp
+
+    def physnet_digests(self):
+        """
+        Compute a digest of every physical net in the netlist, so that nets
+        whose routing has changed between two netlists can be found. Since
+        digests are computed over the encoded net, which refers to strings by
+        index, they can only be compared between netlists whose string lists
+        agree on every string that the nets refer to.
+
+        Each net is copied into a message of its own by capnp, which is an
+        order of magnitude faster than walking its encoded words from Python.
+
+        Returns:
+            a dict mapping the string index of each net's name to its digest
+        """
+        digests = {}
+        for n in self.phys.physNets:
+            digests[n.name] = hashlib.blake2b(n.as_builder().to_bytes(), digest_size=16).digest()
+        return digests
+
+    def strings_digest(self, count):
+        """
+        Compute a digest of the first count strings in the netlist's string
+        list, which is remembered so that updating from a state and then
+        saving it only computes it once.
+        """
+        if count not in self.string_digests:
+            h = hashlib.blake2b(digest_size=16)
+            sl = self.phys.strList
+            for i in range(count):
+                h.update(sl[i].encode())
+                h.update(b'\0')
+            self.string_digests[count] = h.digest()
+        return self.string_digests[count]
+
+    def placements_digest(self):
+        """
+        Compute a digest of the placement of every cell in the netlist, which
+        is remembered in the same way as strings_digest().
+        """
+        if self.placement_digest is None:
+            a = array('I')
+            for c in self.phys.placements:
+                a.extend((c.cellName, c.type, c.site, c.bel))
+            self.placement_digest = hashlib.blake2b(a.tobytes(), digest_size=16).digest()
+        return self.placement_digest
+
+    def save_state(self, filename):
+        """
+        Save the joined graph and the tracked path lengths, along with the
+        digests needed to later update them from a different netlist of the
+        same placed design.
+
+        Args:
+            filename: file to save the state to
+        """
+        assert self.joined and self.dist is not None, "Can only save state after finding the critical path while tracking path lengths"
+        self.tstart()
+        if self.net_digests is None:
+            self.net_digests = self.physnet_digests()
+        state = {
+            'version': self.STATE_VERSION,
+            'sources': sources_digest(),
+            'num_strings': len(self.phys.strList),
+            'strings': self.strings_digest(len(self.phys.strList)),
+            'placements': self.placements_digest(),
+            'net_names': array('I', (n.name for n in self.phys.physNets)),
+            'net_digests': self.net_digests,
+            'G': self.G,
+            'node_kind': self.node_kind,
+            'node_site': self.node_site,
+            'node_bel': self.node_bel,
+            'node_pin': self.node_pin,
+            'node_net_index': self.node_net_index,
+            'roots': array('I', self.roots),
+            'leaves': array('I', self.leaves),
+            'dist': self.dist,
+        }
+        tmp = filename + '.%d.tmp' % os.getpid()
+        with open(tmp, 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, filename)
+        self.tstop("Saved analysis state")
+
+    def load_state(self, filename):
+        """
+        Load the state saved by save_state().
+
+        Args:
+            filename: file that the state was saved to
+
+        Returns:
+            the state, or None if the file does not exist or was saved by a
+            different version of the analyzer
+        """
+        self.tstart()
+        try:
+            with open(filename, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, pickle.UnpicklingError, EOFError, AttributeError, ImportError):
+            # AttributeError and ImportError are raised if the state refers
+            # to classes of a differently named module (e.g. when it was
+            # saved by wa.py run as a script and is loaded by an importer)
+            return None
+        if state.get('version') != self.STATE_VERSION or state.get('sources') != sources_digest():
+            return None
+        self.tstop("Loaded analysis state")
+        return state
+
+    def update_from_state(self, state):
+        """
+        Rather than building the graph from scratch, update the graph saved in
+        the provided state to reflect this netlist. Nets whose digest differs
+        from the saved one (along with added and removed nets) have their
+        nodes removed and are added to the graph again, after which only the
+        BELs touched by their new nodes are joined. The nodes that gained or
+        lost in-edges are marked dirty, so that only path lengths downstream
+        of the changed nets are updated.
+
+        This requires that the netlist has the same placement as the one the
+        state was saved from, and that its string list begins with the same
+        strings (so that string indices can be shared).
+
+        Args:
+            state: a state returned by load_state()
+
+        Returns:
+            True if the graph was updated, False if the state is not
+            compatible with this netlist
+        """
+        self.tstart()
+        num_strings = state['num_strings']
+        if len(self.phys.strList) < num_strings or \
+           self.strings_digest(num_strings) != state['strings'] or \
+           self.placements_digest() != state['placements']:
+            if self.verbosity > 0:
+                print("Saved analysis state does not match netlist; analyzing from scratch")
+            return False
+
+        self.G = state['G']
+        self.node_kind = state['node_kind']
+        self.node_site = state['node_site']
+        self.node_bel = state['node_bel']
+        self.node_pin = state['node_pin']
+        self.node_net_index = state['node_net_index']
+        self.nodeid = itertools.count(len(self.node_kind))
+        self.dist = state['dist']
+        self.net_digests = self.physnet_digests()
+        saved_digests = state['net_digests']
+        saved_names = state['net_names']
+
+        changed_nets = []
+        name_to_index = {}
+        for net_index, n in enumerate(self.phys.physNets):
+            name_to_index[n.name] = net_index
+            if saved_digests.get(n.name) != self.net_digests[n.name]:
+                changed_nets.append((net_index, n))
+        changed_names = {n.name for _, n in changed_nets}
+        changed_names.update(name for name in saved_digests if name not in self.net_digests)
+
+        # Remove each root of a changed net along with its leaves, and mark
+        # any roots they were joined to as dirty. Each remaining root has its
+        # net index updated to this netlist's.
+        G = self.G
+        removed = set()
+        roots = []
+        for r in state['roots']:
+            name = saved_names[self.node_net_index[r]]
+            if name in changed_names:
+                removed.add(r)
+                removed.update(G._succ[r])
+            else:
+                self.node_net_index[r] = name_to_index[name]
+                roots.append(r)
+        dirty = set()
+        for u in removed:
+            dirty.update(G._succ[u])
+        dirty.difference_update(removed)
+        G.remove_nodes_from(removed)
+        for u in removed:
+            del self.dist[u]
+        self.roots = roots
+        self.leaves = [l for l in state['leaves'] if l not in removed]
+        self.tstop("Removed "+str(len(changed_names))+" changed nets from graph")
+
+        first_node = len(self.node_kind)
+        self.add_all_nets_to_graph(changed_nets)
+        new_nodes = range(first_node, len(self.node_kind))
+
+        # Rejoin every BEL touched by a new node from scratch, visiting its
+        # leaves in the order that add_all_nets_to_graph() would have added
+        # them (i.e. by the net index of their root), so that a BEL pin driven
+        # by more than one leaf is joined just as it would be from scratch
+        node_site = self.node_site
+        node_bel = self.node_bel
+        bels = {(node_site[v], node_bel[v]) for v in new_nodes if self.node_kind[v] == self.BEL_PIN}
+        leaves = [l for l in self.leaves if (node_site[l], node_bel[l]) in bels]
+        leaves.sort(key=lambda l: self.node_net_index[next(iter(G._pred[l]))])
+        roots = [r for r in self.roots if (node_site[r], node_bel[r]) in bels]
+        for r in roots:
+            G.remove_edges_from([(l, r) for l in G._pred[r]])
+        self.join_nets(leaves, roots)
+        dirty.update(roots)
+        dirty.update(new_nodes)
+        self.dirty = dirty
+        return True
+
     def find_longest_path(self):
         """
         Use networkx to find the longest path in the graph
@@ -419,7 +996,11 @@ class WirelengthAnalyzer:
             a list of nodes that form the longest path in the graph
         """
         self.tstart()
-        lp = nx.dag_longest_path(self.G, weight='wirelength')
+        if self.dist is None:
+            lp = nx.dag_longest_path(self.G, weight='wirelength')
+        else:
+            self.update_path_lengths()
+            lp = self.longest_path_from_lengths()
 
         # NetworkX's longest path algorithm will return the longest path by
         # wirelength, but it is not necessarily a path that terminates in a
@@ -447,9 +1028,8 @@ class WirelengthAnalyzer:
             out_edges = self.G.out_edges(source)
             path = path + [source]
             if len(out_edges) == 0:
-                source_seg = self.G.nodes[source]['segment']
-                if source_seg.which() == 'belPin':
-                    if (source_seg.belPin.site, source_seg.belPin.bel) in self.placements:
+                if self.node_kind[source] == self.BEL_PIN:
+                    if (self.node_site[source], self.node_bel[source]) in self.placements:
                         return path
                 return []
             for oe in out_edges:
@@ -463,8 +1043,7 @@ class WirelengthAnalyzer:
         if tail:
             lp = lp + tail[1:]
         else:
-            seg = self.G.nodes[last]['segment']
-            cell = self.placements[(seg.belPin.site, seg.belPin.bel)]
+            cell = self.placements[(self.node_site[last], self.node_bel[last])]
             sl = self.phys.strList
             warnings.warn("No valid sink found from cell " + sl[cell.cellName] + "; assuming that it drives a hierarchical port.")
         return lp
@@ -491,10 +1070,8 @@ class WirelengthAnalyzer:
             the path from the source to the sink, if such a path exists. None
             otherwise
         """
-        sl = self.phys.strList
         nets = self.phys.physNets
-        net = nets[self.G.nodes[source]['net_index']]
-        sink_segment = self.G.nodes[sink]['segment']
+        net = nets[self.node_net_index[source]]
 
         def search_for_sink(route_branch, sink, path=()):
             """
@@ -503,7 +1080,7 @@ class WirelengthAnalyzer:
 
             Args:
                 route_branch: route_branch to begin searching from
-                sink: the target RouteBranch.routeSegment
+                sink: the nodeid of the target sink
                 path: empty tuple where the detailed routing will be stored
 
             Returns:
@@ -512,9 +1089,7 @@ class WirelengthAnalyzer:
             segment = route_branch.routeSegment
             path = (*path, segment)
             if len(route_branch.branches) == 0:
-                # This is a workaround for a capnp limitation:
-                # https://github.com/capnproto/pycapnp/issues/74#issuecomment-120534892
-                if segment.to_dict() == sink.to_dict():
+                if self.segment_matches_node(segment, sink):
                     return path
                 return None
             else:
@@ -524,7 +1099,18 @@ class WirelengthAnalyzer:
                         return ret
                 return None
 
-        return search_for_sink(net.sources[0], sink_segment)
+        return search_for_sink(net.sources[0], sink)
+
+    def path_wirelength(self, path):
+        """
+        Sum the wirelength of every net along the provided path.
+
+        Args:
+            path: list of nodes forming a path through the graph
+        Returns:
+            total wirelength of the path as an integer
+        """
+        return sum(self.G[u][v]['wirelength'] for u, v in zip(path[0::2], path[1::2]))
 
     def pretty_print_path(self, path, path_name):
         """
@@ -590,8 +1176,7 @@ class WirelengthAnalyzer:
         formatted_path.append('--------+---------+-----------------------------------------')
 
         # display the cell that drives the first net on the path
-        first_source_seg = self.G.nodes[path[0]]['segment']
-        first_cell = self.placements[(first_source_seg.belPin.site, first_source_seg.belPin.bel)]
+        first_cell = self.placements[(self.node_site[path[0]], self.node_bel[path[0]])]
         append_path_line(None, length, 'cell    '+sl[first_cell.cellName], None)
         cells_on_path.append(sl[first_cell.cellName])
 
@@ -605,9 +1190,9 @@ class WirelengthAnalyzer:
             if self.verbosity < 1:
                 continue
 
-            net_name = self.net_index_to_name(self.G.nodes[u]['net_index'])
-            source_seg = self.G.nodes[u]['segment']
-            sink_seg = self.G.nodes[v]['segment']
+            net_name = self.net_index_to_name(self.node_net_index[u])
+            source_seg = self.node_segment(u)
+            sink_seg = self.node_segment(v)
             source = self.format_segment(source_seg)
             sink   = self.format_segment(sink_seg)
 
@@ -631,7 +1216,7 @@ class WirelengthAnalyzer:
             append_path_line(sink_len, None, sink, None)
 
             # display the cell that this connects this edge to the next one
-            join_cell = self.placements[(sink_seg.belPin.site, sink_seg.belPin.bel)]
+            join_cell = self.placements[(self.node_site[v], self.node_bel[v])]
             cells_on_path.append(sl[join_cell.cellName])
             append_path_line(None, length, 'cell    '+sl[join_cell.cellName], None)
 
@@ -692,8 +1277,22 @@ class WirelengthAnalyzer:
             print("Finding Longest Single Net:")
         assert self.joined == False, "Cannot find Longest Single Net after joining"
         self.lsn = self.find_longest_path()
-        lsn_name = self.find_net_name_from_edge((self.lsn[0], self.lsn[1]))
-        self.pretty_print_path(self.lsn, "Longest Single Net ("+lsn_name+")")
+        self.lsn_name = self.find_net_name_from_edge((self.lsn[0], self.lsn[1]))
+        self.pretty_print_path(self.lsn, "Longest Single Net ("+self.lsn_name+")")
+
+    def critical_wirelength(self):
+        """
+        Find the critical path in the graph without printing it, joining the
+        nets first if necessary. This is intended for use by a router that
+        evaluates its routing in-process.
+
+        Returns:
+            the critical-path wirelength as an integer
+        """
+        if not self.joined:
+            self.join_nets()
+        self.critical_path = self.find_longest_path()
+        return self.path_wirelength(self.critical_path)
 
     def find_critical_wirelength(self):
         """
@@ -705,10 +1304,111 @@ class WirelengthAnalyzer:
         if self.verbosity > 0:
             print()
             print("Finding Critical Path:")
-        self.join_nets()
+        if not self.joined:
+            self.join_nets()
         self.critical_path = self.find_longest_path()
         self.pretty_print_path(self.critical_path, "Critical Path")
 
+# Device data shared by every netlist analyzed in this process. It is created
+# before any worker processes are started, so that (where processes are
+# forked) workers inherit its compiled tables rather than rebuilding them.
+device_data = None
+
+def get_device_data():
+    """
+    Return the device data shared by this process, creating it if necessary.
+    """
+    global device_data
+    if device_data is None:
+        device_data = xcvupDeviceData()
+    return device_data
+
+def analyze(physical_netlist, mode, verbosity, capture_output=False, cache=None, state_file=None):
+    """
+    Run the wirelength analyzer on a single Physical Netlist.
+
+    Args:
+        physical_netlist: filepath of the FPGA Interchange Format Physical
+        Netlist to analyze
+        mode: one of the modes accepted by the --mode option
+        verbosity: output verbosity level
+        capture_output: if True, return everything that would have been
+        printed, and every warning that would have been shown, rather than
+        printing or showing it (see emit_result())
+        cache: a ResultCache to return a previous result from (whose output
+        is preceded by a line saying so), and to store a new result in
+        state_file: file to update the analysis from, and to save the
+        analysis state to (see WirelengthAnalyzer.update_from_state()). Since
+        a cached result would leave this file unchanged, the cache is not
+        used when a state file is given
+
+    Returns:
+        a dict of results suitable for JSON serialization, which also contains
+        the captured output and warnings under the 'output' and 'warnings'
+        keys if requested
+    """
+    if cache is not None and state_file is None:
+        key = cache.key(physical_netlist, mode, verbosity)
+        result = cache.get(key)
+        if result is None:
+            result = analyze(physical_netlist, mode, verbosity, True)
+            cache.put(key, result)
+        else:
+            # The replayed output includes the timings of the original analysis
+            result['output'] = "Replaying cached result (timings are from the original analysis)\n" + result['output']
+        result['physical_netlist'] = physical_netlist
+        if not capture_output:
+            emit_result(result)
+        return result
+
+    result = {'physical_netlist': physical_netlist}
+    out = io.StringIO() if capture_output else sys.stdout
+    with redirect_stdout(out), warnings.catch_warnings(record=capture_output) as caught:
+        wa = WirelengthAnalyzer(physical_netlist, verbosity, get_device_data(), state_file)
+        if mode in ['lsn', 'longest-single-net', 'both']:
+            wa.find_lsn()
+            result['longest_single_net'] = {
+                'net': wa.lsn_name,
+                'wirelength': wa.path_wirelength(wa.lsn),
+            }
+        if mode in ['cp', 'critical-path', 'both']:
+            wa.find_critical_wirelength()
+            result['critical_path'] = {
+                'wirelength': wa.path_wirelength(wa.critical_path),
+            }
+            if state_file is not None:
+                wa.save_state(state_file)
+    if capture_output:
+        result['output'] = out.getvalue()
+        result['warnings'] = [{
+            'message': str(w.message),
+            'category': w.category.__name__,
+            'filename': w.filename,
+            'lineno': w.lineno,
+        } for w in caught]
+    return result
+
+def emit_result(result):
+    """
+    Print the output captured by analyze(), and show the warnings captured
+    along with it exactly as they would have been shown when they were first
+    issued, removing both from the result.
+
+    Args:
+        result: a dict returned by analyze() with capture_output set
+    """
+    print(result.pop('output'), end='')
+    sys.stdout.flush()
+    for w in result.pop('warnings'):
+        category = getattr(builtins, w['category'], UserWarning)
+        warnings.warn_explicit(w['message'], category, w['filename'], w['lineno'])
+
+def analyze_job(job):
+    """
+    Unpack the arguments of analyze() for use with multiprocessing.Pool.imap.
+    """
+    return analyze(*job)
+
 def main():
     """
     The main entry point for the wirelength analyzer.
@@ -720,7 +1420,8 @@ def main():
 
     parser.add_argument('physical_netlist',
                         type=str,
-                        help="FPGAIF Physical Netlist to process")
+                        nargs='+',
+                        help="FPGAIF Physical Netlist(s) to process")
     parser.add_argument('-v',
                         '--verbosity',
                         type=int,
@@ -737,15 +1438,73 @@ def main():
                         "    compute the length of the longest single routed net\n"+
                         "MODE is 'both'\n"+
                         "    run both previous modes consecutively.")
+    parser.add_argument('-j',
+                        '--jobs',
+                        type=int,
+                        default=1,
+                        help="number of Physical Netlists to analyze concurrently")
+    parser.add_argument('--json',
+                        metavar='FILE',
+                        type=str,
+                        help="also write the results for all Physical Netlists to FILE as JSON")
+    parser.add_argument('--cache-dir',
+                        metavar='DIR',
+                        type=str,
+                        help="reuse results of previous analyses of identical Physical Netlists,\n"+
+                        "stored in DIR")
+    parser.add_argument('--cache-size',
+                        metavar='MB',
+                        type=int,
+                        default=64,
+                        help="evict least recently used results once DIR exceeds MB megabytes\n"+
+                        "(default: 64)")
+    parser.add_argument('--state',
+                        metavar='FILE',
+                        type=str,
+                        help="save the analysis state to FILE, and if FILE already holds the state of\n"+
+                        "a previous netlist of the same placed design, only re-analyze the nets\n"+
+                        "whose routing has changed (critical-path mode only, and bypassing\n"+
+                        "--cache-dir)")
 
     args = parser.parse_args()
 
-    wa = WirelengthAnalyzer(args.physical_netlist, args.verbosity)
+    netlists = args.physical_netlist
+    if args.state is not None:
+        if args.mode not in ['cp', 'critical-path']:
+            parser.error("--state is only supported in critical-path mode")
+        if len(netlists) != 1:
+            parser.error("--state is only supported for a single Physical Netlist")
+    get_device_data()
+    cache = None
+    if args.cache_dir is not None:
+        cache = ResultCache(args.cache_dir, args.cache_size << 20)
+
+    results = []
+    if len(netlists) == 1:
+        results.append(analyze(netlists[0], args.mode, args.verbosity, cache=cache, state_file=args.state))
+    else:
+        # Output from each netlist is captured and then printed in the order
+        # that netlists were given, so that it is never interleaved
+        def print_result(result):
+            print("==> " + result['physical_netlist'] + " <==")
+            emit_result(result)
+            print()
+            results.append(result)
+        jobs = [(n, args.mode, args.verbosity, True, cache) for n in netlists]
+        if args.jobs > 1:
+            methods = multiprocessing.get_all_start_methods()
+            ctx = multiprocessing.get_context('fork' if 'fork' in methods else None)
+            with ctx.Pool(min(args.jobs, len(netlists))) as pool:
+                for result in pool.imap(analyze_job, jobs):
+                    print_result(result)
+        else:
+            for job in jobs:
+                print_result(analyze(*job))
 
-    if args.mode in ['lsn', 'longest-single-net', 'both']:
-        wa.find_lsn()
-    if args.mode in ['cp', 'critical-path', 'both']:
-        wa.find_critical_wirelength()
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+            f.write('\n')
 
 if __name__ == "__main__":
     main()
@@ -20,8 +20,19 @@ class xcvupDeviceData:
     element specifies the wirelength of this wire if a match occurs. The
     intended use is for determining the wirelength of a PIP based on the PIP's
     end wire name.
+
+    The `cell_masks` member provides the same connectivity as `cells`, but
+    compiled into integer bitmasks: each input BEL pin name is interned into a
+    bit (see `input_pin_bit()`) and each (cell type, output BEL pin name) maps
+    to the bitwise-or of all input pins with a combinatorial path to that
+    output (see `output_pin_mask()`).
     """
 
+    # Bit shared by all input pins not named by any connectivity table, so
+    # that they still intersect with ALL_INPUTS
+    OTHER_INPUTS = 1
+    ALL_INPUTS = -1
+
     def __init__(self):
 
         # Cell connections are described as sets, first we define an empty set:
@@ -102,6 +113,39 @@ class xcvupDeviceData:
             'DSP_PREADD':      self.all_to_all,
         }
 
+        # Connectivity tables for cells whose outputs each depend on only a
+        # subset of their inputs
+        self.carry8_connectivity = { 'O0':  {'CIN', 'S0'},
+                                     'CO0': {'CIN', 'S0',       'DI0', 'AX'},
+                                     'O1':  {'CIN', 'S1', 'S0', 'DI0', 'AX'},
+                                     'CO1': {'CIN', 'S1',       'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'O2':  {'CIN', 'S2', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'CO2': {'CIN', 'S2',       'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'O3':  {'CIN', 'S3', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'CO3': {'CIN', 'S3',       'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'O4':  {'CIN', 'S4'  'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'CO4': {'CIN', 'S4',       'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'O5':  {'CIN', 'S5', 'S4'  'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'CO5': {'CIN', 'S5',       'DI5', 'FX', 'S4', 'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'O6':  {'CIN', 'S6', 'S5', 'DI5', 'FX', 'S4'  'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'CO6': {'CIN', 'S6',       'DI6', 'GX', 'S5', 'DI5', 'FX', 'S4', 'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'O7':  {'CIN', 'S7', 'S6', 'DI6', 'GX', 'S5', 'DI5', 'FX', 'S4'  'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                     'CO7': {'CIN', 'S7',       'DI7', 'HX', 'S6', 'DI6', 'GX', 'S5', 'DI5', 'FX', 'S4', 'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
+                                   }
+        self.srl16e_connectivity = { 'O5': {'A0', 'A1', 'A2', 'A3'},
+                                     'O6': {'A0', 'A1', 'A2', 'A3'},
+                                     'MC31': set(),
+                                   }
+        self.srlc32e_connectivity = { 'O6': {'A0', 'A1', 'A2', 'A3', 'A4'},
+                                      'MC31': set(),
+                                    }
+        self.ram_32_connectivity = { 'O5': {'A0', 'A1', 'A2', 'A3', 'A4'},
+                                     'O6': {'A0', 'A1', 'A2', 'A3', 'A4'},
+                                   }
+        self.ram_64e_connectivity = { 'O6': {'A0', 'A1', 'A2', 'A3', 'A4', 'A5'},
+                                    }
+        self.compile_cells()
+
         # pip wirelengths are assigned based on the values provided in Table 1
         # of "An Open-source Lightweight Timing Model for RapidWright", Maidee
         # et al, link: https://www.rapidwright.io/docs/_downloads/6610b931d8a2e053e69a499d3923077f/FPT19-TimingModel.pdf
@@ -161,6 +205,10 @@ class xcvupDeviceData:
             (re.compile(r'CLK_LEAF_SITES_\d_CLK_LEAF'),              0),
         ]
 
+        # wirelength of each wire name matched against self.pips so far; this
+        # persists across netlists analyzed with the same device data
+        self.pip_name_cache = {}
+
         # recognized tile types and regex to strip tile location
         self.tile_root_name_regex = re.compile(r'(.+)_X\d+Y\d+')
         self.tile_types = {
@@ -195,58 +243,99 @@ class xcvupDeviceData:
         """
         Connectivity rule for CARRY8 cells
         """
-        connectivity = { 'O0':  {'CIN', 'S0'},
-                         'CO0': {'CIN', 'S0',       'DI0', 'AX'},
-                         'O1':  {'CIN', 'S1', 'S0', 'DI0', 'AX'},
-                         'CO1': {'CIN', 'S1',       'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'O2':  {'CIN', 'S2', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'CO2': {'CIN', 'S2',       'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'O3':  {'CIN', 'S3', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'CO3': {'CIN', 'S3',       'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'O4':  {'CIN', 'S4'  'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'CO4': {'CIN', 'S4',       'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'O5':  {'CIN', 'S5', 'S4'  'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'CO5': {'CIN', 'S5',       'DI5', 'FX', 'S4', 'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'O6':  {'CIN', 'S6', 'S5', 'DI5', 'FX', 'S4'  'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'CO6': {'CIN', 'S6',       'DI6', 'GX', 'S5', 'DI5', 'FX', 'S4', 'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'O7':  {'CIN', 'S7', 'S6', 'DI6', 'GX', 'S5', 'DI5', 'FX', 'S4'  'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                         'CO7': {'CIN', 'S7',       'DI7', 'HX', 'S6', 'DI6', 'GX', 'S5', 'DI5', 'FX', 'S4', 'DI4', 'EX', 'S3', 'DI3', 'DX', 'S2', 'DI2', 'CX', 'S1', 'DI1', 'BX', 'S0', 'DI0', 'AX'},
-                       }
-        return connectivity[o]
+        return self.carry8_connectivity[o]
 
     def srl16e(self, o):
         """
         Connectivity rule for SRL16E cells
         """
-        connectivity = { 'O5': {'A0', 'A1', 'A2', 'A3'},
-                         'O6': {'A0', 'A1', 'A2', 'A3'},
-                         'MC31': set(),
-                        }
-        return connectivity[o]
+        return self.srl16e_connectivity[o]
 
     def srlc32e(self, o):
         """
         Connectivity rule for SRLC32E cells
         """
-        connectivity = { 'O6': {'A0', 'A1', 'A2', 'A3', 'A4'},
-                         'MC31': set(),
-                       }
-        return connectivity[o]
+        return self.srlc32e_connectivity[o]
 
     def ram_32(self, o):
         """
         Connectivity rule for RAMS32 and RAMD32 cells
         """
-        connectivity = { 'O5': {'A0', 'A1', 'A2', 'A3', 'A4'},
-                         'O6': {'A0', 'A1', 'A2', 'A3', 'A4'},
-                       }
-        return connectivity[o]
+        return self.ram_32_connectivity[o]
 
     def ram_64e(self, o):
         """
         Connectivity rule for RAMS64E and RAMD64E cells
         """
-        connectivity = { 'O6': {'A0', 'A1', 'A2', 'A3', 'A4', 'A5'},
-                       }
-        return connectivity[o]
+        return self.ram_64e_connectivity[o]
 
+    def pip_wirelength(self, wire1_name):
+        """
+        Return the wirelength of the first entry in `pips` that matches the
+        provided PIP end wire name, or None if no entry matches
+        """
+        wl = self.pip_name_cache.get(wire1_name)
+        if wl is None:
+            for p in self.pips:
+                if p[0].fullmatch(wire1_name):
+                    wl = self.pip_name_cache[wire1_name] = p[1]
+                    break
+        return wl
+
+    def compile_cells(self):
+        """
+        Compile the connectivity rule of every cell type in `cells` into
+        `cell_masks`, a dictionary that maps each cell type to a tuple of
+        (default mask, dictionary of output BEL pin name to mask). The
+        default mask is None for cell types whose rule is a table, since
+        their output pins must all be named.
+        """
+        tables = {
+            self.carry8:  self.carry8_connectivity,
+            self.srl16e:  self.srl16e_connectivity,
+            self.srlc32e: self.srlc32e_connectivity,
+            self.ram_32:  self.ram_32_connectivity,
+            self.ram_64e: self.ram_64e_connectivity,
+        }
+        self.input_pin_bits = {}
+        self.cell_masks = {}
+        for cell_type, join_fn in self.cells.items():
+            if join_fn == self.none_to_none:
+                self.cell_masks[cell_type] = (0, {})
+            elif join_fn == self.all_to_all:
+                self.cell_masks[cell_type] = (self.ALL_INPUTS, {})
+            else:
+                masks = {}
+                for o, inputs in tables[join_fn].items():
+                    mask = 0
+                    for i in inputs:
+                        bit = self.input_pin_bits.get(i)
+                        if bit is None:
+                            bit = self.input_pin_bits[i] = 1 << (len(self.input_pin_bits) + 1)
+                        mask |= bit
+                    masks[o] = mask
+                self.cell_masks[cell_type] = (None, masks)
+
+    def input_pin_bit(self, i):
+        """
+        Return the bit that represents the provided input BEL pin name
+        """
+        return self.input_pin_bits.get(i, self.OTHER_INPUTS)
+
+    def output_pin_mask(self, cell_type, o):
+        """
+        Return the mask of all input pin bits with a combinatorial path to the
+        provided output BEL pin name of the provided cell type, or None if the
+        cell type is not recognized
+
+        Raises:
+            KeyError: if the cell type's connectivity table does not contain
+            the output pin
+        """
+        masks = self.cell_masks.get(cell_type)
+        if masks is None:
+            return None
+        default, output_masks = masks
+        if default is None:
+            return output_masks[o]
+        return output_masks.get(o, default)